@@ -0,0 +1,178 @@
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from scraper.vin_decoder import MAKE_ALIASES, canonical_make
+
+logger = logging.getLogger(__name__)
+
+# Model spellings customers type that normalization alone does not catch
+MODEL_ALIASES = {
+    ('Chevrolet', 'Corvette'): ['Vette'],
+    ('Chevrolet', 'Silverado 1500'): ['Silverado'],
+    ('Ford', 'F-150'): ['F150', 'F 150'],
+    ('Ford', 'F-250'): ['F250', 'Super Duty'],
+    ('Ram', '1500'): ['Ram 1500'],
+    ('Mercedes-Benz', 'C-Class'): ['C300', 'C Class'],
+    ('Mercedes-Benz', 'E-Class'): ['E350', 'E Class'],
+    ('Volkswagen', 'Golf GTI'): ['GTI'],
+}
+
+def normalize_term(text: str) -> str:
+    """Lowercase and drop punctuation/spaces so "F-150", "f150" and "F 150" share a key"""
+    return re.sub(r'[^a-z0-9]', '', text.lower())
+
+class Suggestion:
+    __slots__ = ("kind", "value", "make", "count")
+
+    def __init__(self, kind: str, value: str, make: Optional[str] = None):
+        self.kind = kind
+        self.value = value
+        self.make = make
+        self.count = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.kind, "value": self.value, "make": self.make, "count": self.count}
+
+def _rank(suggestion: Suggestion):
+    # Makes before models, then by how much inventory they have
+    return (suggestion.kind != "make", -suggestion.count, suggestion.value)
+
+class _TrieNode:
+    __slots__ = ("children", "suggestions", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.suggestions: List[Suggestion] = []
+        self.top: List[Suggestion] = []  # best suggestions anywhere in this subtree
+
+class MakeModelAutocomplete:
+    """In-memory prefix trie over canonical makes/models and their aliases.
+
+    Exact prefixes are a plain trie walk. Otherwise lookups walk the trie with a
+    Levenshtein row per node, so prefixes within a bounded edit distance
+    ("chevorlet", "toyta") still match; like most spellers we assume the first
+    letter is typed correctly, which keeps the walk small. Every node keeps
+    the top suggestions of its subtree, so a matched prefix is answered without
+    walking below it. Counts come from active inventory and are updated
+    incrementally with `update_counts`.
+    """
+    TOP_K = 10
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.suggestions: Dict[Tuple[str, str, Optional[str]], Suggestion] = {}
+
+    def _insert(self, term: str, suggestion: Suggestion):
+        key = normalize_term(term)
+        if not key:
+            return
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+        if suggestion not in node.suggestions:
+            node.suggestions.append(suggestion)
+
+    def _suggestion(self, kind: str, value: str, make: Optional[str] = None) -> Suggestion:
+        key = (kind, value, make)
+        suggestion = self.suggestions.get(key)
+        if suggestion is None:
+            suggestion = Suggestion(kind, value, make)
+            self.suggestions[key] = suggestion
+            self._insert(value, suggestion)
+            if kind == "make":
+                for alias in MAKE_ALIASES.get(value, []):
+                    self._insert(alias, suggestion)
+            else:
+                for alias in MODEL_ALIASES.get((make, value), []):
+                    self._insert(alias, suggestion)
+                # "Ford F-150" and "F-150" both find the model
+                self._insert(f"{make} {value}", suggestion)
+        return suggestion
+
+    def update_counts(self, counts: Iterable[Tuple[str, str, int]]):
+        """Apply (make, model, active_count) rows from an inventory aggregation.
+
+        New makes/models are inserted; ones missing from `counts` drop to zero and
+        stop being suggested. Existing trie nodes are reused, so this is incremental.
+        """
+        make_counts: Dict[str, int] = {}
+        model_counts: Dict[Tuple[str, str], int] = {}
+        for make, model, count in counts:
+            if not make or make == 'Unknown':
+                continue
+            make = canonical_make(make)
+            make_counts[make] = make_counts.get(make, 0) + count
+            if model and model != 'Unknown':
+                model_counts[(make, model)] = model_counts.get((make, model), 0) + count
+
+        for suggestion in self.suggestions.values():
+            suggestion.count = 0
+        for make, count in make_counts.items():
+            self._suggestion("make", make).count = count
+        for (make, model), count in model_counts.items():
+            self._suggestion("model", model, make).count = count
+        self._rebuild_top(self.root)
+
+    def _rebuild_top(self, node: _TrieNode) -> List[Suggestion]:
+        candidates = [suggestion for suggestion in node.suggestions if suggestion.count > 0]
+        for child in node.children.values():
+            candidates.extend(self._rebuild_top(child))
+        # A suggestion reachable through several keys (aliases) appears once
+        node.top = sorted(set(candidates), key=_rank)[:self.TOP_K]
+        return node.top
+
+    def suggest(self, query: str, limit: int = 8, max_distance: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Suggestions whose key has a prefix within `max_distance` edits of `query`"""
+        key = normalize_term(query)
+        if not key:
+            return []
+        if max_distance is None:
+            max_distance = 0 if len(key) <= 2 else 1 if len(key) <= 5 else 2
+
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                break
+        if node is not None and (len(node.top) >= limit or max_distance == 0):
+            return [suggestion.to_dict() for suggestion in node.top[:limit]]
+        if node is not None and node.top:
+            # The prefix exists as typed; only near misses are needed to fill the list
+            max_distance = 1
+
+        first = self.root.children.get(key[0])
+        if first is None:
+            return []
+
+        # Walk the trie keeping one Levenshtein row per node; any node whose full-query
+        # cell is within max_distance matches as a prefix
+        matched: List[Tuple[int, _TrieNode]] = []
+        first_row = [1] + [i - 1 for i in range(1, len(key) + 1)]
+        stack = [(first, first_row)]
+        while stack:
+            node, row = stack.pop()
+            if row[-1] <= max_distance:
+                matched.append((row[-1], node))
+                # Deeper nodes can't match with fewer edits than the best cell in this row
+                if row[-1] == min(row):
+                    continue
+            for char, child in node.children.items():
+                next_row = [row[0] + 1]
+                for i in range(1, len(key) + 1):
+                    next_row.append(min(
+                        next_row[i - 1] + 1,
+                        row[i] + 1,
+                        row[i - 1] + (key[i - 1] != char)
+                    ))
+                if min(next_row) <= max_distance:
+                    stack.append((child, next_row))
+
+        # Closest matches first; each matched node contributes its subtree's top suggestions
+        best: Dict[Suggestion, int] = {}
+        for distance, node in sorted(matched, key=lambda item: item[0]):
+            for suggestion in node.top:
+                best.setdefault(suggestion, distance)
+
+        ranked = sorted(best.items(), key=lambda item: (item[1],) + _rank(item[0]))
+        return [suggestion.to_dict() for suggestion, _ in ranked[:limit]]
@@ -0,0 +1,244 @@
+import bisect
+import json
+import logging
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from scraper.vin_decoder import canonical_make
+
+logger = logging.getLogger(__name__)
+
+# Versioned rate tables written by extract_rate_books.py at the repo root
+RATE_BOOKS_DIR = Path(__file__).resolve().parent / 'data' / 'rate_books'
+
+SHORT_TERM_MONTHS = 6  # 3 and 6 month contracts carry reduced turbo/wear surcharges
+
+# Surcharges the vehicle itself triggers, keyed by normalized fuel type
+FUEL_TYPE_SURCHARGES = {'diesel': 'diesel', 'hybrid': 'hybrid'}
+
+def _group_cost(costs: Dict[str, Any], vehicle_class: str) -> Optional[int]:
+    """Cost for a class from {"1-2": 300, "3-6": 300}-style class group keys"""
+    number = int(vehicle_class)
+    for group, cost in costs.items():
+        low, _, high = group.partition('-')
+        if low.isdigit() and int(low) <= number <= int(high or low):
+            return cost
+    return None
+
+class RateBook:
+    """Service contract rate book loaded into in-memory dictionaries.
+
+    Rates are keyed by (coverage, vehicle class, term months, term miles,
+    odometer band ceiling), so a quote is a bisect over the coverage's handful
+    of odometer bands followed by one dict lookup. Vehicle classes come from
+    the book's class guide and are memoized per (make, model, EV).
+    """
+    def __init__(self):
+        self.version: Optional[str] = None
+        self.effective: Optional[str] = None
+        self.rates: Dict[Tuple[str, str, int, int, int], int] = {}
+        self.bands: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+        self.terms: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+        self.programs: Dict[str, str] = {}
+        self.forms: Dict[str, str] = {}
+        self.eligibility: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.surcharges: Dict[str, Dict[str, Any]] = {}
+        self.deductibles: Dict[str, Dict[str, Any]] = {}
+        self.gap: Optional[Dict[str, Any]] = None
+        self.class_rules: Dict[str, List[Tuple[str, Optional[re.Pattern], Optional[str]]]] = {}
+        self._class_cache: Dict[Tuple[str, str, bool], Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    def load(self, path: Optional[Path] = None):
+        """Load a rate table file, by default the latest effective one"""
+        if path is None:
+            candidates = sorted(RATE_BOOKS_DIR.glob('*.json'))
+            if not candidates:
+                logger.warning(f"No rate books found in {RATE_BOOKS_DIR}")
+                return
+            tables = [(json.loads(candidate.read_text()), candidate) for candidate in candidates]
+            table, path = max(tables, key=lambda item: item[0].get('effective', ''))
+        else:
+            table = json.loads(Path(path).read_text())
+
+        columns = table['columns']
+        rates, bands, terms, programs = {}, {}, {}, {}
+        for values in table['rates']:
+            row = dict(zip(columns, values))
+            key = (row['coverage'], row['vehicle_class'])
+            rates[key + (row['term_months'], row['term_miles'], row['odometer_max'])] = row['cost']
+            bands.setdefault(key, set()).add((row['odometer_max'], row['odometer_min']))
+            terms.setdefault(key, set()).add((row['term_months'], row['term_miles']))
+            programs[row['coverage']] = row['program']
+
+        self.rates = rates
+        self.bands = {key: sorted(values) for key, values in bands.items()}
+        self.terms = {key: sorted(values) for key, values in terms.items()}
+        self.programs = programs
+        self.version = table['version']
+        self.effective = table.get('effective')
+        self.forms = table.get('forms', {})
+        self.eligibility = table.get('eligibility', {})
+        self.surcharges = table.get('surcharges', {})
+        self.deductibles = table.get('deductibles', {})
+        self.gap = table.get('gap')
+        self.class_rules = {
+            program: [(canonical_make(make), re.compile(model, re.IGNORECASE) if model else None,
+                       str(vehicle_class) if vehicle_class is not None else None)
+                      for make, model, vehicle_class in table.get(guide, [])]
+            for program, guide in (('standard', 'class_guide'), ('ev', 'ev_class_guide'))
+        }
+        self._class_cache = {}
+        logger.info(f"Loaded rate book {self.version} ({len(self.rates)} rates) from {path}")
+
+    def vehicle_class(self, make: Optional[str], model: Optional[str], is_ev: bool = False) -> Optional[str]:
+        """Rate class from the class guide; None when the vehicle is not eligible or not listed"""
+        make = canonical_make(make) or ''
+        model = (model or '').strip()
+        key = (make, model.lower(), is_ev)
+        if key not in self._class_cache:
+            vehicle_class = None
+            for rule_make, pattern, rule_class in self.class_rules.get('ev' if is_ev else 'standard', []):
+                if rule_make == make and (pattern is None or pattern.search(model)):
+                    vehicle_class = rule_class
+                    break
+            self._class_cache[key] = vehicle_class
+        return self._class_cache[key]
+
+    def rate(self, coverage: str, vehicle_class: str, term_months: int, term_miles: int,
+             odometer: int) -> Optional[int]:
+        """Dealer cost of one rate cell, or None when the book has no such cell"""
+        bands = self.bands.get((coverage, vehicle_class))
+        if not bands:
+            return None
+        position = bisect.bisect_left(bands, (odometer, -1))
+        if position == len(bands) or odometer < bands[position][1]:
+            return None
+        return self.rates.get((coverage, vehicle_class, term_months, term_miles, bands[position][0]))
+
+    def _deductible_group(self, coverage: str) -> Optional[Dict[str, Any]]:
+        return next((group for group in self.deductibles.values() if coverage in group['coverages']), None)
+
+    def quote(self, coverage: str, make: Optional[str], model: Optional[str], year: Optional[int],
+              mileage: Optional[int], term_months: int, term_miles: int, price: Optional[float] = None,
+              fuel_type: Optional[str] = None, surcharges: Iterable[str] = (),
+              deductible: Optional[str] = None, vehicle_class: Optional[str] = None) -> Dict[str, Any]:
+        """Dealer cost of a contract with surcharges and deductible adjustment, plus eligibility"""
+        program = self.programs.get(coverage)
+        reasons = []
+        if program is None:
+            reasons.append(f"Unknown coverage {coverage}")
+            program = 'standard'
+        fuel = (fuel_type or '').strip().lower()
+        is_ev = program == 'ev'
+        if vehicle_class is None:
+            vehicle_class = self.vehicle_class(make, model, is_ev)
+        if vehicle_class is None:
+            reasons.append(f"{make or ''} {model or ''} is not eligible under the class guide".strip())
+
+        limits = self.eligibility.get(program, {}).get(vehicle_class or '', {})
+        mileage = int(mileage or 0)
+        if limits:
+            age = datetime.utcnow().year - int(year) if year else None
+            if mileage > limits['max_miles']:
+                reasons.append(f"Mileage above the class {vehicle_class} limit of {limits['max_miles']:,}")
+            if age is not None and age > limits['max_age_years']:
+                reasons.append(f"Vehicle older than the class {vehicle_class} limit of {limits['max_age_years']} years")
+            if price is not None and price < limits['min_price']:
+                reasons.append(f"Price below the class {vehicle_class} minimum of ${limits['min_price']:,}")
+
+        base_cost = self.rate(coverage, vehicle_class, term_months, term_miles, mileage) if vehicle_class else None
+        if vehicle_class and base_cost is None:
+            reasons.append(f"No {coverage} rate for class {vehicle_class} at "
+                           f"{term_months} months / {term_miles:,} miles and {mileage:,} odometer miles")
+
+        requested = list(dict.fromkeys(surcharges))
+        if fuel in FUEL_TYPE_SURCHARGES:
+            requested.append(FUEL_TYPE_SURCHARGES[fuel])
+        items = []
+        for name in dict.fromkeys(requested):
+            surcharge = self.surcharges.get(name)
+            if surcharge is None or coverage not in surcharge['coverages']:
+                if surcharge and surcharge.get('mandatory'):
+                    continue
+                reasons.append(f"Surcharge {name} is not available for {coverage}")
+                continue
+            if not vehicle_class:
+                continue
+            costs = surcharge.get('coverage_cost', {}).get(coverage, surcharge['cost'])
+            if term_months <= SHORT_TERM_MONTHS and 'short_term_cost' in surcharge:
+                costs = surcharge['short_term_cost']
+            cost = _group_cost(costs, vehicle_class)
+            if cost is None:
+                reasons.append(f"Surcharge {name} is not available for class {vehicle_class}")
+                continue
+            items.append({"name": name, "cost": cost, "mandatory": bool(surcharge.get('mandatory'))})
+
+        group = self._deductible_group(coverage)
+        adjustment = 0
+        if group:
+            deductible = str(deductible if deductible is not None else group['default'])
+            option = group['options'].get(deductible)
+            if option is None or coverage not in option.get('coverages', [coverage]) \
+                    or term_months < option.get('min_term_months', 0):
+                reasons.append(f"${deductible} deductible is not available for {coverage} at {term_months} months")
+            elif vehicle_class:
+                adjustment = _group_cost({k: v for k, v in option.items() if k[0].isdigit()}, vehicle_class) or 0
+
+        total = None
+        if base_cost is not None:
+            total = base_cost + sum(item["cost"] for item in items) + adjustment
+        return {
+            "rate_book": self.version,
+            "coverage": coverage,
+            "form": self.forms.get(coverage),
+            "vehicle_class": vehicle_class,
+            "term_months": term_months,
+            "term_miles": term_miles,
+            "odometer": mileage,
+            "eligible": not reasons,
+            "reasons": reasons,
+            "base_cost": base_cost,
+            "surcharges": items,
+            "deductible": deductible,
+            "deductible_adjustment": adjustment,
+            "dealer_cost": total if not reasons else None,
+        }
+
+    def options(self, make: Optional[str], model: Optional[str], year: Optional[int],
+                mileage: Optional[int], price: Optional[float] = None,
+                fuel_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Every eligible coverage and term for a vehicle at the default deductible"""
+        is_ev = (fuel_type or '').strip().lower() in ('electric', 'ev')
+        menu = []
+        for (coverage, vehicle_class), terms in self.terms.items():
+            if (self.programs[coverage] == 'ev') != is_ev:
+                continue
+            if vehicle_class != self.vehicle_class(make, model, is_ev):
+                continue
+            for term_months, term_miles in terms:
+                quote = self.quote(coverage, make, model, year, mileage, term_months, term_miles,
+                                   price=price, fuel_type=fuel_type, vehicle_class=vehicle_class)
+                if quote["eligible"]:
+                    menu.append(quote)
+        return sorted(menu, key=lambda quote: (quote["coverage"], quote["term_months"], quote["term_miles"]))
+
+    def gap_eligibility(self, amount_financed: float, vehicle_value: float,
+                        term_months: int) -> Dict[str, Any]:
+        """Check a deal against the GAP addendum program limits"""
+        if not self.gap:
+            return {"eligible": False, "reasons": ["No GAP program loaded"]}
+        reasons = []
+        if self.gap.get('max_term_months') and term_months > self.gap['max_term_months']:
+            reasons.append(f"Term above {self.gap['max_term_months']} months")
+        if self.gap.get('max_amount_financed') and amount_financed > self.gap['max_amount_financed']:
+            reasons.append(f"Amount financed above ${self.gap['max_amount_financed']:,}")
+        if self.gap.get('max_afvr_percent') and vehicle_value > 0 \
+                and amount_financed / vehicle_value * 100 > self.gap['max_afvr_percent']:
+            reasons.append(f"Amount financed above {self.gap['max_afvr_percent']}% of MSRP/NADA value")
+        return {"form": self.gap.get('form'), "eligible": not reasons, "reasons": reasons,
+                "max_coverage": self.gap.get('max_coverage')}
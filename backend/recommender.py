@@ -0,0 +1,240 @@
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from scraper.vin_decoder import canonical_make
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FIELDS = ("price", "year", "mileage")
+CATEGORICAL_FIELDS = ("body_style", "fuel_type", "drivetrain")
+
+# Relative importance of each feature block in the cosine similarity
+FEATURE_WEIGHTS = {
+    "price": 2.0,
+    "year": 1.0,
+    "mileage": 1.0,
+    "body_style": 1.5,
+    "fuel_type": 0.75,
+    "drivetrain": 0.75,
+    "make": 1.0,
+}
+
+def _category(value: Any) -> Optional[str]:
+    if not value or not isinstance(value, str):
+        return None
+    return value.strip().lower() or None
+
+def _number(value: Any) -> Optional[float]:
+    """A preference amount as a number: 25000, "25000", "$25,000", "25k", "1.2m"; None otherwise"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if np.isfinite(value) else None
+    if not isinstance(value, str):
+        return None
+    match = re.fullmatch(r'\$?\s*([\d,]*\.?\d+)\s*([km]?)', value.strip().lower())
+    if not match:
+        return None
+    try:
+        number = float(match.group(1).replace(',', ''))
+    except ValueError:
+        return None
+    return number * {"k": 1e3, "m": 1e6}.get(match.group(2), 1)
+
+def _budget(value: Any) -> Tuple[Optional[float], Optional[float]]:
+    """(min, max) from a budget range: [min, max], {"min": .., "max": ..}, "20k-30k", or one amount (a max)"""
+    if isinstance(value, dict):
+        return _number(value.get("min")), _number(value.get("max"))
+    if isinstance(value, (list, tuple)):
+        if len(value) == 1:
+            return None, _number(value[0])
+        if len(value) == 2:
+            return _number(value[0]), _number(value[1])
+        return None, None
+    if isinstance(value, str) and re.search(r'\d\s*[km]?\s*(?:-|–|to)\s*\$?\d', value, re.IGNORECASE):
+        low, high = re.split(r'\s*(?:-|–|to)\s*', value.strip(), maxsplit=1)
+        return _number(low), _number(high)
+    return None, _number(value)
+
+def as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+class VehicleFeatureIndex:
+    """Active inventory encoded as an L2-normalized float32 feature matrix.
+
+    Each row holds z-scored price/year/mileage, one-hot body style, fuel type
+    and drivetrain, and a make embedding (the make's mean numeric profile and
+    body style mix). Rows are unit length, so `matrix @ query` is the cosine
+    similarity of every vehicle to the query and top-k is one argpartition.
+    """
+    def __init__(self):
+        self.ids: List[str] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.means = np.zeros(len(NUMERIC_FIELDS))
+        self.stds = np.ones(len(NUMERIC_FIELDS))
+        self.vocabularies: Dict[str, Dict[str, int]] = {field: {} for field in CATEGORICAL_FIELDS}
+        self.make_embeddings: Dict[str, np.ndarray] = {}
+        self.embedding_size = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, vehicles: Iterable[Dict[str, Any]]):
+        """Rebuild the matrix from vehicle documents (only feature fields are read)"""
+        vehicles = [v for v in vehicles if v.get("id")]
+        count = len(vehicles)
+
+        numeric = np.array(
+            [[float(v.get(field) or 0) for field in NUMERIC_FIELDS] for v in vehicles],
+            dtype=np.float64
+        ).reshape(count, len(NUMERIC_FIELDS))
+        present = np.array([[bool(v.get(field)) for field in NUMERIC_FIELDS] for v in vehicles]).reshape(numeric.shape)
+        # Missing values are imputed with the column mean so they contribute 0 after scaling
+        sums = np.where(present, numeric, 0).sum(axis=0)
+        counts = np.maximum(present.sum(axis=0), 1)
+        self.means = sums / counts
+        numeric = np.where(present, numeric, self.means)
+        self.stds = numeric.std(axis=0) if count else np.ones(len(NUMERIC_FIELDS))
+        self.stds[self.stds == 0] = 1.0
+        scaled = (numeric - self.means) / self.stds
+
+        one_hot = []
+        for field in CATEGORICAL_FIELDS:
+            values = [_category(v.get(field)) for v in vehicles]
+            vocabulary = {value: i for i, value in enumerate(sorted({value for value in values if value}))}
+            self.vocabularies[field] = vocabulary
+            block = np.zeros((count, len(vocabulary)), dtype=np.float64)
+            columns = np.array([vocabulary.get(value, -1) for value in values], dtype=np.int64)
+            rows = np.nonzero(columns >= 0)[0]
+            block[rows, columns[rows]] = 1.0
+            one_hot.append(block)
+
+        # Make embedding: mean scaled numerics and body style mix of the make's inventory
+        makes = [canonical_make(v.get("make")) or "" for v in vehicles]
+        make_names = sorted(set(makes))
+        make_positions = {make: i for i, make in enumerate(make_names)}
+        make_index = np.array([make_positions[make] for make in makes], dtype=np.int64)
+        profile = np.hstack([scaled, one_hot[0]])
+        totals = np.zeros((len(make_names), profile.shape[1]))
+        np.add.at(totals, make_index, profile)
+        make_counts = np.bincount(make_index, minlength=len(make_names)).reshape(-1, 1)
+        embeddings = totals / np.maximum(make_counts, 1)
+        self.make_embeddings = {name: embeddings[i] for i, name in enumerate(make_names) if name}
+        self.embedding_size = profile.shape[1]
+
+        blocks = [
+            scaled * np.array([FEATURE_WEIGHTS[field] for field in NUMERIC_FIELDS]),
+            *(block * FEATURE_WEIGHTS[field] for field, block in zip(CATEGORICAL_FIELDS, one_hot)),
+            embeddings[make_index] * FEATURE_WEIGHTS["make"],
+        ]
+        matrix = np.hstack(blocks).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = matrix / norms
+        self.ids = [v["id"] for v in vehicles]
+        self.id_to_row = {vehicle_id: row for row, vehicle_id in enumerate(self.ids)}
+
+    def vector_for_preferences(self, preferences: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Query vector in feature space from explicit customer preferences.
+
+        Understands budget_min/budget_max (or budget_range/price_range in any shape
+        `_budget` reads), year_min, max_mileage, and single values or lists for
+        body_styles, fuel_types, drivetrains and makes. Unstated or unreadable
+        features stay neutral (zero).
+        """
+        if not len(self):
+            return None
+        numeric = np.zeros(len(NUMERIC_FIELDS))
+        numeric_set = False
+
+        # Preferences are free-form customer input; values that aren't amounts are ignored
+        budget_min, budget_max = _budget(preferences.get("budget_range") or preferences.get("price_range"))
+        if preferences.get("budget_min") is not None:
+            budget_min = _number(preferences["budget_min"])
+        if preferences.get("budget_max") is not None:
+            budget_max = _number(preferences["budget_max"])
+        prices = [price for price in (budget_min, budget_max) if price is not None]
+        if prices:
+            numeric[0] = (sum(prices) / len(prices) - self.means[0]) / self.stds[0]
+            numeric_set = True
+        year_min = _number(preferences.get("year_min"))
+        if year_min:
+            numeric[1] = (year_min + 2 - self.means[1]) / self.stds[1]
+            numeric_set = True
+        max_mileage = _number(preferences.get("max_mileage") or preferences.get("mileage_max"))
+        if max_mileage:
+            numeric[2] = (max_mileage / 2 - self.means[2]) / self.stds[2]
+            numeric_set = True
+
+        blocks = [numeric * np.array([FEATURE_WEIGHTS[field] for field in NUMERIC_FIELDS])]
+        categorical_set = False
+        preference_keys = {"body_style": "body_styles", "fuel_type": "fuel_types", "drivetrain": "drivetrains"}
+        for field in CATEGORICAL_FIELDS:
+            vocabulary = self.vocabularies[field]
+            block = np.zeros(len(vocabulary))
+            wanted = as_list(preferences.get(preference_keys[field])) + as_list(preferences.get(field))
+            for value in wanted:
+                column = vocabulary.get(_category(value))
+                if column is not None:
+                    block[column] = 1.0
+                    categorical_set = True
+            if block.any():
+                block /= block.sum()
+            blocks.append(block * FEATURE_WEIGHTS[field])
+
+        embeddings = [self.make_embeddings[canonical_make(make)]
+                      for make in as_list(preferences.get("makes")) + as_list(preferences.get("make"))
+                      if isinstance(make, str) and canonical_make(make) in self.make_embeddings]
+        make_block = np.mean(embeddings, axis=0) if embeddings else np.zeros(self.embedding_size)
+        blocks.append(make_block * FEATURE_WEIGHTS["make"])
+
+        if not (numeric_set or categorical_set or embeddings):
+            return None
+        vector = np.hstack(blocks).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def vector_for_vehicles(self, vehicle_ids: Sequence[str],
+                            weights: Optional[Sequence[float]] = None) -> Optional[np.ndarray]:
+        """Weighted mean of the rows of vehicles a customer interacted with"""
+        pairs = [(self.id_to_row[vehicle_id], weight)
+                 for vehicle_id, weight in zip(vehicle_ids, weights or [1.0] * len(vehicle_ids))
+                 if vehicle_id in self.id_to_row]
+        if not pairs:
+            return None
+        rows = np.array([row for row, _ in pairs])
+        row_weights = np.array([weight for _, weight in pairs], dtype=np.float32).reshape(-1, 1)
+        vector = (self.matrix[rows] * row_weights).sum(axis=0)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def top_k(self, query: np.ndarray, k: int = 10,
+              exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """(vehicle_id, cosine similarity) of the k rows closest to `query`"""
+        if not len(self) or query is None:
+            return []
+        scores = self.matrix @ query
+        excluded_rows = [self.id_to_row[vehicle_id] for vehicle_id in exclude if vehicle_id in self.id_to_row]
+        if excluded_rows:
+            scores[excluded_rows] = -np.inf
+        k = min(k, len(self) - len(excluded_rows))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(self.ids[row], float(scores[row])) for row in ranked]
+
+    def similar(self, vehicle_id: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Vehicles most similar to `vehicle_id`, excluding itself"""
+        row = self.id_to_row.get(vehicle_id)
+        if row is None:
+            return []
+        return self.top_k(self.matrix[row], k, exclude=[vehicle_id])
@@ -0,0 +1,111 @@
+"""DealerCarSearch CDN photo URLs.
+
+Listing and detail pages reference each photo several times at different
+sizes (thumbnails, gallery images, the original upload). The URLs share the
+`Media/<dealer>/<vehicle>/<photo>` path and differ only in a size suffix,
+a thumbnail directory or a resize query string, so they can be grouped by
+photo and one variant chosen before anything is downloaded.
+"""
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DCS_PHOTO_URL_PATTERN = re.compile(r'(?:https?:)?//imagescdn\.dealercarsearch\.com/Media/[^"\'<>\s)]+',
+                                   re.IGNORECASE)
+
+DEFAULT_PHOTO_WIDTH = 1024  # wide enough for the vehicle detail gallery
+THUMBNAIL_WIDTH = 160
+
+_WIDTH_PARAMS = ("width", "w", "maxwidth")
+_HEIGHT_PARAMS = ("height", "h", "maxheight")
+_SIZE_SUFFIX = re.compile(r'[_-](\d{2,4})x(\d{2,4})$', re.IGNORECASE)
+_THUMB_SUFFIX = re.compile(r'[_-](?:thumb|thumbnail|th|sm|small|t)$', re.IGNORECASE)
+_THUMB_DIRS = {"thumb", "thumbs", "thumbnail", "thumbnails", "small"}
+
+class DcsPhoto(NamedTuple):
+    key: str  # "<dealer>/<vehicle>/<photo>", shared by every size of the same photo
+    url: str
+    width: Optional[int]  # None for the original upload
+    resizable: bool  # the URL sizes the image with a query parameter
+
+def parse_dcs_photo(url: str) -> Optional[DcsPhoto]:
+    """Photo key and size of a DealerCarSearch CDN URL, or None for other URLs"""
+    if url.startswith('//'):
+        url = 'https:' + url
+    parts = urlsplit(url)
+    if parts.netloc.lower() != 'imagescdn.dealercarsearch.com':
+        return None
+    segments = [segment for segment in parts.path.split('/') if segment]
+    if len(segments) < 4 or segments[0].lower() != 'media':
+        return None
+
+    directories = [segment for segment in segments[1:-1] if segment.lower() not in _THUMB_DIRS]
+    thumbnail = len(directories) < len(segments) - 2
+    stem = segments[-1].rsplit('.', 1)[0]
+    width = None
+    size = _SIZE_SUFFIX.search(stem)
+    if size:
+        width = int(size.group(1))
+        stem = stem[:size.start()]
+    elif _THUMB_SUFFIX.search(stem):
+        thumbnail = True
+        stem = _THUMB_SUFFIX.sub('', stem)
+
+    query = {name.lower(): value for name, value in parse_qsl(parts.query)}
+    resizable = any(name in query for name in _WIDTH_PARAMS + _HEIGHT_PARAMS)
+    for name in _WIDTH_PARAMS:
+        if query.get(name, '').isdigit():
+            width = int(query[name])
+            break
+    else:
+        for name in _HEIGHT_PARAMS:
+            if query.get(name, '').isdigit():
+                width = int(query[name]) * 4 // 3  # listing photos are 4:3
+                break
+    if width is None and thumbnail:
+        width = THUMBNAIL_WIDTH
+
+    key = '/'.join(directories + [stem]).lower()
+    return DcsPhoto(key, urlunsplit(('https', parts.netloc, parts.path, parts.query, '')), width, resizable)
+
+def dcs_photo_key(url: str) -> Optional[str]:
+    photo = parse_dcs_photo(url)
+    return photo.key if photo else None
+
+def _resized(photo: DcsPhoto, width: int) -> str:
+    parts = urlsplit(photo.url)
+    query = [(name, value) for name, value in parse_qsl(parts.query)
+             if name.lower() not in _WIDTH_PARAMS + _HEIGHT_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query + [("width", str(width))])))
+
+def _best_variant(variants: List[DcsPhoto], target_width: int) -> str:
+    # The smallest size at least as wide as the target; otherwise ask a resizing URL for the
+    # target width, then fall back to the original upload and finally the largest size seen
+    wide_enough = [photo for photo in variants if photo.width and photo.width >= target_width]
+    if wide_enough:
+        return min(wide_enough, key=lambda photo: photo.width).url
+    resizable = [photo for photo in variants if photo.resizable]
+    if resizable:
+        return _resized(resizable[0], target_width)
+    originals = [photo for photo in variants if photo.width is None]
+    if originals:
+        return originals[0].url
+    return max(variants, key=lambda photo: photo.width).url
+
+def select_dcs_photos(urls: Iterable[str], target_width: int = DEFAULT_PHOTO_WIDTH,
+                      limit: Optional[int] = None) -> Dict[str, str]:
+    """One URL per distinct photo, {key: url} in page order, at the size closest to `target_width`.
+
+    URLs that are not DealerCarSearch CDN photos are ignored.
+    """
+    groups: Dict[str, List[DcsPhoto]] = {}
+    for url in urls:
+        photo = parse_dcs_photo(url) if url else None
+        if photo:
+            groups.setdefault(photo.key, []).append(photo)
+    keys = list(groups)[:limit] if limit is not None else list(groups)
+    return {key: _best_variant(groups[key], target_width) for key in keys}
+
+def find_dcs_photo_urls(html: str) -> List[str]:
+    """Every DealerCarSearch CDN photo URL in a page, in page order"""
+    return [url.replace('&amp;', '&') for url in DCS_PHOTO_URL_PATTERN.findall(html)]
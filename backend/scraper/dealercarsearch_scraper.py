@@ -4,7 +4,8 @@ import random
 import re
 import base64
 import uuid
-from typing import List, Optional, Dict, Any
+from functools import partial
+from typing import List, Optional, Dict, Any, Tuple
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
 
@@ -13,16 +14,30 @@ from bs4 import BeautifulSoup
 import aiohttp
 from fake_useragent import UserAgent
 
+from .dcs_photos import dcs_photo_key
+from .inventory_feeds import RecordedResponse, discover_feed, feed_listing, fetch_feed
 from .models import Vehicle, DealerInfo
+from .parsers import parse_dcs_detail, parse_dcs_listings
+from .pipeline import CollectingSink, IngestPipeline, Stage, download_photos, merge_photos
 from .site_patterns import SitePatternDetector
+from .vin_decoder import reconcile_with_vin
 
 logger = logging.getLogger(__name__)
 
 class DealerCarSearchScraper:
     """Specialized scraper for DealerCarSearch platform"""
     
-    def __init__(self):
+    def __init__(self, detail_concurrency: int = 3, parse_workers: int = 2, photo_concurrency: int = 4,
+                 feed_store=None):
         self.browser: Optional[Browser] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.detail_concurrency = detail_concurrency
+        self.parse_workers = parse_workers
+        self.photo_concurrency = photo_concurrency
+        # JSON inventory feeds found on earlier visits, by dealer URL; `feed_store` is an
+        # optional collection that keeps them between runs
+        self.feed_store = feed_store
+        self.feeds: Dict[str, Dict[str, Any]] = {}
         self.ua = UserAgent()
         
         # Anti-detection settings
@@ -80,28 +95,143 @@ class DealerCarSearchScraper:
         
     async def scrape_dealer(self, dealer_url: str, max_vehicles: int = 100) -> List[Vehicle]:
         """Main method to scrape a DealerCarSearch dealer website"""
+        sink = CollectingSink()
+        try:
+            await self.stream_dealer(dealer_url, sink, max_vehicles)
+        except Exception as e:
+            logger.error(f"Error scraping dealer {dealer_url}: {str(e)}")
+        return sink.items
+    
+    async def stream_dealer(self, dealer_url: str, sink, max_vehicles: int = 100) -> Dict[str, Any]:
+        """Scrape a dealer into a pipeline sink, handing over each vehicle as soon as it is complete.
+
+        A dealer whose JSON inventory feed is known is read straight from the
+        feed without a browser. Otherwise the inventory page is loaded in the
+        browser, recording its JSON responses so a feed found there is used
+        now and on later runs. Failing that, the page is parsed into
+        listings, whose detail pages are loaded by a few browser pages at a
+        time, parsed in a process pool and finished by the photo workers.
+        """
         logger.info(f"Starting DealerCarSearch scraping of: {dealer_url}")
         
+        feed = await self.load_feed(dealer_url)
+        if feed:
+            stats = await self.try_feed(feed, sink, max_vehicles)
+            if stats:
+                return stats
+            await self.forget_feed(dealer_url)
+        
+        # Initialize browser
+        await self.initialize_browser()
+        
+        # Detect inventory URL
+        inventory_url = await self.find_inventory_url(dealer_url)
+        logger.info(f"Found inventory URL: {inventory_url}")
+        
+        # Extract dealer info
+        dealer_info = await self.extract_dealer_info(dealer_url)
+        responses: List[RecordedResponse] = []
+        inventory_html = await self.fetch_inventory_html(inventory_url, responses)
+        
+        feed = discover_feed(responses, dealer_url)
+        if feed:
+            feed["dealer_name"] = dealer_info.name
+            logger.info(f"Found JSON inventory feed for {dealer_url}: {feed['url']}")
+            stats = await self.try_feed(feed, sink, max_vehicles)
+            if stats:
+                await self.save_feed(feed)
+                return stats
+        
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+            self.session = session
+            try:
+                pipeline = IngestPipeline([
+                    Stage("listings", parse_dcs_listings, concurrency=1, kind="process", fan_out=True),
+                    Stage("detail", self.fetch_detail_page, concurrency=self.detail_concurrency),
+                    Stage("parse", parse_dcs_detail, concurrency=self.parse_workers, kind="process"),
+                    Stage("photos", partial(self.build_vehicle, dealer_info), concurrency=self.photo_concurrency),
+                ], sink)
+                stats = await pipeline.run([(dealer_info.url, inventory_html, max_vehicles)])
+            finally:
+                self.session = None
+        
+        stats["mode"] = "browser"
+        logger.info(f"Successfully scraped {stats['emitted']} vehicles from {dealer_url}")
+        return stats
+    
+    async def load_feed(self, dealer_url: str) -> Optional[Dict[str, Any]]:
+        if dealer_url not in self.feeds and self.feed_store is not None:
+            feed = await self.feed_store.find_one({"dealer_url": dealer_url}, {"_id": 0})
+            if feed:
+                self.feeds[dealer_url] = feed
+        return self.feeds.get(dealer_url)
+    
+    async def save_feed(self, feed: Dict[str, Any]):
+        self.feeds[feed["dealer_url"]] = feed
+        if self.feed_store is not None:
+            await self.feed_store.update_one({"dealer_url": feed["dealer_url"]}, {"$set": feed}, upsert=True)
+    
+    async def forget_feed(self, dealer_url: str):
+        self.feeds.pop(dealer_url, None)
+        if self.feed_store is not None:
+            await self.feed_store.delete_one({"dealer_url": dealer_url})
+    
+    async def try_feed(self, feed: Dict[str, Any], sink, max_vehicles: int) -> Optional[Dict[str, Any]]:
+        """Scrape from a JSON feed; None if it failed before producing any vehicle"""
         try:
-            # Initialize browser
-            await self.initialize_browser()
-            
-            # Detect inventory URL
-            inventory_url = await self.find_inventory_url(dealer_url)
-            logger.info(f"Found inventory URL: {inventory_url}")
-            
-            # Extract dealer info
-            dealer_info = await self.extract_dealer_info(dealer_url)
-            
-            # Scrape the inventory page
-            vehicles = await self.scrape_inventory_page(inventory_url, dealer_info, max_vehicles)
-            
-            logger.info(f"Successfully scraped {len(vehicles)} vehicles from {dealer_url}")
-            return vehicles
-            
+            stats = await self.stream_feed(feed, sink, max_vehicles)
         except Exception as e:
-            logger.error(f"Error scraping dealer {dealer_url}: {str(e)}")
-            return []
+            logger.warning(f"Inventory feed {feed['url']} failed: {str(e)}")
+            return None
+        return stats if stats["emitted"] else None
+    
+    async def stream_feed(self, feed: Dict[str, Any], sink, max_vehicles: int = 100) -> Dict[str, Any]:
+        """Scrape a dealer from its JSON inventory feed over plain HTTP, without a browser"""
+        dealer_info = DealerInfo(
+            url=feed["dealer_url"],
+            name=feed.get("dealer_name"),
+            site_type='dealercarsearch',
+            has_inventory_page=True
+        )
+        headers = {
+            'User-Agent': random.choice(self.user_agents),
+            'Accept': 'application/json, text/javascript, */*; q=0.01',
+            'X-Requested-With': 'XMLHttpRequest',
+            'Referer': feed["dealer_url"],
+        }
+        
+        failures: List[Exception] = []
+        
+        async def listings():
+            try:
+                async for record in fetch_feed(self.session, feed, max_vehicles, headers=headers):
+                    listing = feed_listing(record, feed["dealer_url"])
+                    if listing:
+                        yield listing
+            except Exception as e:
+                failures.append(e)
+        
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+            self.session = session
+            try:
+                pipeline = IngestPipeline([
+                    Stage("photos", partial(self.build_vehicle, dealer_info), concurrency=self.photo_concurrency),
+                ], sink)
+                stats = await pipeline.run(listings())
+            finally:
+                self.session = None
+        
+        if failures:
+            # Vehicles read before the feed failed are still finished and kept; the feed
+            # only counts as failed when it produced nothing
+            if not stats["emitted"]:
+                raise failures[0]
+            logger.warning(f"Inventory feed {feed['url']} stopped after {stats['emitted']} vehicles: "
+                           f"{str(failures[0])}")
+            stats["error"] = str(failures[0])
+        stats["mode"] = "feed"
+        logger.info(f"Scraped {stats['emitted']} vehicles from the inventory feed of {feed['dealer_url']}")
+        return stats
     
     async def find_inventory_url(self, dealer_url: str) -> str:
         """Find the inventory URL for DealerCarSearch sites"""
@@ -168,10 +298,19 @@ class DealerCarSearchScraper:
         finally:
             await page.close()
     
-    async def scrape_inventory_page(self, inventory_url: str, dealer_info: DealerInfo, max_vehicles: int) -> List[Vehicle]:
-        """Scrape vehicles from DealerCarSearch inventory page"""
+    async def fetch_inventory_html(self, inventory_url: str,
+                                   responses: Optional[List[RecordedResponse]] = None) -> str:
+        """Rendered DealerCarSearch inventory page.
+
+        JSON responses to the page's XHR/fetch requests are appended to
+        `responses` with the request that produced them, for inventory feed
+        discovery.
+        """
         page = await self.create_stealth_page()
-        vehicles = []
+        xhr_responses = []
+        if responses is not None:
+            page.on("response", lambda response: xhr_responses.append(response)
+                    if response.request.resource_type in ("xhr", "fetch") else None)
         
         try:
             logger.info(f"Scraping DealerCarSearch inventory: {inventory_url}")
@@ -181,240 +320,85 @@ class DealerCarSearchScraper:
             # Simulate human behavior
             await self.simulate_human_behavior(page)
             
-            content = await page.content()
-            soup = BeautifulSoup(content, 'html.parser')
-            
-            # Find vehicle containers using DealerCarSearch patterns
-            vehicle_containers = self.find_vehicle_containers(soup)
-            
-            logger.info(f"Found {len(vehicle_containers)} vehicle containers")
-            
-            # Extract vehicle data from each container
-            for i, container in enumerate(vehicle_containers[:max_vehicles]):
+            for response in xhr_responses:
+                if 'json' not in response.headers.get('content-type', ''):
+                    continue
+                request = response.request
                 try:
-                    vehicle = await self.extract_vehicle_from_container(container, dealer_info, page)
-                    if vehicle:
-                        vehicles.append(vehicle)
-                        logger.info(f"Extracted vehicle {i+1}: {vehicle.year} {vehicle.make} {vehicle.model}")
-                        
+                    responses.append(RecordedResponse(response.url, await response.json(), request.method,
+                                                      request.post_data, request.headers.get('content-type')))
                 except Exception as e:
-                    logger.debug(f"Error extracting vehicle {i+1}: {str(e)}")
-                    continue
+                    logger.debug(f"Could not read XHR response {response.url}: {str(e)}")
             
-            return vehicles
+            return await page.content()
             
         finally:
             await page.close()
     
-    def find_vehicle_containers(self, soup: BeautifulSoup) -> List:
-        """Find individual vehicle containers in DealerCarSearch inventory"""
-        containers = []
-        
-        # DealerCarSearch specific patterns
-        # Look for containers with vehicle images
-        img_containers = soup.find_all('img', src=re.compile(r'imagescdn\.dealercarsearch\.com/Media/'))
-        
-        for img in img_containers:
-            # Find the parent container that holds this vehicle
-            container = img
-            for _ in range(5):  # Look up to 5 levels up
-                container = container.parent
-                if not container:
-                    break
-                    
-                # Check if this container has vehicle characteristics
-                container_text = container.get_text().lower()
-                if any(keyword in container_text for keyword in ['vdp/', 'used-', 'for-sale-in']):
-                    containers.append(container)
-                    break
-        
-        # Remove duplicates by checking for unique VDP links
-        unique_containers = []
-        seen_vdps = set()
-        
-        for container in containers:
-            vdp_links = container.find_all('a', href=re.compile(r'/vdp/'))
-            if vdp_links:
-                vdp_url = vdp_links[0]['href']
-                if vdp_url not in seen_vdps:
-                    seen_vdps.add(vdp_url)
-                    unique_containers.append(container)
-        
-        return unique_containers
-    
-    async def extract_vehicle_from_container(self, container, dealer_info: DealerInfo, page: Page) -> Optional[Vehicle]:
-        """Extract vehicle data from a DealerCarSearch container"""
-        try:
-            vehicle = Vehicle(dealer_url=dealer_info.url, dealer_name=dealer_info.name)
-            
-            # Extract basic info from container text
-            container_text = container.get_text()
-            
-            # Extract VDP link first for detail page scraping
-            vdp_links = container.find_all('a', href=re.compile(r'/vdp/'))
-            detail_url = None
-            if vdp_links:
-                detail_url = urljoin(dealer_info.url, vdp_links[0]['href'])
-                vehicle.vehicle_url = detail_url
-            
-            # Parse vehicle info from VDP URL if available
-            if detail_url:
-                self.parse_vehicle_info_from_vdp_url(detail_url, vehicle)
-            
-            # Extract images from container
-            images = container.find_all('img', src=re.compile(r'imagescdn\.dealercarsearch\.com/Media/'))
-            if images:
-                # Get the primary vehicle image
-                primary_img = images[0]
-                img_url = primary_img['src']
-                
-                # Convert to base64
-                base64_images = await self.download_photos_as_base64([img_url])
-                vehicle.photos = base64_images
-                vehicle.photo_count = len(base64_images)
-                vehicle.has_multiple_photos = len(base64_images) > 1
-                
-                # Extract alt text for additional info
-                alt_text = primary_img.get('alt', '')
-                if alt_text and not vehicle.make:
-                    self.parse_vehicle_info_from_text(alt_text, vehicle)
-            
-            # If we have a detail page, scrape it for more data
-            if detail_url and (not vehicle.price or not vehicle.mileage):
-                detail_data = await self.scrape_vehicle_detail_page(detail_url)
-                if detail_data:
-                    vehicle = self.merge_vehicle_data(vehicle, detail_data)
-            
-            # Calculate data completeness
-            vehicle.data_completeness = self.calculate_data_completeness(vehicle)
-            vehicle.has_detailed_specs = vehicle.data_completeness > 0.6
-            
-            # Only return if we have meaningful data
-            if vehicle.make and vehicle.model and vehicle.photos:
-                return vehicle
-            else:
-                logger.debug(f"Insufficient data for vehicle: {vehicle.make} {vehicle.model}")
-                return None
-                
-        except Exception as e:
-            logger.debug(f"Error extracting vehicle from container: {str(e)}")
-            return None
-    
-    def parse_vehicle_info_from_vdp_url(self, vdp_url: str, vehicle: Vehicle):
-        """Parse vehicle info from VDP URL pattern"""
-        # VDP URLs follow pattern: /vdp/ID/Used-YEAR-MAKE-MODEL-TRIM-for-sale-in-CITY-STATE-ZIP
-        try:
-            parts = vdp_url.split('/')
-            if len(parts) >= 3:
-                vehicle_part = parts[-1]  # Get the last part with vehicle info
-                
-                # Remove 'Used-' prefix and split by dashes
-                if vehicle_part.startswith('Used-'):
-                    vehicle_part = vehicle_part[5:]  # Remove 'Used-'
-                
-                # Split by dashes and try to extract year, make, model
-                parts = vehicle_part.split('-')
-                if len(parts) >= 3:
-                    # First part should be year
-                    try:
-                        vehicle.year = int(parts[0])
-                    except:
-                        pass
-                    
-                    # Second part should be make
-                    if len(parts) > 1:
-                        vehicle.make = parts[1].title()
-                    
-                    # Third part should be model
-                    if len(parts) > 2:
-                        vehicle.model = parts[2].title()
-                        
-        except Exception as e:
-            logger.debug(f"Error parsing VDP URL {vdp_url}: {str(e)}")
-    
-    def parse_vehicle_info_from_text(self, text: str, vehicle: Vehicle):
-        """Parse vehicle info from text like alt tags"""
-        try:
-            # Look for year pattern
-            year_match = re.search(r'\b(19|20)\d{2}\b', text)
-            if year_match and not vehicle.year:
-                vehicle.year = int(year_match.group(0))
-            
-            # Common car makes
-            makes = ['toyota', 'honda', 'ford', 'chevrolet', 'nissan', 'audi', 'bmw', 'mercedes', 'lexus', 'acura']
-            for make in makes:
-                if make in text.lower() and not vehicle.make:
-                    vehicle.make = make.title()
-                    break
-                    
-        except Exception as e:
-            logger.debug(f"Error parsing text '{text}': {str(e)}")
-    
-    async def scrape_vehicle_detail_page(self, detail_url: str) -> Dict[str, Any]:
-        """Scrape individual vehicle detail page for price, mileage, etc."""
+    async def fetch_detail_page(self, listing: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        """A listing with its rendered detail page; listings whose page fails keep their inventory data"""
         page = await self.create_stealth_page()
         
         try:
-            await page.goto(detail_url, timeout=20000)
+            await page.goto(listing['vehicle_url'], timeout=20000)
             await page.wait_for_load_state('networkidle')
-            
-            content = await page.content()
-            soup = BeautifulSoup(content, 'html.parser')
-            
-            detail_data = {}
-            
-            # Look for price
-            price_match = re.search(r'\$[\d,]+', content)
-            if price_match:
-                price_str = price_match.group(0).replace('$', '').replace(',', '')
-                try:
-                    detail_data['price'] = float(price_str)
-                except:
-                    pass
-            
-            # Look for mileage
-            mileage_match = re.search(r'([\d,]+)\s*mile[s]?', content, re.IGNORECASE)
-            if mileage_match:
-                mileage_str = mileage_match.group(1).replace(',', '')
-                try:
-                    detail_data['mileage'] = int(mileage_str)
-                except:
-                    pass
-            
-            # Look for VIN
-            vin_match = re.search(r'VIN:?\s*([A-HJ-NPR-Z0-9]{17})', content, re.IGNORECASE)
-            if vin_match:
-                detail_data['vin'] = vin_match.group(1)
-            
-            # Look for additional photos
-            detail_images = soup.find_all('img', src=re.compile(r'imagescdn\.dealercarsearch\.com/Media/'))
-            if detail_images:
-                photo_urls = [img['src'] for img in detail_images[:10]]  # Limit to 10 photos
-                base64_photos = await self.download_photos_as_base64(photo_urls)
-                detail_data['photos'] = base64_photos
-            
-            return detail_data
-            
+            return listing, await page.content()
         except Exception as e:
-            logger.debug(f"Error scraping detail page {detail_url}: {str(e)}")
-            return {}
+            logger.debug(f"Error scraping detail page {listing['vehicle_url']}: {str(e)}")
+            return listing, ""
         finally:
-            await page.close()
+            await page.context.close()
+    
+    async def build_vehicle(self, dealer_info: DealerInfo, listing: Dict[str, Any]) -> Optional[Vehicle]:
+        """Vehicle from a parsed listing and its detail data, with photos downloaded"""
+        vehicle = Vehicle(
+            dealer_url=dealer_info.url,
+            dealer_name=dealer_info.name,
+            vehicle_url=listing['vehicle_url'],
+            year=listing.get('year'),
+            make=listing.get('make'),
+            model=listing.get('model'),
+        )
+        detail_data = dict(listing.get('detail', {}))
+        
+        # The detail gallery repeats the listing photo; don't download it twice
+        listing_urls = listing.get('image_urls', [])
+        listing_keys = {dcs_photo_key(url) or url for url in listing_urls}
+        detail_urls = [url for url in detail_data.pop('photo_urls', [])
+                       if (dcs_photo_key(url) or url) not in listing_keys]
+        primary_photos, detail_photos = await asyncio.gather(
+            self.download_photos_as_base64(listing_urls),
+            self.download_photos_as_base64(detail_urls)
+        )
+        vehicle.photos = primary_photos
+        vehicle.photo_count = len(primary_photos)
+        vehicle.has_multiple_photos = len(primary_photos) > 1
+        if detail_photos:
+            detail_data['photos'] = detail_photos
+        vehicle = self.merge_vehicle_data(vehicle, detail_data)
+        
+        # Year/make parsed from URLs and alt text are guesses; a valid VIN is authoritative
+        if vehicle.vin:
+            vehicle.year, vehicle.make = reconcile_with_vin(vehicle.vin, vehicle.year, vehicle.make)
+        
+        # Calculate data completeness
+        vehicle.data_completeness = self.calculate_data_completeness(vehicle)
+        vehicle.has_detailed_specs = vehicle.data_completeness > 0.6
+        
+        # Only return if we have meaningful data
+        if vehicle.make and vehicle.model and vehicle.photos:
+            logger.info(f"Extracted vehicle: {vehicle.year} {vehicle.make} {vehicle.model}")
+            return vehicle
+        logger.debug(f"Insufficient data for vehicle: {vehicle.make} {vehicle.model}")
+        return None
     
     def merge_vehicle_data(self, vehicle: Vehicle, detail_data: Dict[str, Any]) -> Vehicle:
         """Merge detail page data with vehicle data"""
         for key, value in detail_data.items():
             if hasattr(vehicle, key) and value:
                 if key == 'photos':
-                    # Extend photos list
-                    existing_photos = vehicle.photos or []
-                    all_photos = existing_photos + value
-                    # Remove duplicates while preserving order
-                    unique_photos = []
-                    for photo in all_photos:
-                        if photo not in unique_photos:
-                            unique_photos.append(photo)
-                    vehicle.photos = unique_photos[:10]  # Limit to 10
+                    # Extend photos list, keeping each photo once
+                    vehicle.photos = merge_photos(vehicle.photos, value, limit=10)  # Limit to 10
                     vehicle.photo_count = len(vehicle.photos)
                     vehicle.has_multiple_photos = len(vehicle.photos) > 1
                 else:
@@ -423,31 +407,13 @@ class DealerCarSearchScraper:
         return vehicle
     
     async def download_photos_as_base64(self, photo_urls: List[str]) -> List[str]:
-        """Download photos and convert to base64"""
-        base64_photos = []
-        
-        for url in photo_urls:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, timeout=10) as response:
-                        if response.status == 200:
-                            content = await response.read()
-                            
-                            # Get content type
-                            content_type = response.headers.get('content-type', 'image/jpeg')
-                            
-                            # Encode to base64
-                            base64_data = base64.b64encode(content).decode('utf-8')
-                            base64_url = f"data:{content_type};base64,{base64_data}"
-                            
-                            base64_photos.append(base64_url)
-                            logger.info(f"Downloaded real dealer photo: {url}")
-                            
-            except Exception as e:
-                logger.debug(f"Error downloading photo {url}: {str(e)}")
-                continue
-        
-        return base64_photos
+        """Download photos concurrently and convert to base64"""
+        if not photo_urls:
+            return []
+        if self.session:
+            return await download_photos(self.session, photo_urls, limit=len(photo_urls))
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+            return await download_photos(session, photo_urls, limit=len(photo_urls))
     
     async def simulate_human_behavior(self, page: Page):
         """Simulate human-like browsing behavior"""
@@ -0,0 +1,247 @@
+import asyncio
+import base64
+import io
+import logging
+import re
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from pymongo import InsertOne, UpdateOne
+
+from .vin_decoder import canonical_make, normalize_vin
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+    logger.warning("Pillow is not installed; duplicate listings will be matched on VIN only")
+
+HASH_BITS = 64
+MAX_PHOTO_DISTANCE = 4  # differing dHash bits still counted as the same photo (resized, recompressed)
+MILEAGE_TOLERANCE = 500  # odometer readings further apart than this are different cars
+SHARED_PHOTO_VEHICLES = 2  # a photo already on this many different vehicles is a stock or placeholder image
+
+def photo_hash(photo: Union[str, bytes, None]) -> Optional[str]:
+    """64-bit difference hash of a photo (bytes or a base64 data URL) as 16 hex digits"""
+    if Image is None or not photo:
+        return None
+    try:
+        if isinstance(photo, str):
+            if not photo.startswith('data:'):
+                return None
+            photo = base64.b64decode(photo.split(',', 1)[1])
+        with Image.open(io.BytesIO(photo)) as image:
+            image.draft('L', (64, 64))  # JPEGs decode straight to a small grayscale image
+            pixels = np.asarray(image.convert('L').resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    except Exception as e:
+        logger.debug(f"Could not hash photo: {str(e)}")
+        return None
+    return np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes().hex()
+
+class MultiIndexHash:
+    """Hamming-radius search over 64-bit hashes by multi-index hashing.
+
+    Hashes are split into `max_distance + 1` bands with one exact-match table
+    per band. Two hashes within `max_distance` bits of each other must agree on
+    at least one whole band, so a query probes one bucket per band and only
+    verifies those candidates instead of scanning every hash.
+    """
+    def __init__(self, max_distance: int = MAX_PHOTO_DISTANCE, bits: int = HASH_BITS):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        widths = [bits // bands + (1 if band < bits % bands else 0) for band in range(bands)]
+        self.bands: List[Tuple[int, int]] = []
+        shift = bits
+        for width in widths:
+            shift -= width
+            self.bands.append((shift, (1 << width) - 1))
+        self.tables: List[Dict[int, List[str]]] = [{} for _ in self.bands]
+        self.hashes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, key: str, value: int):
+        if key in self.hashes:
+            return
+        self.hashes[key] = value
+        for table, (shift, mask) in zip(self.tables, self.bands):
+            table.setdefault((value >> shift) & mask, []).append(key)
+
+    def search(self, value: int) -> List[Tuple[str, int]]:
+        """Keys within max_distance bits of `value`, nearest first"""
+        matches = {}
+        for table, (shift, mask) in zip(self.tables, self.bands):
+            for key in table.get((value >> shift) & mask, ()):
+                if key not in matches:
+                    distance = bin(self.hashes[key] ^ value).count('1')
+                    if distance <= self.max_distance:
+                        matches[key] = distance
+        return sorted(matches.items(), key=lambda match: match[1])
+
+class _Listing(NamedTuple):
+    vin: Optional[str]
+    year: Optional[int]
+    make: Optional[str]
+    model: str
+    mileage: Optional[int]
+
+def _model_key(model: Optional[str]) -> str:
+    return re.sub(r'[^a-z0-9]', '', (model or '').lower())
+
+def _listing(vehicle: Dict[str, Any]) -> _Listing:
+    mileage = vehicle.get('mileage')
+    return _Listing(
+        normalize_vin(vehicle.get('vin')),
+        int(vehicle['year']) if vehicle.get('year') else None,
+        canonical_make(vehicle.get('make')),
+        _model_key(vehicle.get('model')),
+        int(mileage) if mileage is not None else None,
+    )
+
+def _same_vehicle(a: _Listing, b: _Listing) -> bool:
+    """Whether two photo-matched listings are one car; without both odometer readings they aren't"""
+    if a.vin and b.vin:
+        return a.vin == b.vin
+    if not (a.year and a.make and a.model) or (a.year, a.make) != (b.year, b.make):
+        return False
+    # Dealers abbreviate trims differently ("Civic" / "Civic LX")
+    if not (a.model.startswith(b.model) or b.model.startswith(a.model)):
+        return False
+    return a.mileage is not None and b.mileage is not None and abs(a.mileage - b.mileage) <= MILEAGE_TOLERANCE
+
+def listing_source(vehicle: Dict[str, Any]) -> Dict[str, Any]:
+    """Entry for a vehicle's `sources` list: where it is listed and at what price"""
+    return {
+        "source_url": vehicle.get('source_url'),
+        "dealer_id": vehicle.get('dealer_id'),
+        "dealer_name": vehicle.get('dealer_name'),
+        "price": vehicle.get('price'),
+        "mileage": vehicle.get('mileage'),
+        "seen_at": vehicle.get('scraped_at') or datetime.utcnow(),
+    }
+
+class VehicleDeduplicator:
+    """Merges the same car listed by several dealers into one canonical vehicle.
+
+    A listing matches a known vehicle by source URL, then by normalized VIN,
+    and otherwise by a near-identical primary photo (found through a
+    multi-index hash) with the same year, make and model and a close odometer
+    reading; a photo already on several vehicles is a placeholder and never
+    matches. `operations()` turns a listing into the write requests that
+    either create its canonical vehicle or add it to the matched vehicle's
+    `sources`; `resolve()` is the same as an async pipeline step.
+    """
+    PROJECTION = {"_id": 0, "id": 1, "vin": 1, "year": 1, "make": 1, "model": 1, "mileage": 1,
+                  "photo_hash": 1, "source_url": 1, "sources.source_url": 1}
+
+    def __init__(self, max_photo_distance: int = MAX_PHOTO_DISTANCE):
+        self.vehicles: Dict[str, _Listing] = {}
+        self.by_vin: Dict[str, str] = {}
+        self.by_source: Dict[str, str] = {}
+        self.primary_source: Dict[str, str] = {}
+        self.photos = MultiIndexHash(max_photo_distance)
+
+    def __len__(self) -> int:
+        return len(self.vehicles)
+
+    def load_documents(self, documents: Iterable[Dict[str, Any]]):
+        """Index stored vehicles (projected with PROJECTION)"""
+        for document in documents:
+            if not document.get("id"):
+                continue
+            self._register(document["id"], document)
+            for source in document.get("sources") or []:
+                if source.get("source_url"):
+                    self.by_source.setdefault(source["source_url"], document["id"])
+
+    async def load(self, collection):
+        documents = await collection.find({}, self.PROJECTION).to_list(None)
+        await asyncio.to_thread(self.load_documents, documents)
+        logger.info(f"Indexed {len(self.vehicles)} vehicles ({len(self.photos)} photo hashes) for deduplication")
+
+    def _register(self, vehicle_id: str, vehicle: Dict[str, Any]):
+        listing = _listing(vehicle)
+        self.vehicles[vehicle_id] = listing
+        if listing.vin:
+            self.by_vin.setdefault(listing.vin, vehicle_id)
+        if vehicle.get('source_url'):
+            self.by_source[vehicle['source_url']] = vehicle_id
+            self.primary_source[vehicle_id] = vehicle['source_url']
+        if vehicle.get('photo_hash'):
+            self.photos.add(vehicle_id, int(vehicle['photo_hash'], 16))
+
+    def match(self, vehicle: Dict[str, Any]) -> Optional[str]:
+        """Id of the known vehicle this listing duplicates, if any"""
+        if vehicle.get('source_url') in self.by_source:
+            return self.by_source[vehicle['source_url']]
+        listing = _listing(vehicle)
+        if listing.vin in self.by_vin:
+            return self.by_vin[listing.vin]
+        if not vehicle.get('photo_hash'):
+            return None
+        candidates = self.photos.search(int(vehicle['photo_hash'], 16))
+        # Distinct vehicles sharing the photo means it shows no particular car ("photo coming soon")
+        if len(candidates) >= SHARED_PHOTO_VEHICLES:
+            return None
+        for candidate_id, _ in candidates:
+            if _same_vehicle(listing, self.vehicles[candidate_id]):
+                return candidate_id
+        return None
+
+    def operations(self, vehicle: Dict[str, Any]) -> List[Union[InsertOne, UpdateOne]]:
+        """Write requests storing a listing as a new vehicle or as a source of the one it duplicates"""
+        vehicle = dict(vehicle)
+        if not vehicle.get('photo_hash') and vehicle.get('images'):
+            vehicle['photo_hash'] = photo_hash(vehicle['images'][0])
+        source = listing_source(vehicle)
+        source_url = vehicle.get('source_url')
+        canonical_id = self.match(vehicle)
+
+        if canonical_id is None or (source_url and self.primary_source.get(canonical_id) == source_url):
+            vehicle_id = canonical_id or vehicle.get('id') or str(uuid.uuid4())
+            vehicle['id'] = vehicle_id
+            self._register(vehicle_id, vehicle)
+            if not source_url:
+                return [InsertOne({**vehicle, "sources": [source]})]
+            fields = {name: value for name, value in vehicle.items()
+                      if name not in ("_id", "id", "created_at", "sources")}
+            return [
+                UpdateOne({"source_url": source_url},
+                          {"$set": fields,
+                           "$setOnInsert": {"id": vehicle_id, "created_at": vehicle.get('created_at') or datetime.utcnow()}},
+                          upsert=True),
+            ] + self._source_operations({"source_url": source_url}, source)
+
+        # A duplicate only refreshes the canonical vehicle's sources and last-seen time
+        if source_url:
+            self.by_source[source_url] = canonical_id
+        listing = _listing(vehicle)
+        operations = self._source_operations({"id": canonical_id}, source)
+        if listing.vin and not self.vehicles[canonical_id].vin:
+            self.vehicles[canonical_id] = self.vehicles[canonical_id]._replace(vin=listing.vin)
+            self.by_vin.setdefault(listing.vin, canonical_id)
+            operations.append(UpdateOne({"id": canonical_id, "vin": None}, {"$set": {"vin": listing.vin}}))
+        return operations
+
+    def _source_operations(self, selector: Dict[str, Any], source: Dict[str, Any]) -> List[UpdateOne]:
+        """Replace the vehicle's entry for this source, or append one; exactly one of the two matches"""
+        field, value = ("source_url", source["source_url"]) if source["source_url"] else \
+            ("dealer_name", source["dealer_name"])
+        now = datetime.utcnow()
+        return [
+            UpdateOne({**selector, f"sources.{field}": value},
+                      {"$set": {"sources.$": source, "scraped_at": now, "updated_at": now}}),
+            UpdateOne({**selector, f"sources.{field}": {"$ne": value}},
+                      {"$push": {"sources": source}, "$set": {"scraped_at": now, "updated_at": now}}),
+        ]
+
+    async def resolve(self, vehicle: Dict[str, Any]) -> List[Union[InsertOne, UpdateOne]]:
+        """Pipeline step: hash the primary photo off the event loop, then build the write requests"""
+        if not vehicle.get('photo_hash') and vehicle.get('images'):
+            vehicle = {**vehicle, 'photo_hash': await asyncio.to_thread(photo_hash, vehicle['images'][0])}
+        return self.operations(vehicle)
@@ -0,0 +1,70 @@
+import csv
+import logging
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Offline ZIP centroid table (zip,city,state,latitude,longitude) covering every active
+# US ZIP code with a location, including PO box and unique ZIPs that have no ZCTA.
+# A table built from the Census ZCTA gazetteer in the same format can be dropped in place.
+ZIP_CENTROIDS_PATH = Path(__file__).resolve().parent.parent / 'data' / 'zip_centroids.csv'
+
+METERS_PER_MILE = 1609.344
+EARTH_RADIUS_MILES = 3963.2  # radius used to convert miles to radians for $centerSphere
+
+_zip_centroids: Optional[Dict[str, Tuple[float, float]]] = None
+_city_centroids: Optional[Dict[Tuple[str, str], Tuple[float, float]]] = None
+
+def _load_centroids():
+    global _zip_centroids, _city_centroids
+    _zip_centroids, _city_centroids = {}, {}
+    city_points = {}
+    try:
+        with open(ZIP_CENTROIDS_PATH, newline='') as f:
+            for row in csv.DictReader(f):
+                point = (float(row['latitude']), float(row['longitude']))
+                _zip_centroids[row['zip']] = point
+                city_points.setdefault((row['city'].lower(), row['state'].upper()), []).append(point)
+    except OSError as e:
+        logger.error(f"Could not load ZIP centroids {ZIP_CENTROIDS_PATH}: {str(e)}")
+    # A city's centroid is the mean of its ZIP centroids
+    for key, points in city_points.items():
+        _city_centroids[key] = (
+            sum(lat for lat, _ in points) / len(points),
+            sum(lng for _, lng in points) / len(points),
+        )
+
+def lookup_zip(zip_code: Optional[str]) -> Optional[Tuple[float, float]]:
+    """(latitude, longitude) of a 5-digit ZIP (ZIP+4 accepted)"""
+    if not zip_code:
+        return None
+    if _zip_centroids is None:
+        _load_centroids()
+    match = re.match(r'\s*(\d{5})', str(zip_code))
+    return _zip_centroids.get(match.group(1)) if match else None
+
+def lookup_city(city: Optional[str], state: Optional[str]) -> Optional[Tuple[float, float]]:
+    """(latitude, longitude) of a city, averaged over its ZIP centroids"""
+    if not city or not state:
+        return None
+    if _city_centroids is None:
+        _load_centroids()
+    return _city_centroids.get((city.strip().lower(), state.strip().upper()))
+
+def geocode(zip_code: Optional[str] = None, city: Optional[str] = None,
+            state: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """GeoJSON Point for a ZIP, falling back to the city centroid"""
+    point = lookup_zip(zip_code) or lookup_city(city, state)
+    if not point:
+        return None
+    latitude, longitude = point
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+def extract_zip(address: Optional[str]) -> Optional[str]:
+    """Trailing ZIP code of a street address like "123 Main St, Nashville, TN 37201" """
+    if not address:
+        return None
+    match = re.search(r'\b(\d{5})(?:-\d{4})?\s*$', address.strip())
+    return match.group(1) if match else None
@@ -0,0 +1,282 @@
+"""Dealer-site JSON inventory feeds.
+
+Most dealer platforms render their inventory pages from an internal JSON
+endpoint. Responses recorded while a browser loads the inventory page are
+checked for a list of vehicle records; once found, the feed can be fetched
+directly over HTTP and its fields mapped by name instead of parsing rendered
+HTML with regexes.
+"""
+import json
+import logging
+import re
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from .dcs_photos import select_dcs_photos
+from .pagination import PAGE_PARAMS
+from .vin_decoder import canonical_make
+
+logger = logging.getLogger(__name__)
+
+# Feed field names for each vehicle field, compared lowercased without punctuation
+FIELD_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "vin": ("vin", "vinnumber", "vehiclevin"),
+    "year": ("year", "modelyear", "vehicleyear"),
+    "make": ("make", "makename", "manufacturer", "brand"),
+    "model": ("model", "modelname"),
+    "trim": ("trim", "trimlevel", "series"),
+    "price": ("internetprice", "saleprice", "sellingprice", "finalprice", "askingprice", "price",
+              "retailprice", "listprice", "msrp"),
+    "mileage": ("mileage", "miles", "odometer", "odometerreading"),
+    "stock_number": ("stocknumber", "stockno", "stock", "stocknum"),
+    "body_type": ("bodystyle", "bodytype", "body"),
+    "transmission": ("transmission", "transmissiontype"),
+    "engine": ("engine", "enginedescription"),
+    "fuel_type": ("fueltype", "fuel"),
+    "drivetrain": ("drivetrain", "drivetype", "drive"),
+    "exterior_color": ("exteriorcolor", "extcolor", "color"),
+    "interior_color": ("interiorcolor", "intcolor"),
+    "description": ("description", "comments", "sellernotes"),
+    "vehicle_url": ("vdpurl", "detailurl", "detailsurl", "vehicleurl", "url", "link", "href"),
+    "photo_urls": ("photos", "photourls", "images", "imageurls", "pictures", "media", "imagelist"),
+}
+_ALIAS_FIELDS = {alias: field for field, aliases in FIELD_ALIASES.items() for alias in aliases}
+class RecordedResponse(NamedTuple):
+    """A JSON response seen while the inventory page loaded, with the request that produced it"""
+    url: str
+    payload: Any
+    method: str = "GET"
+    body: Optional[str] = None  # request body of a POST
+    content_type: Optional[str] = None  # of the request body
+
+_IDENTIFYING_FIELDS = {"vin", "year", "make", "model", "price", "mileage", "stock_number"}
+MIN_IDENTIFYING_FIELDS = 3
+
+def _key(name: str) -> str:
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+def _scalar(value: Any) -> Any:
+    # Some feeds nest values: {"make": {"id": 12, "name": "Honda"}}
+    if isinstance(value, dict):
+        nested = {_key(name): item for name, item in value.items()}
+        for name in ("name", "value", "label", "text", "description"):
+            if name in nested:
+                return nested[name]
+        return None
+    return value
+
+def _number(value: Any) -> Optional[float]:
+    value = _scalar(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        digits = re.sub(r'[^\d.]', '', value)
+        try:
+            return float(digits) if digits else None
+        except ValueError:
+            return None
+    return None
+
+def _photo_urls(value: Any, base_url: str) -> List[str]:
+    if isinstance(value, str):
+        value = re.split(r'[,|\s]+', value)
+    urls = []
+    for item in value if isinstance(value, list) else []:
+        if isinstance(item, dict):
+            item = next((item[name] for name in item if _key(name) in ("url", "src", "uri", "href", "large", "path")
+                         and isinstance(item[name], str)), None)
+        if isinstance(item, str) and item:
+            urls.append(urljoin(base_url, item))
+    return list(dict.fromkeys(urls))
+
+def _record_fields(record: Dict[str, Any]) -> Dict[str, str]:
+    """{vehicle field: feed key} for a record; the first alias listed wins"""
+    fields: Dict[str, str] = {}
+    ranks: Dict[str, int] = {}
+    for name in record:
+        field = _ALIAS_FIELDS.get(_key(name))
+        if field:
+            rank = FIELD_ALIASES[field].index(_key(name))
+            if field not in fields or rank < ranks[field]:
+                fields[field], ranks[field] = name, rank
+    return fields
+
+def _is_vehicle_list(value: Any) -> bool:
+    if not isinstance(value, list) or not value or not all(isinstance(item, dict) for item in value[:5]):
+        return False
+    return all(len(_IDENTIFYING_FIELDS & set(_record_fields(item))) >= MIN_IDENTIFYING_FIELDS for item in value[:5])
+
+def find_records(payload: Any, path: Optional[Sequence[str]] = None) -> Tuple[Optional[List[str]], List[Dict[str, Any]]]:
+    """The vehicle records in a JSON payload and the key path to them.
+
+    With a known `path` the records are read from there; otherwise the largest
+    list of vehicle-like objects anywhere in the payload is used.
+    """
+    if path is not None:
+        value = payload
+        for name in path:
+            value = value.get(name) if isinstance(value, dict) else None
+        return (list(path), value) if _is_vehicle_list(value) else (None, [])
+
+    best: Tuple[Optional[List[str]], List[Dict[str, Any]]] = (None, [])
+    stack: List[Tuple[List[str], Any]] = [([], payload)]
+    while stack:
+        current_path, value = stack.pop()
+        if _is_vehicle_list(value):
+            if len(value) > len(best[1]):
+                best = (current_path, value)
+        elif isinstance(value, dict):
+            stack.extend((current_path + [name], item) for name, item in value.items())
+    return best
+
+def map_feed_record(record: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+    """Vehicle fields from one feed record"""
+    fields = _record_fields(record)
+    vehicle: Dict[str, Any] = {}
+    for field, name in fields.items():
+        value = record[name]
+        if field == "photo_urls":
+            vehicle[field] = _photo_urls(value, base_url)
+        elif field in ("price", "mileage", "year"):
+            number = _number(value)
+            if number:
+                vehicle[field] = number if field == "price" else int(number)
+        else:
+            value = _scalar(value)
+            if isinstance(value, (str, int, float)) and not isinstance(value, bool) and str(value).strip():
+                vehicle[field] = str(value).strip()
+    if vehicle.get("vehicle_url"):
+        vehicle["vehicle_url"] = urljoin(base_url, vehicle["vehicle_url"])
+    if vehicle.get("make"):
+        vehicle["make"] = canonical_make(vehicle["make"])
+    if vehicle.get("vin"):
+        vehicle["vin"] = vehicle["vin"].upper()
+    return vehicle
+
+def _page_param(url: str) -> Optional[Tuple[str, int]]:
+    for name, value in parse_qsl(urlsplit(url).query):
+        if name.lower() in PAGE_PARAMS and value.isdigit():
+            return name, int(value)
+    return None
+
+def _with_page(url: str, param: str, number: int) -> str:
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if name != param]
+    return urlunsplit(parts._replace(query=urlencode(query + [(param, str(number))])))
+
+def _json_body(body: Optional[str]) -> Optional[Dict[str, Any]]:
+    try:
+        value = json.loads(body) if body else None
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+def _body_page_param(body: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Page parameter of a POST body, JSON ({"page": 2}) or form-encoded (page=2)"""
+    fields = _json_body(body)
+    items = fields.items() if fields is not None else parse_qsl(body or '')
+    for name, value in items:
+        if name.lower() in PAGE_PARAMS and str(value).isdigit():
+            return name, int(value)
+    return None
+
+def _with_body_page(body: str, param: str, number: int) -> str:
+    fields = _json_body(body)
+    if fields is not None:
+        return json.dumps({**fields, param: number})
+    query = [(name, value) for name, value in parse_qsl(body, keep_blank_values=True) if name != param]
+    return urlencode(query + [(param, str(number))])
+
+def discover_feed(responses: Sequence[Tuple], dealer_url: str) -> Optional[Dict[str, Any]]:
+    """Feed description from recorded responses, or None if none lists vehicles.
+
+    Responses are RecordedResponse tuples, or plain (url, JSON payload) pairs
+    for GET requests. The request's method and body are kept, so a feed the
+    page POSTs to is replayed as a POST.
+    """
+    best = None
+    for response in responses:
+        response = RecordedResponse(*response)
+        path, records = find_records(response.payload)
+        if records and (best is None or len(records) > best[2]):
+            best = (response, path, len(records))
+    if not best:
+        return None
+    response, path, count = best
+    method = (response.method or "GET").upper()
+    body = response.body if method != "GET" else None
+    page = _page_param(response.url)
+    body_page = _body_page_param(body) if body and not page else None
+    return {
+        "dealer_url": dealer_url,
+        "url": _with_page(response.url, page[0], 1) if page else response.url,
+        "method": method,
+        "body": _with_body_page(body, body_page[0], 1) if body_page else body,
+        "content_type": response.content_type if body else None,
+        "records_path": path,
+        "page_param": (page or body_page or (None,))[0],
+        "page_in_body": bool(body_page),
+        "page_size": count,
+        "discovered_at": datetime.utcnow(),
+    }
+
+async def fetch_feed(session, feed: Dict[str, Any], max_vehicles: int, max_pages: int = 50,
+                     headers: Optional[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Mapped vehicle records from a feed, following its page parameter until a page adds nothing"""
+    seen = set()
+    emitted = 0
+    headers = dict(headers or {})
+    if feed.get("content_type"):
+        headers["Content-Type"] = feed["content_type"]
+    for number in range(1, max_pages + 1):
+        url, body = feed["url"], feed.get("body")
+        if feed.get("page_param") and feed.get("page_in_body"):
+            body = _with_body_page(body, feed["page_param"], number)
+        elif feed.get("page_param"):
+            url = _with_page(url, feed["page_param"], number)
+        async with session.request(feed.get("method") or "GET", url, data=body, headers=headers) as response:
+            if response.status != 200:
+                raise ValueError(f"Inventory feed returned {response.status}")
+            payload = json.loads(await response.text())
+        _, records = find_records(payload, feed.get("records_path"))
+        new_records = 0
+        for record in records:
+            vehicle = map_feed_record(record, feed["dealer_url"])
+            identity = vehicle.get("vin") or vehicle.get("vehicle_url") or vehicle.get("stock_number")
+            if identity is not None:
+                if identity in seen:
+                    continue
+                seen.add(identity)
+            new_records += 1
+            yield vehicle
+            emitted += 1
+            if emitted >= max_vehicles:
+                return
+        if not feed.get("page_param") or not new_records:
+            return
+
+def feed_listing(vehicle: Dict[str, Any], dealer_url: str) -> Optional[Dict[str, Any]]:
+    """A mapped feed record in the listing shape of the DealerCarSearch pipeline (None without an identity)"""
+    vehicle = dict(vehicle)
+    vehicle_url = vehicle.pop("vehicle_url", None)
+    if not vehicle_url:
+        identity = vehicle.get("vin") or vehicle.get("stock_number")
+        if not identity:
+            return None
+        vehicle_url = f"{dealer_url.rstrip('/')}/#{identity}"
+    photo_urls = vehicle.pop("photo_urls", [])
+    photo_urls = list(select_dcs_photos(photo_urls).values()) or photo_urls
+    # Listings elsewhere carry the trim in the model ("Civic LX")
+    trim = vehicle.pop("trim", None)
+    if trim and vehicle.get("model") and trim.lower() not in vehicle["model"].lower():
+        vehicle["model"] = f"{vehicle['model']} {trim}"
+    listing: Dict[str, Any] = {
+        "vehicle_url": vehicle_url,
+        "year": vehicle.pop("year", None),
+        "make": vehicle.pop("make", None),
+        "model": vehicle.pop("model", None),
+        "image_urls": photo_urls[:1],
+    }
+    listing["detail"] = {**vehicle, "photo_urls": photo_urls[1:10]}
+    return listing
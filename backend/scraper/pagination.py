@@ -0,0 +1,182 @@
+"""Inventory pagination detection.
+
+Dealer sites page their inventory in one of a few ways: a page number in the
+query string (`?page=3`, `?pg=3`), a path segment (`/page/3`), only a "next"
+link, or a JSON endpoint that an infinite-scroll script calls. The scheme is
+learned from the links and scripts on the first page, so the remaining pages
+can be requested directly, and in parallel when the page count is known.
+"""
+import json
+import math
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from bs4 import BeautifulSoup
+
+PAGE_PARAMS = ("page", "pg", "p", "pagenum", "pagenumber", "pageindex", "pageno", "currentpage", "paged")
+
+DETAIL_SELECTORS = [
+    'a[href*="detail"]', 'a[href*="vehicle"]', 'a[href*="car"]',
+    'a[href*="view"]', 'a[href*="show"]', '.vehicle-link a',
+    '.car-link a', '.inventory-item a', '.vehicle-card a'
+]
+DETAIL_WORDS = ('detail', 'vehicle', 'car', 'view', 'vdp')
+
+_PATH_PAGE = re.compile(r'/(page|p|pg)/(\d+)/?$', re.IGNORECASE)
+_PAGE_OF = re.compile(r'page\s+\d+\s+of\s+(\d+)', re.IGNORECASE)
+_RESULTS_OF = re.compile(r'(?:showing|displaying|viewing)?\s*(\d+)\s*(?:-|–|to)\s*(\d+)\s+of\s+([\d,]+)', re.IGNORECASE)
+_RESULTS_FOUND = re.compile(r'([\d,]+)\s+(?:vehicles|cars|results|matches)\s+(?:found|available|match)', re.IGNORECASE)
+_NEXT_TEXT = re.compile(r'^\s*(next|next page|›|»|>|>>)\s*$', re.IGNORECASE)
+_JSON_ENDPOINT = re.compile(
+    r'["\']((?:https?://[^"\']+)?/[^"\'\s]*(?:api|ajax|json|getinventory|loadmore)[^"\'\s]*?[?&]'
+    r'(page|pg|p|pagenumber|pageindex|pageno|currentpage)=)(\d*)', re.IGNORECASE
+)
+
+class Pagination(NamedTuple):
+    scheme: Optional[str]  # "query", "path", "next", "json" or None for a single page
+    base_url: str
+    param: Optional[str] = None  # page query parameter for "query" and "json"
+    total_pages: Optional[int] = None  # stated on the page ("Page 1 of 12", "1-24 of 287")
+    next_url: Optional[str] = None
+    linked_pages: int = 1  # highest page number linked from the first page
+
+    def page_url(self, number: int) -> Optional[str]:
+        """URL of a 1-based page, for schemes that address pages by number"""
+        if self.scheme in ("query", "json"):
+            parts = urlsplit(self.base_url)
+            query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                     if name != self.param]
+            return urlunsplit(parts._replace(query=urlencode(query + [(self.param, str(number))])))
+        if self.scheme == "path":
+            return f"{_PATH_PAGE.sub('', self.base_url).rstrip('/')}/page/{number}"
+        return None
+
+def parse_detail_links(html: str, base_url: str) -> List[str]:
+    """Vehicle detail page links on an inventory page, in page order"""
+    soup = BeautifulSoup(html, 'html.parser')
+    links: List[str] = []
+    for selector in DETAIL_SELECTORS:
+        for link in soup.select(selector):
+            href = link.get('href')
+            if href and any(word in href.lower() for word in DETAIL_WORDS):
+                links.append(urljoin(base_url, href))
+    # If no specific selectors work, look for links with VIN or ID patterns
+    if not links:
+        for link in soup.find_all('a', href=True):
+            if re.search(r'/\d+$|vin=|id=|vehicle-\d+', link['href'], re.IGNORECASE):
+                links.append(urljoin(base_url, link['href']))
+    return [link for link in dict.fromkeys(links) if not _is_page_link(link)]
+
+def json_detail_links(payload: Any, base_url: str) -> List[str]:
+    """Detail page links in an inventory JSON response (any string field that looks like one)"""
+    links: List[str] = []
+
+    def walk(value: Any, key: str = ''):
+        if isinstance(value, dict):
+            for name, item in value.items():
+                walk(item, name.lower())
+        elif isinstance(value, list):
+            for item in value:
+                walk(item, key)
+        elif isinstance(value, str) and ('url' in key or 'link' in key or 'href' in key):
+            if any(word in value.lower() for word in DETAIL_WORDS) and \
+                    not re.search(r'\.(jpe?g|png|webp|gif)(\?|$)', value, re.IGNORECASE):
+                links.append(urljoin(base_url, value))
+
+    walk(payload)
+    return list(dict.fromkeys(links))
+
+def page_detail_links(body: str, page_url: str) -> List[str]:
+    """Detail links from an inventory page, HTML or JSON"""
+    stripped = body.lstrip()
+    if stripped[:1] in ('{', '['):
+        try:
+            return json_detail_links(json.loads(stripped), page_url)
+        except ValueError:
+            pass
+    return parse_detail_links(body, page_url)
+
+def _page_param(url: str) -> Optional[tuple]:
+    for name, value in parse_qsl(urlsplit(url).query):
+        if name.lower() in PAGE_PARAMS and value.isdigit():
+            return name, int(value)
+    return None
+
+def _is_page_link(url: str) -> bool:
+    return bool(_page_param(url) or _PATH_PAGE.search(urlsplit(url).path))
+
+def _same_listing(url: str, page_url: str) -> bool:
+    """Whether `url` is a page of the same inventory listing as `page_url`"""
+    a, b = urlsplit(url), urlsplit(page_url)
+    return a.netloc == b.netloc and _PATH_PAGE.sub('', a.path).rstrip('/') == _PATH_PAGE.sub('', b.path).rstrip('/')
+
+def _total_pages(text: str, per_page: int) -> Optional[int]:
+    page_of = _PAGE_OF.search(text)
+    if page_of:
+        return int(page_of.group(1))
+    results = _RESULTS_OF.search(text)
+    if results:
+        first, last, total = int(results.group(1)), int(results.group(2)), int(results.group(3).replace(',', ''))
+        # The stated range is the page size; links counted on the page (`per_page`) can include
+        # featured vehicles or miss some
+        if 0 < first <= last <= total:
+            return math.ceil(total / (last - first + 1))
+    count = _RESULTS_FOUND.search(text)
+    if count and per_page:
+        return math.ceil(int(count.group(1).replace(',', '')) / per_page)
+    return None
+
+def detect_pagination(html: str, page_url: str, per_page: int = 0) -> Pagination:
+    """Learn the inventory's pagination scheme from its first page.
+
+    `per_page` is the number of vehicles on the first page, used to turn a
+    count without a range ("287 vehicles found") into a page count.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    text = soup.get_text(' ', strip=True)
+
+    query_pages: Dict[str, Set[int]] = {}
+    path_pages: Set[int] = set()
+    next_url = None
+    for link in soup.find_all('a', href=True):
+        url = urljoin(page_url, link['href'])
+        rel = link.get('rel') or []
+        if next_url is None and ('next' in rel or _NEXT_TEXT.match(link.get_text()) or
+                                 'next' in ' '.join(link.get('class', [])).lower()):
+            next_url = url if url.split('#')[0] != page_url else None
+        if not _same_listing(url, page_url):
+            continue
+        page = _page_param(url)
+        if page:
+            query_pages.setdefault(page[0], set()).add(page[1])
+        path_page = _PATH_PAGE.search(urlsplit(url).path)
+        if path_page:
+            path_pages.add(int(path_page.group(2)))
+    next_link = soup.find('link', rel='next', href=True)
+    if next_url is None and next_link:
+        next_url = urljoin(page_url, next_link['href'])
+
+    # Pagers often show a window of page numbers ("1 2 3 ... 40"), so the highest linked
+    # page is only a lower bound unless the page states the total
+    total_pages = _total_pages(text, per_page)
+    if query_pages:
+        param, numbers = max(query_pages.items(), key=lambda item: len(item[1]))
+        return Pagination("query", page_url, param, total_pages, next_url, max(numbers))
+    if path_pages:
+        return Pagination("path", page_url, None, total_pages, next_url, max(path_pages))
+    if next_url:
+        page = _page_param(next_url)
+        if page and _same_listing(next_url, page_url):
+            return Pagination("query", page_url, page[0], total_pages, next_url, page[1])
+        return Pagination("next", page_url, None, None, next_url)
+
+    endpoint = _JSON_ENDPOINT.search(html)
+    if endpoint:
+        return Pagination("json", urljoin(page_url, endpoint.group(1) + '1'), endpoint.group(2), total_pages)
+    return Pagination(None, page_url)
+
+def next_page_url(html: str, page_url: str) -> Optional[str]:
+    """The "next" link of a page, for sites that only link page to page"""
+    pagination = detect_pagination(html, page_url)
+    return pagination.next_url if pagination.next_url != page_url else None
@@ -0,0 +1,292 @@
+"""HTML parsers for the ingest pipelines.
+
+Parsing is the CPU-bound part of a scrape, so these are plain module-level
+functions of picklable arguments that pipeline process stages can run in a
+worker pool. They return dicts with photo URLs under `image_urls`; downloading
+the photos is left to the pipeline's photo stage.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from .dcs_photos import find_dcs_photo_urls, select_dcs_photos
+from .vin_decoder import canonical_make
+
+KNOWN_MAKES = ['Ford', 'Toyota', 'Honda', 'Chevrolet', 'Chevy', 'BMW', 'Mercedes', 'Audi',
+               'Nissan', 'Hyundai', 'Kia', 'Volkswagen', 'VW', 'Mazda', 'Subaru', 'Lexus',
+               'Acura', 'Infiniti', 'Cadillac', 'Buick', 'GMC', 'Jeep', 'Chrysler', 'Dodge',
+               'Ram', 'Tesla', 'Volvo', 'Jaguar', 'Land Rover', 'Porsche', 'Mini', 'Mitsubishi']
+
+LISTING_SELECTORS = [
+    '.vehicle', '.car', '.inventory-item', '.vehicle-card', '.listing',
+    '.inventory-vehicle', '.used-vehicle', '.auto-item', '.vehicle-listing',
+    '[data-vehicle]', '[data-car]', '.search-result', '.vehicle-info',
+    '.inventory-card', '.car-item', '.vehicle-container', '.auto-listing'
+]
+
+GALLERY_SELECTORS = [
+    '.vehicle-images img', '.car-images img', '.gallery img',
+    '.photos img', '.image-gallery img', '.vehicle-gallery img',
+    '[class*="image"] img', '[class*="photo"] img', '[class*="gallery"] img'
+]
+
+DCS_PHOTO_PATTERN = re.compile(r'imagescdn\.dealercarsearch\.com/Media/')
+
+MAX_LISTINGS_PER_PAGE = 15
+
+def _year(text: str) -> Optional[int]:
+    match = re.search(r'\b(19|20)\d{2}\b', text)
+    return int(match.group()) if match else None
+
+def _price(text: str) -> Optional[float]:
+    match = re.search(r'\$[\d,]+', text)
+    if not match:
+        return None
+    digits = match.group().replace('$', '').replace(',', '')
+    return float(digits) if digits else None
+
+def _mileage(text: str, units: str = r'miles|mi|mileage') -> Optional[int]:
+    match = re.search(rf'(\d+,?\d*)\s*({units})', text, re.IGNORECASE)
+    return int(match.group(1).replace(',', '')) if match else None
+
+def _make_and_model(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """First known make in the text and the words after it, e.g. "2019 Honda Civic LX $18,995" """
+    for make in KNOWN_MAKES:
+        if not re.search(r'\b' + re.escape(make) + r'\b', text, re.IGNORECASE):
+            continue
+        model = None
+        model_match = re.search(f'{re.escape(make)}\\s+([A-Za-z0-9\\s-]+)', text, re.IGNORECASE)
+        if model_match:
+            model_clean = re.sub(r'\b(19|20)\d{2}\b.*', '', model_match.group(1).strip()).strip()
+            model_clean = re.sub(r'\$.*', '', model_clean).strip()
+            model = model_clean[:30] or None
+        # Store one spelling per manufacturer ("Chevy" -> "Chevrolet", "VW" -> "Volkswagen")
+        return canonical_make(make), model
+    return None, None
+
+def _image_urls(images, base_url: str, skip: Tuple[str, ...]) -> List[str]:
+    urls = []
+    for img in images:
+        src = img.get('src') or img.get('data-src') or img.get('data-lazy')
+        if not src:
+            continue
+        src = urljoin(base_url, src)
+        if any(keyword in src.lower() for keyword in skip):
+            continue
+        urls.append(src)
+    return list(dict.fromkeys(urls))
+
+def parse_autotrader_search(html: str) -> List[str]:
+    """Vehicle detail links on an AutoTrader search results page"""
+    soup = BeautifulSoup(html, 'html.parser')
+    links = soup.find_all('a', href=re.compile(r'/cars-for-sale/vehicledetails'))
+    return list(dict.fromkeys(urljoin("https://www.autotrader.com", link.get('href')) for link in links))
+
+def parse_autotrader_listing(page: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+    """Vehicle fields from an AutoTrader detail page given as (url, html)"""
+    url, html = page
+    soup = BeautifulSoup(html, 'html.parser')
+    vehicle_data: Dict[str, Any] = {'source_url': url}
+
+    title_elem = soup.find('h1', class_='listing-title')
+    if title_elem:
+        # "2020 Ford F-150 XLT"
+        title_parts = title_elem.get_text().strip().split()
+        if len(title_parts) >= 3 and title_parts[0].isdigit():
+            vehicle_data['year'] = int(title_parts[0])
+            vehicle_data['make'] = title_parts[1]
+            vehicle_data['model'] = ' '.join(title_parts[2:])
+
+    price_elem = soup.find('span', class_='first-price')
+    if price_elem:
+        price_match = re.search(r'[\d,]+', price_elem.get_text().strip().replace('$', ''))
+        if price_match:
+            vehicle_data['price'] = float(price_match.group().replace(',', ''))
+
+    mileage_elem = soup.find('span', {'data-cmp': 'mileage'})
+    if mileage_elem:
+        mileage_match = re.search(r'[\d,]+', mileage_elem.get_text().strip())
+        if mileage_match:
+            vehicle_data['mileage'] = int(mileage_match.group().replace(',', ''))
+
+    dealer_elem = soup.find('div', class_='dealer-info')
+    if dealer_elem and dealer_elem.find('h3'):
+        vehicle_data['dealer_name'] = dealer_elem.find('h3').get_text().strip()
+
+    vehicle_data['image_urls'] = _image_urls(soup.find_all('img', class_='listing-photo'), url, ())
+    return vehicle_data
+
+def parse_dealer_listings(page: Tuple[Dict[str, Any], str]) -> List[Dict[str, Any]]:
+    """Vehicles listed on a dealer inventory page given as (dealer, html)"""
+    dealer, html = page
+    soup = BeautifulSoup(html, 'html.parser')
+
+    elements = []
+    for selector in LISTING_SELECTORS:
+        matches = soup.select(selector)
+        if len(matches) > 1:
+            elements = matches
+            break
+    # Without listing markup, fall back to divs that read like a vehicle listing
+    if not elements:
+        elements = [
+            div for div in soup.find_all('div')
+            if re.search(r'\$[\d,]+', div.get_text())
+            and re.search(r'\b(Ford|Toyota|Honda|Chevrolet|BMW|Mercedes)\b', div.get_text(), re.IGNORECASE)
+            and re.search(r'\b(19|20)\d{2}\b', div.get_text())
+        ][:20]
+
+    vehicles = []
+    for element in elements[:MAX_LISTINGS_PER_PAGE]:
+        text = element.get_text().strip()
+        make, model = _make_and_model(text)
+        vehicle_data = {
+            'dealer_name': dealer['name'],
+            'dealer_city': dealer.get('city', 'Unknown'),
+            'dealer_state': dealer.get('state', 'Unknown'),
+            'dealer_phone': dealer.get('phone', ''),
+            'year': _year(text),
+            'price': _price(text) or 15000.0,
+            'mileage': _mileage(text),  # None when the listing doesn't show it; dedup relies on it being real
+            'make': make or 'Unknown',
+            'model': model or 'Unknown',
+            'image_urls': _image_urls(element.find_all('img'), dealer['url'],
+                                      ('logo', 'icon', 'button', 'arrow', 'star')),
+        }
+        # Only keep vehicles with reasonable data
+        if vehicle_data['price'] > 1000 and vehicle_data['year'] and make and model and len(model) > 2:
+            vehicles.append(vehicle_data)
+    return vehicles
+
+def parse_vehicle_detail(page: Tuple[Dict[str, Any], str, str]) -> Optional[Dict[str, Any]]:
+    """Full vehicle record from a dealer detail page given as (dealer, url, html)"""
+    dealer, detail_url, html = page
+    soup = BeautifulSoup(html, 'html.parser')
+    vehicle_data: Dict[str, Any] = {
+        'dealer_name': dealer['name'],
+        'dealer_id': dealer['name'],
+        'dealer_city': dealer.get('city', 'Unknown'),
+        'dealer_state': dealer.get('state', 'Unknown'),
+        'dealer_phone': dealer.get('phone', ''),
+        'source_url': detail_url,
+    }
+
+    title = ""
+    for selector in ['h1', '.vehicle-title', '.car-title', '.listing-title', 'title']:
+        title_elem = soup.select_one(selector)
+        if title_elem:
+            title = title_elem.get_text().strip()
+            break
+    make, model = _make_and_model(title)
+    vehicle_data['year'] = _year(title)
+    vehicle_data['make'] = make or 'Unknown'
+    vehicle_data['model'] = model or 'Unknown'
+
+    price = None
+    for selector in ['.price', '.vehicle-price', '.car-price', '.listing-price', '[class*="price"]', '[id*="price"]']:
+        price_elem = soup.select_one(selector)
+        price = _price(price_elem.get_text()) if price_elem else None
+        if price:
+            break
+    vehicle_data['price'] = price or 15000.0
+
+    mileage = None
+    for selector in ['.mileage', '.vehicle-mileage', '.car-mileage', '[class*="mileage"]', '[id*="mileage"]']:
+        mileage_elem = soup.select_one(selector)
+        mileage = _mileage(mileage_elem.get_text(), r'miles|mi') if mileage_elem else None
+        if mileage:
+            break
+    vehicle_data['mileage'] = mileage
+
+    page_text = soup.get_text()
+    if re.search(r'\bautomatic\b', page_text, re.IGNORECASE):
+        vehicle_data['transmission'] = 'Automatic'
+    elif re.search(r'\bmanual\b', page_text, re.IGNORECASE):
+        vehicle_data['transmission'] = 'Manual'
+    for fuel_type in ['Gas', 'Gasoline', 'Diesel', 'Hybrid', 'Electric']:
+        if re.search(r'\b' + fuel_type + r'\b', page_text, re.IGNORECASE):
+            vehicle_data['fuel_type'] = fuel_type
+            break
+
+    images = [img for selector in GALLERY_SELECTORS for img in soup.select(selector)] or soup.find_all('img')
+    vehicle_data['image_urls'] = _image_urls(
+        images, detail_url, ('logo', 'icon', 'button', 'arrow', 'star', 'banner', 'header', 'footer')
+    )
+
+    # Only keep vehicles with reasonable data
+    if not make or not model or not vehicle_data['year'] or vehicle_data['price'] <= 1000:
+        return None
+    return vehicle_data
+
+def _vdp_fields(vdp_url: str) -> Dict[str, Any]:
+    """Year/make/model from a VDP URL: /vdp/ID/Used-YEAR-MAKE-MODEL-TRIM-for-sale-in-CITY-STATE-ZIP"""
+    vehicle_part = vdp_url.rstrip('/').split('/')[-1]
+    if vehicle_part.startswith('Used-'):
+        vehicle_part = vehicle_part[5:]
+    parts = vehicle_part.split('-')
+    fields: Dict[str, Any] = {}
+    if len(parts) >= 3:
+        if parts[0].isdigit():
+            fields['year'] = int(parts[0])
+        fields['make'] = parts[1].title()
+        fields['model'] = parts[2].title()
+    return fields
+
+def parse_dcs_listings(page: Tuple[str, str, int]) -> List[Dict[str, Any]]:
+    """Vehicle listings on a DealerCarSearch inventory page given as (dealer_url, html, max_vehicles)"""
+    dealer_url, html, max_vehicles = page
+    soup = BeautifulSoup(html, 'html.parser')
+
+    listings = []
+    seen_vdps = set()
+    for img in soup.find_all('img', src=DCS_PHOTO_PATTERN):
+        # The listing container is the nearest ancestor (up to 5 levels) that reads like a listing
+        container = img
+        for _ in range(5):
+            container = container.parent
+            if not container:
+                break
+            if any(keyword in container.get_text().lower() for keyword in ['vdp/', 'used-', 'for-sale-in']):
+                break
+        else:
+            container = None
+        if not container:
+            continue
+        vdp_links = container.find_all('a', href=re.compile(r'/vdp/'))
+        if not vdp_links or vdp_links[0]['href'] in seen_vdps:
+            continue
+        seen_vdps.add(vdp_links[0]['href'])
+
+        vehicle_url = urljoin(dealer_url, vdp_links[0]['href'])
+        listing: Dict[str, Any] = {'vehicle_url': vehicle_url, **_vdp_fields(vehicle_url)}
+        photos = container.find_all('img', src=DCS_PHOTO_PATTERN)
+        listing['image_urls'] = list(select_dcs_photos([photo['src'] for photo in photos], limit=1).values())
+        alt_text = photos[0].get('alt', '')
+        if alt_text and not listing.get('make'):
+            listing.setdefault('year', _year(alt_text))
+            listing['make'], _ = _make_and_model(alt_text)
+        listings.append(listing)
+        if len(listings) >= max_vehicles:
+            break
+    return listings
+
+def parse_dcs_detail(page: Tuple[Dict[str, Any], str]) -> Dict[str, Any]:
+    """A DealerCarSearch listing given as (listing, detail html), with price, mileage, VIN and photo URLs added"""
+    listing, html = page
+    listing = dict(listing)
+    detail: Dict[str, Any] = {}
+    price = _price(html)
+    if price:
+        detail['price'] = price
+    mileage = _mileage(html, r'miles?')
+    if mileage:
+        detail['mileage'] = mileage
+    vin_match = re.search(r'VIN:?\s*([A-HJ-NPR-Z0-9]{17})', html, re.IGNORECASE)
+    if vin_match:
+        detail['vin'] = vin_match.group(1)
+    # Galleries repeat each photo as thumbnail and full size (and in lazy-load attributes)
+    detail['photo_urls'] = list(select_dcs_photos(find_dcs_photo_urls(html), limit=10).values())
+    listing['detail'] = detail
+    return listing
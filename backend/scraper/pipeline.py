@@ -0,0 +1,390 @@
+import asyncio
+import base64
+import hashlib
+import inspect
+import logging
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # end-of-stream marker, one per downstream worker
+
+STAGE_KINDS = ("async", "thread", "process")
+
+class Stage:
+    """One step of an ingest pipeline.
+
+    `fn` maps an item to the next item, or None to drop it; with `fan_out` it
+    returns an iterable (or async iterable) of items instead. Async stages await
+    `fn` on the event loop, thread stages run it in the default executor and
+    process stages run it in the pipeline's process pool, so it must be a
+    module-level function of picklable arguments.
+    """
+    def __init__(self, name: str, fn: Callable[[Any], Any], concurrency: int = 4, kind: str = "async",
+                 fan_out: bool = False, queue_size: Optional[int] = None):
+        if kind not in STAGE_KINDS:
+            raise ValueError(f"Unknown stage kind {kind}")
+        self.name = name
+        self.fn = fn
+        self.concurrency = max(1, concurrency)
+        self.kind = kind
+        self.fan_out = fan_out
+        self.queue_size = queue_size
+
+class IngestPipeline:
+    """Streams items from a source through stages into a sink.
+
+    Stages are connected by bounded queues, so a slow stage (usually photo
+    downloads or the database) stalls the ones before it instead of letting
+    fetched pages pile up in memory. A failing item is counted and dropped
+    without stopping the run. The sink is any object with async `add(item)`
+    and `flush()`; an optional `flush_interval` attribute makes the pipeline
+    flush it at least that often. `stream()` yields the output instead.
+    """
+    def __init__(self, stages: Sequence[Stage], sink=None, queue_size: int = 32,
+                 process_workers: Optional[int] = None):
+        self.stages = list(stages)
+        self.sink = sink
+        self.queue_size = queue_size
+        self.process_workers = process_workers
+        self.stats: Dict[str, Any] = {}
+
+    async def run(self, source: Union[Iterable[Any], Any], sink=None) -> Dict[str, Any]:
+        """Run the source to exhaustion and return per-stage counts"""
+        sink = sink or self.sink
+        started = time.monotonic()
+        self.stats = {
+            "source": 0,
+            "stages": {stage.name: {"in": 0, "out": 0, "errors": 0} for stage in self.stages},
+            "emitted": 0,
+        }
+        queues = [asyncio.Queue(maxsize=stage.queue_size or self.queue_size) for stage in self.stages]
+        queues.append(asyncio.Queue(maxsize=self.queue_size))
+        consumers = [stage.concurrency for stage in self.stages] + [1]
+
+        pool = None
+        process_stages = [stage for stage in self.stages if stage.kind == "process"]
+        if process_stages:
+            pool = ProcessPoolExecutor(max_workers=self.process_workers or
+                                       max(stage.concurrency for stage in process_stages))
+
+        tasks = [asyncio.create_task(self._feed(source, queues[0], consumers[0]))]
+        for index, stage in enumerate(self.stages):
+            tasks.append(asyncio.create_task(
+                self._run_stage(stage, queues[index], queues[index + 1], consumers[index + 1], pool)
+            ))
+        tasks.append(asyncio.create_task(self._drain(queues[-1], sink)))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        if pool:
+            await asyncio.to_thread(pool.shutdown)
+
+        self.stats["written"] = getattr(sink, "written", self.stats["emitted"])
+        self.stats["seconds"] = round(time.monotonic() - started, 3)
+        return self.stats
+
+    async def _feed(self, source, outbox: asyncio.Queue, consumers: int):
+        if hasattr(source, "__aiter__"):
+            async for item in source:
+                self.stats["source"] += 1
+                await outbox.put(item)
+        else:
+            for item in source:
+                self.stats["source"] += 1
+                await outbox.put(item)
+        for _ in range(consumers):
+            await outbox.put(_DONE)
+
+    async def _run_stage(self, stage: Stage, inbox: asyncio.Queue, outbox: asyncio.Queue,
+                         consumers: int, pool: Optional[ProcessPoolExecutor]):
+        await asyncio.gather(*(self._work(stage, inbox, outbox, pool) for _ in range(stage.concurrency)))
+        for _ in range(consumers):
+            await outbox.put(_DONE)
+
+    async def _work(self, stage: Stage, inbox: asyncio.Queue, outbox: asyncio.Queue,
+                    pool: Optional[ProcessPoolExecutor]):
+        loop = asyncio.get_running_loop()
+        counts = self.stats["stages"][stage.name]
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            counts["in"] += 1
+            try:
+                if stage.kind == "process":
+                    result = await loop.run_in_executor(pool, stage.fn, item)
+                elif stage.kind == "thread":
+                    result = await asyncio.to_thread(stage.fn, item)
+                else:
+                    result = stage.fn(item)
+                    if inspect.isawaitable(result):
+                        result = await result
+
+                if not stage.fan_out:
+                    if result is not None:
+                        counts["out"] += 1
+                        await outbox.put(result)
+                elif hasattr(result, "__aiter__"):
+                    async for output in result:
+                        if output is not None:
+                            counts["out"] += 1
+                            await outbox.put(output)
+                else:
+                    for output in result or ():
+                        if output is not None:
+                            counts["out"] += 1
+                            await outbox.put(output)
+            except Exception as e:
+                counts["errors"] += 1
+                logger.warning(f"Pipeline stage {stage.name} failed: {str(e)}")
+
+    async def _drain(self, inbox: asyncio.Queue, sink):
+        # Partial batches are flushed at least every flush_interval seconds, so the first
+        # results become visible while later ones are still being fetched
+        flush_interval = getattr(sink, "flush_interval", None)
+        deadline = time.monotonic() + flush_interval if flush_interval else None
+        while True:
+            try:
+                if deadline is None:
+                    item = await inbox.get()
+                else:
+                    item = await asyncio.wait_for(inbox.get(), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                item = None
+            if item is _DONE:
+                break
+            if item is not None:
+                self.stats["emitted"] += 1
+                await sink.add(item)
+            if deadline is not None and time.monotonic() >= deadline:
+                await sink.flush()
+                deadline = time.monotonic() + flush_interval
+        await sink.flush()
+
+    async def stream(self, source: Union[Iterable[Any], Any], buffer: Optional[int] = None):
+        """Run the pipeline as an async generator of its output items.
+
+        The consumer is the sink: a consumer that falls `buffer` items behind
+        pauses the pipeline, and closing the generator early cancels the run.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=buffer or self.queue_size)
+        errors: List[Exception] = []
+
+        async def produce():
+            try:
+                await self.run(source, _QueueSink(queue))
+            except Exception as e:
+                errors.append(e)
+            await queue.put(_DONE)
+
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                yield item
+            if errors:
+                raise errors[0]
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+class _QueueSink:
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+
+    async def add(self, item):
+        await self.queue.put(item)
+
+    async def flush(self):
+        pass
+
+class CollectingSink:
+    """Sink that keeps every item, for callers that want the results as a list"""
+    def __init__(self):
+        self.items: List[Any] = []
+
+    @property
+    def written(self) -> int:
+        return len(self.items)
+
+    async def add(self, item):
+        self.items.append(item)
+
+    async def flush(self):
+        pass
+
+class BatchWriter:
+    """Pipeline sink that bulk-writes documents to a collection in batches.
+
+    Documents with every `key` field set are upserted on those fields, so a
+    rescrape updates a listing in place and keeps its id and created_at;
+    documents without them are inserted. `transform` turns pipeline items into
+    documents (None skips one) and may be async; items that are already lists
+    of write requests are written as given, in order. `on_flush(written)` runs after every batch
+    so callers can publish progress while the scrape is still running. A
+    batch is written when full or once its oldest document is `flush_interval`
+    seconds old, whether the writer is fed by a pipeline or by hand.
+    """
+    def __init__(self, collection, key: Sequence[str] = ("source_url",), batch_size: int = 100,
+                 flush_interval: float = 2.0,
+                 transform: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None,
+                 on_flush: Optional[Callable[[int], Awaitable[Any]]] = None):
+        self.collection = collection
+        self.key = tuple(key)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.transform = transform
+        self.on_flush = on_flush
+        self.pending: List[Union[Dict[str, Any], List[Any]]] = []
+        self._pending_since = 0.0
+        self.written = 0
+        self.skipped = 0
+        self.batches = 0
+
+    async def add(self, item):
+        try:
+            document = self.transform(item) if self.transform else item
+            if inspect.isawaitable(document):
+                document = await document
+        except Exception as e:
+            logger.warning(f"Skipping unwritable document: {str(e)}")
+            document = None
+        if document is None:
+            self.skipped += 1
+            return
+        if not self.pending:
+            self._pending_since = time.monotonic()
+        self.pending.append(document)
+        if len(self.pending) >= self.batch_size or \
+                (self.flush_interval and time.monotonic() - self._pending_since >= self.flush_interval):
+            await self.flush()
+
+    def _operations(self, document: Union[Dict[str, Any], List[Any]]) -> List[Any]:
+        if isinstance(document, list):
+            return document
+        if self.key and all(document.get(field) for field in self.key):
+            fields = {name: value for name, value in document.items() if name not in ("_id", "id", "created_at")}
+            return [UpdateOne(
+                {field: document[field] for field in self.key},
+                {"$set": fields,
+                 "$setOnInsert": {"id": document.get("id") or str(uuid.uuid4()),
+                                  "created_at": document.get("created_at") or datetime.utcnow()}},
+                upsert=True
+            )]
+        return [InsertOne(document)]
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        requests, owners = [], []
+        for index, document in enumerate(batch):
+            for request in self._operations(document):
+                requests.append(request)
+                owners.append(index)
+        # Given request lists can depend on earlier requests (an upsert, then updates of the
+        # document it creates), so they are written in order; an ordered write stops at its
+        # first error, and the rest of the batch is resumed after it
+        ordered = any(isinstance(document, list) for document in batch)
+        failed = set()
+        start = 0
+        while start < len(requests):
+            try:
+                await self.collection.bulk_write(requests[start:], ordered=ordered)
+                break
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                failed.update(owners[start + error["index"]] for error in errors)
+                logger.error(f"{len(errors)} write requests failed: {errors[0].get('errmsg') if errors else ''}")
+                if not ordered or not errors:
+                    break
+                start += errors[-1]["index"] + 1
+        self.written += len(batch) - len(failed)
+        self.batches += 1
+        if self.on_flush:
+            await self.on_flush(self.written)
+
+def photo_digest(photo: str) -> str:
+    """Identity of a photo (base64 data URL or URL), ignoring the data URL's declared content type"""
+    payload = photo.split(',', 1)[1] if photo.startswith('data:') else photo
+    return hashlib.blake2b(payload.encode('ascii', 'ignore'), digest_size=16).hexdigest()
+
+def merge_photos(*photo_lists: Iterable[str], limit: Optional[int] = None) -> List[str]:
+    """Photos from every list in order, each distinct photo once.
+
+    Photos are compared by digest, computed once per photo, so merging is
+    linear in the total size instead of comparing every pair of data URLs.
+    """
+    merged: List[str] = []
+    seen = set()
+    for photos in photo_lists:
+        for photo in photos or ():
+            if limit is not None and len(merged) >= limit:
+                return merged
+            if not photo:
+                continue
+            digest = photo_digest(photo)
+            if digest not in seen:
+                seen.add(digest)
+                merged.append(photo)
+    return merged
+
+async def _download_photo(session, url: str, min_bytes: int, max_bytes: int,
+                          timeout: Optional[float]) -> Optional[str]:
+    try:
+        async with session.get(url, timeout=timeout) as response:
+            if response.status != 200:
+                return None
+            data = await response.read()
+            if not min_bytes < len(data) < max_bytes:
+                return None
+            content_type = response.headers.get('content-type', '').split(';')[0].strip()
+            if not content_type.startswith('image/'):
+                lowered = url.lower().split('?')[0]
+                content_type = 'image/png' if lowered.endswith('.png') else \
+                    'image/webp' if lowered.endswith('.webp') else 'image/jpeg'
+            return f"data:{content_type};base64,{base64.b64encode(data).decode('utf-8')}"
+    except Exception as e:
+        logger.debug(f"Error downloading photo {url}: {str(e)}")
+        return None
+
+async def download_photos(session, urls: Iterable[str], limit: int = 10, min_bytes: int = 0,
+                          max_bytes: int = 5_000_000, timeout: Optional[float] = None) -> List[str]:
+    """Photos as base64 data URLs in page order, fetched `limit` at a time until `limit` succeed.
+
+    The same image served under two URLs is kept once.
+    """
+    candidates = list(dict.fromkeys(url for url in urls if url))
+    photos: List[str] = []
+    seen = set()  # digests of the photos kept so far, so each download is hashed once
+    position = 0
+    while position < len(candidates) and len(photos) < limit:
+        window = candidates[position:position + limit - len(photos)]
+        position += len(window)
+        results = await asyncio.gather(*(_download_photo(session, url, min_bytes, max_bytes, timeout)
+                                         for url in window))
+        for photo in results:
+            if not photo:
+                continue
+            digest = photo_digest(photo)
+            if digest not in seen:
+                seen.add(digest)
+                photos.append(photo)
+    return photos
@@ -0,0 +1,144 @@
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+_DAY_PREFIXES = {"mo": 0, "tu": 1, "we": 2, "th": 3, "fr": 4, "sa": 5, "su": 6}
+
+_DAY = r'(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?'
+_TIME = r'(?:\d{1,2}(?::\d{2})?\s*(?:[ap]\.?m\.?)?|noon|midnight)'
+_DAYS_PATTERN = re.compile(rf'({_DAY}(?:\s*(?:-|–|to|&|/|,|and)\s*{_DAY})*|daily|every\s*day|weekdays|weekends)',
+                           re.IGNORECASE)
+_HOURS_PATTERN = re.compile(rf'({_TIME})\s*(?:-|–|to)\s*({_TIME})|(24\s*(?:hours|hrs|/\s*7))|(closed)',
+                            re.IGNORECASE)
+
+def _day_index(token: str) -> int:
+    return _DAY_PREFIXES[token.strip().lower()[:2]]
+
+def _parse_days(text: str) -> List[int]:
+    text = text.strip().lower()
+    if text in ("daily", "everyday", "every day") or text.startswith("every"):
+        return list(range(7))
+    if text == "weekdays":
+        return list(range(5))
+    if text == "weekends":
+        return [5, 6]
+    days = []
+    for part in re.split(r'\s*(?:&|/|,|and)\s*', text):
+        bounds = re.split(r'\s*(?:-|–|to)\s*', part)
+        if len(bounds) == 2:
+            start, end = _day_index(bounds[0]), _day_index(bounds[1])
+            days.extend((start + offset) % 7 for offset in range((end - start) % 7 + 1))
+        elif part:
+            days.append(_day_index(part))
+    return days
+
+def _parse_time(text: str, default_meridiem: Optional[str] = None) -> Optional[int]:
+    """Minutes after midnight for "8AM", "8:30 pm", "17:00", "noon" """
+    text = text.strip().lower().replace('.', '')
+    if text == "noon":
+        return 12 * 60
+    if text == "midnight":
+        return 0
+    match = re.match(r'(\d{1,2})(?::(\d{2}))?\s*([ap]m)?$', text)
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2) or 0)
+    meridiem = match.group(3) or default_meridiem
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    if hour > 24 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+def _has_meridiem(text: str) -> bool:
+    return bool(re.search(r'[ap]\.?m\.?$|noon|midnight', text.strip(), re.IGNORECASE))
+
+def parse_hours(text: Optional[str]) -> List[Tuple[int, int]]:
+    """Weekly open intervals as (start, end) minutes after Monday 00:00.
+
+    Understands listings like "Mon-Fri 8AM-6PM, Sat 8AM-4PM", "Daily 7:30am-9pm",
+    "Sun Closed" and "24 hours". Overnight hours run into the next day, and
+    Sunday-night hours wrap to Monday morning.
+    """
+    if not text:
+        return []
+    intervals = []
+    # Each segment is a day expression followed by its hours; segments without days
+    # ("24 hours", "8AM-5PM") apply to every day
+    positions = [match for match in _DAYS_PATTERN.finditer(text)]
+    segments = []
+    if not positions:
+        segments.append((list(range(7)), text))
+    for i, match in enumerate(positions):
+        end = positions[i + 1].start() if i + 1 < len(positions) else len(text)
+        segments.append((_parse_days(match.group(0)), text[match.end():end]))
+
+    for days, hours_text in segments:
+        hours = _HOURS_PATTERN.search(hours_text)
+        if not hours or hours.group(4):
+            continue
+        if hours.group(3):
+            open_minute, close_minute = 0, MINUTES_PER_DAY
+        else:
+            close_minute = _parse_time(hours.group(2))
+            # An opening time without am/pm shares the closing time's when that still opens
+            # before closing ("1-5pm", "12-5pm"), and is otherwise morning ("9-5pm")
+            close_meridiem = 'pm' if 'p' in hours.group(2).lower() else 'am' if 'a' in hours.group(2).lower() else None
+            open_minute = _parse_time(hours.group(1), close_meridiem)
+            if close_meridiem and close_minute is not None and open_minute is not None and open_minute >= close_minute:
+                open_minute = _parse_time(hours.group(1), 'am')
+            if open_minute is None or close_minute is None:
+                continue
+            # A bare closing time at or before the opening ("8-5", "10-6") is afternoon; hours
+            # only run overnight when am/pm says so ("10pm-2am")
+            if not _has_meridiem(hours.group(2)) and close_minute <= open_minute and close_minute <= 12 * 60 and \
+                    close_minute + 12 * 60 > open_minute:
+                close_minute += 12 * 60
+            if close_minute <= open_minute:
+                if not (_has_meridiem(hours.group(1)) or _has_meridiem(hours.group(2))):
+                    continue
+                close_minute += MINUTES_PER_DAY
+        for day in days:
+            start, end = day * MINUTES_PER_DAY + open_minute, day * MINUTES_PER_DAY + close_minute
+            if end > MINUTES_PER_WEEK:
+                intervals.append((0, end - MINUTES_PER_WEEK))
+                end = MINUTES_PER_WEEK
+            intervals.append((start, end))
+    return _merge(intervals)
+
+def _merge(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(intervals):
+        # Only overlaps merge, so each day keeps its own intervals for display
+        if merged and start < merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def minute_of_week(moment: datetime) -> int:
+    """Minutes after Monday 00:00 for a local time"""
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+def open_intervals_documents(intervals: List[Tuple[int, int]]) -> List[Dict[str, int]]:
+    """Intervals in the shape stored on shop documents, queried with $elemMatch"""
+    return [{"start": start, "end": end} for start, end in intervals]
+
+def format_hours(intervals: List[Tuple[int, int]]) -> Dict[str, List[str]]:
+    """{"Mon": ["08:00-18:00"], ...} for display"""
+    week: Dict[str, List[str]] = {name: [] for name in DAY_NAMES}
+    for start, end in intervals:
+        day = start // MINUTES_PER_DAY
+        open_minute, close_minute = start % MINUTES_PER_DAY, end - day * MINUTES_PER_DAY
+        if close_minute > MINUTES_PER_DAY:
+            close_minute -= MINUTES_PER_DAY
+        week[DAY_NAMES[day]].append(
+            f"{open_minute // 60:02d}:{open_minute % 60:02d}-{close_minute // 60:02d}:{close_minute % 60:02d}"
+        )
+    return week
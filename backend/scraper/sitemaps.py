@@ -0,0 +1,146 @@
+"""Vehicle detail page discovery from robots.txt and sitemaps.
+
+Most dealer sites publish every vehicle detail page (VDP) in their sitemap
+with a `lastmod` date, which lists the whole inventory in one or two small
+fetches instead of paging through inventory lists. Comparing `lastmod` with
+the previous crawl lets a crawl fetch only new and changed vehicles.
+"""
+import gzip
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit
+from xml.etree import ElementTree
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SITEMAPS = ("/sitemap.xml", "/sitemap_index.xml")
+MAX_SITEMAPS = 50
+
+# Detail page URLs on the dealer platforms we crawl: DealerCarSearch "/vdp/<id>/Used-2019-Honda-...",
+# dealer.com "/used/Honda/2019-Honda-Civic-<id>.htm", and pages named by VIN or with a year-make slug
+VDP_PATTERN = re.compile(
+    r'/vdp/|/vehicle-details?/|/inventory/(?:used|new|certified)[-/]|/(?:used|new|certified)/[^/]+/(?:19|20)\d{2}-'
+    r'|(?:^|[/-])(?:used|new|certified)-(?:19|20)\d{2}-|[/-][A-HJ-NPR-Z0-9]{17}(?:[/.?-]|$)',
+    re.IGNORECASE
+)
+# Sitemaps of a site's vehicles, as opposed to its pages, blog or image sitemaps
+_INVENTORY_SITEMAP = re.compile(r'inventory|vehicle|vdp|used|new|car|auto', re.IGNORECASE)
+
+class SitemapEntry(NamedTuple):
+    url: str
+    lastmod: Optional[datetime]
+
+def is_vdp_url(url: str) -> bool:
+    return bool(VDP_PATTERN.search(urlsplit(url).path))
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """A sitemap W3C datetime ("2024-05-01", "2024-05-01T10:20:00+00:00") as naive UTC"""
+    if not value:
+        return None
+    value = value.strip().replace('Z', '+00:00')
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            moment = datetime.strptime(value[:10], '%Y-%m-%d')
+        except ValueError:
+            return None
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def parse_sitemap(body: bytes) -> Tuple[List[SitemapEntry], List[str]]:
+    """(page entries, child sitemap URLs) of a sitemap or sitemap index, gzipped or not"""
+    if body[:2] == b'\x1f\x8b':
+        body = gzip.decompress(body)
+    try:
+        root = ElementTree.fromstring(body)
+    except ElementTree.ParseError:
+        # Plain-text sitemaps list one URL per line
+        lines = body.decode('utf-8', 'ignore').splitlines()
+        return [SitemapEntry(line.strip(), None) for line in lines if line.strip().startswith('http')], []
+
+    def child(element, name):
+        for item in element:
+            if item.tag.rsplit('}', 1)[-1] == name:
+                return (item.text or '').strip()
+        return None
+
+    entries, sitemaps = [], []
+    for element in root:
+        tag = element.tag.rsplit('}', 1)[-1]
+        loc = child(element, 'loc')
+        if not loc:
+            continue
+        if tag == 'sitemap':
+            sitemaps.append(loc)
+        elif tag == 'url':
+            entries.append(SitemapEntry(loc, parse_lastmod(child(element, 'lastmod'))))
+    return entries, sitemaps
+
+def robots_sitemaps(robots_txt: str, site_url: str) -> List[str]:
+    """Sitemap URLs declared in robots.txt"""
+    return [urljoin(site_url, line.split(':', 1)[1].strip())
+            for line in robots_txt.splitlines() if line.lower().startswith('sitemap:')]
+
+async def _fetch(session, url: str, throttle=None) -> Optional[bytes]:
+    try:
+        async with (throttle.get(session, url) if throttle else session.get(url)) as response:
+            if response.status != 200:
+                return None
+            return await response.read()
+    except Exception as e:
+        logger.debug(f"Could not fetch {url}: {str(e)}")
+        return None
+
+async def sitemap_vdps(session, site_url: str, throttle=None) -> List[SitemapEntry]:
+    """Every vehicle detail page in a site's sitemaps, with its lastmod.
+
+    Sitemaps come from robots.txt, falling back to the usual paths. Indexes are
+    followed, preferring child sitemaps named for inventory when there are
+    any, up to MAX_SITEMAPS fetches. Given a HostThrottle, fetches go through
+    the host's request budget like the rest of the crawl.
+    """
+    robots = await _fetch(session, urljoin(site_url, '/robots.txt'), throttle)
+    pending = robots_sitemaps(robots.decode('utf-8', 'ignore'), site_url) if robots else []
+    if not pending:
+        pending = [urljoin(site_url, path) for path in DEFAULT_SITEMAPS]
+
+    entries: Dict[str, SitemapEntry] = {}
+    visited: Set[str] = set()
+    while pending and len(visited) < MAX_SITEMAPS:
+        url = pending.pop(0)
+        if url in visited:
+            continue
+        visited.add(url)
+        body = await _fetch(session, url, throttle)
+        if not body:
+            continue
+        try:
+            page_entries, children = parse_sitemap(body)
+        except (OSError, EOFError) as e:
+            logger.debug(f"Unreadable sitemap {url}: {str(e)}")
+            continue
+        inventory_children = [child for child in children if _INVENTORY_SITEMAP.search(urlsplit(child).path)]
+        pending.extend(inventory_children or children)
+        for entry in page_entries:
+            if is_vdp_url(entry.url):
+                entries[entry.url] = entry
+    return list(entries.values())
+
+def changed_since(entries: List[SitemapEntry], crawled: Dict[str, datetime]) -> Tuple[List[SitemapEntry], List[str]]:
+    """(entries to fetch, URLs unchanged since they were crawled).
+
+    A page is unchanged when it was crawled at or after its lastmod; pages
+    without a lastmod are always fetched.
+    """
+    fetch, unchanged = [], []
+    for entry in entries:
+        last_crawl = crawled.get(entry.url)
+        if last_crawl and entry.lastmod and entry.lastmod <= last_crawl:
+            unchanged.append(entry.url)
+        else:
+            fetch.append(entry)
+    return fetch, unchanged
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_STATUSES = {429, 500, 502, 503, 504}
+SLOW_MARGIN = 0.25  # seconds
+
+class _HostState:
+    def __init__(self, concurrency: int, delay: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.delay = delay
+        self.next_start = 0.0
+        self.latency: Optional[float] = None  # moving average of healthy response times
+        self.requests = 0
+        self.backoffs = 0
+
+class HostThrottle:
+    """Per-host request budget with pacing that adapts to the server.
+
+    Each host gets at most `concurrency` requests in flight, and request
+    starts are spaced `delay` seconds apart. The delay shrinks while the host
+    answers quickly and grows on 429/5xx responses, errors, or responses much
+    slower than the host's usual latency. A Retry-After header pauses the host
+    for as long as it asks.
+    """
+    def __init__(self, concurrency: int = 4, initial_delay: float = 0.25, min_delay: float = 0.02,
+                 max_delay: float = 10.0, slow_factor: float = 2.0):
+        self.concurrency = concurrency
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.slow_factor = slow_factor
+        self.hosts: Dict[str, _HostState] = {}
+
+    def _host(self, url: str) -> _HostState:
+        host = urlparse(url).netloc.lower()
+        if host not in self.hosts:
+            self.hosts[host] = _HostState(self.concurrency, self.initial_delay)
+        return self.hosts[host]
+
+    async def _wait_turn(self, state: _HostState):
+        now = time.monotonic()
+        start = max(now, state.next_start)
+        state.next_start = start + state.delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def record(self, state: _HostState, status: Optional[int], latency: float,
+               retry_after: Optional[str] = None):
+        """Adjust a host's pacing after a response (status None for a failed request)"""
+        state.requests += 1
+        if status is None or status in BACKOFF_STATUSES:
+            state.backoffs += 1
+            state.delay = min(self.max_delay, max(state.delay * 2, self.min_delay * 4))
+            if retry_after and retry_after.strip().isdigit():
+                state.next_start = max(state.next_start, time.monotonic() + min(int(retry_after), 60))
+            return
+        # Small absolute jitter on a fast host is not a sign of overload
+        if state.latency is not None and latency > max(state.latency * self.slow_factor, state.latency + SLOW_MARGIN):
+            state.delay = min(self.max_delay, state.delay * 1.5)
+        else:
+            state.delay = max(self.min_delay, state.delay * 0.75)
+        state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+
+    @asynccontextmanager
+    async def get(self, session, url: str, retries: int = 1, **kwargs):
+        """`session.get(url)` within the host's budget; yields the response.
+
+        Responses the host is pushing back with (429/5xx) are retried up to
+        `retries` times after the backoff.
+        """
+        state = self._host(url)
+        async with state.semaphore:
+            for attempt in range(retries + 1):
+                await self._wait_turn(state)
+                started = time.monotonic()
+                responded = False
+                try:
+                    async with session.get(url, **kwargs) as response:
+                        responded = True
+                        self.record(state, response.status, time.monotonic() - started,
+                                    response.headers.get('Retry-After'))
+                        if response.status in BACKOFF_STATUSES and attempt < retries:
+                            continue
+                        yield response
+                        return
+                except Exception as e:
+                    if not responded:
+                        self.record(state, None, time.monotonic() - started)
+                        logger.debug(f"Request to {url} failed: {str(e)}")
+                    raise
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {host: {"requests": state.requests, "backoffs": state.backoffs,
+                       "delay": round(state.delay, 3), "latency": round(state.latency or 0.0, 3)}
+                for host, state in self.hosts.items()}
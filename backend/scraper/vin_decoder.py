@@ -0,0 +1,180 @@
+import csv
+import logging
+import re
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WMI_TABLE_PATH = Path(__file__).resolve().parent.parent / 'data' / 'wmi.csv'
+
+VIN_PATTERN = re.compile(r'^[A-HJ-NPR-Z0-9]{17}$')
+
+# Letter values used for the position 9 check digit (I, O and Q are never valid)
+TRANSLITERATION = {
+    **{str(digit): digit for digit in range(10)},
+    'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5, 'F': 6, 'G': 7, 'H': 8,
+    'J': 1, 'K': 2, 'L': 3, 'M': 4, 'N': 5, 'P': 7, 'R': 9,
+    'S': 2, 'T': 3, 'U': 4, 'V': 5, 'W': 6, 'X': 7, 'Y': 8, 'Z': 9,
+}
+POSITION_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Position 10 cycles every 30 years: A=1980/2010 ... Y=2000/2030, 1=2001/2031 ... 9=2009/2039
+MODEL_YEAR_CODES = {code: 1980 + offset for offset, code in enumerate('ABCDEFGHJKLMNPRSTVWXY123456789')}
+
+COUNTRY_CODES = {
+    '1': 'United States', '4': 'United States', '5': 'United States',
+    '2': 'Canada', '3': 'Mexico', '7': 'United States',
+    'J': 'Japan', 'K': 'South Korea', 'L': 'China',
+    'S': 'United Kingdom', 'V': 'France', 'W': 'Germany',
+    'Y': 'Sweden', 'Z': 'Italy',
+}
+
+# WMIs whose make changed at a model year: (first model year of the table's make, earlier make).
+# Ram pickups were sold as Dodge Ram until Ram became its own brand for 2011.
+WMI_EARLIER_MAKES = {
+    '1D7': (2011, 'Dodge'),
+    '3D7': (2011, 'Dodge'),
+}
+
+# Spellings scrapers and dealers use for canonical makes
+MAKE_ALIASES = {
+    'Chevrolet': ['Chevy'],
+    'Mercedes-Benz': ['Mercedes', 'Benz', 'MB'],
+    'Volkswagen': ['VW'],
+    'Land Rover': ['Range Rover', 'LandRover'],
+    'MINI': ['Mini Cooper'],
+    'Alfa Romeo': ['Alfa'],
+}
+
+class DecodedVIN(NamedTuple):
+    vin: str
+    wmi: str
+    make: Optional[str]
+    model_year: Optional[int]
+    country: Optional[str]
+    check_digit_valid: bool
+
+_wmi_table: Optional[Dict[str, str]] = None
+_alias_lookup: Optional[Dict[str, str]] = None
+
+def _normalize_make_key(make: str) -> str:
+    return re.sub(r'[^a-z0-9]', '', make.lower())
+
+def load_wmi_table() -> Dict[str, str]:
+    """Load the bundled WMI -> make table (once)"""
+    global _wmi_table
+    if _wmi_table is None:
+        try:
+            with open(WMI_TABLE_PATH, newline='') as f:
+                _wmi_table = {row['wmi']: row['make'] for row in csv.DictReader(f)}
+        except OSError as e:
+            logger.error(f"Could not load WMI table {WMI_TABLE_PATH}: {str(e)}")
+            _wmi_table = {}
+    return _wmi_table
+
+def canonical_make(make: Optional[str]) -> Optional[str]:
+    """Map a make spelling ("Chevy", "mercedes") to its canonical name"""
+    global _alias_lookup
+    if not make:
+        return None
+    if _alias_lookup is None:
+        _alias_lookup = {}
+        for canonical in set(load_wmi_table().values()) | set(MAKE_ALIASES):
+            _alias_lookup[_normalize_make_key(canonical)] = canonical
+        for canonical, aliases in MAKE_ALIASES.items():
+            for alias in aliases:
+                _alias_lookup[_normalize_make_key(alias)] = canonical
+    return _alias_lookup.get(_normalize_make_key(make), make.strip())
+
+def make_spellings(make: str) -> List[str]:
+    """Canonical make plus all known aliases"""
+    canonical = canonical_make(make)
+    return [canonical] + MAKE_ALIASES.get(canonical, [])
+
+def normalize_vin(vin: Optional[str]) -> Optional[str]:
+    """Uppercase and strip a VIN, returning None if it is not structurally valid"""
+    if not vin:
+        return None
+    vin = re.sub(r'[\s-]', '', vin).upper()
+    return vin if VIN_PATTERN.match(vin) else None
+
+def compute_check_digit(vin: str) -> str:
+    """Expected position 9 check digit for a 17 character VIN"""
+    total = sum(TRANSLITERATION[char] * weight for char, weight in zip(vin, POSITION_WEIGHTS))
+    remainder = total % 11
+    return 'X' if remainder == 10 else str(remainder)
+
+def decode_model_year(vin: str) -> Optional[int]:
+    """Resolve the position 10 year code to a single model year"""
+    base_year = MODEL_YEAR_CODES.get(vin[9])
+    if base_year is None:
+        return None
+    # For North American cars and light trucks, a letter in position 7 means the 2010+ cycle
+    year = base_year + 30 if vin[6].isalpha() else base_year
+    if year > datetime.utcnow().year + 1:
+        year -= 30
+    return year
+
+def decode_vin(vin: Optional[str]) -> Optional[DecodedVIN]:
+    """Decode a VIN offline; returns None for strings that cannot be a VIN"""
+    vin = normalize_vin(vin)
+    if not vin:
+        return None
+    return _decode_normalized(vin)
+
+def _wmi_make(wmi: str, model_year: Optional[int]) -> Optional[str]:
+    make = load_wmi_table().get(wmi)
+    change = WMI_EARLIER_MAKES.get(wmi)
+    if change and model_year and model_year < change[0]:
+        return change[1]
+    return make
+
+@lru_cache(maxsize=65536)
+def _decode_normalized(vin: str) -> DecodedVIN:
+    wmi = vin[:3]
+    model_year = decode_model_year(vin)
+    return DecodedVIN(
+        vin=vin,
+        wmi=wmi,
+        make=_wmi_make(wmi, model_year),
+        model_year=model_year,
+        country=COUNTRY_CODES.get(vin[0]),
+        check_digit_valid=vin[8] == compute_check_digit(vin),
+    )
+
+def makes_match(make_a: Optional[str], make_b: Optional[str]) -> bool:
+    """True if two make spellings refer to the same manufacturer"""
+    if not make_a or not make_b:
+        return False
+    return _normalize_make_key(canonical_make(make_a)) == _normalize_make_key(canonical_make(make_b))
+
+def reconcile_with_vin(vin: Optional[str], year: Optional[int],
+                       make: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """Fill or correct year/make from a VIN.
+
+    Only VINs with a valid check digit are trusted to override scraped values;
+    anything else is left untouched.
+    """
+    decoded = decode_vin(vin)
+    if not decoded or not decoded.check_digit_valid:
+        return year, make
+
+    if decoded.model_year and year != decoded.model_year:
+        if year:
+            logger.debug(f"VIN {decoded.vin} decodes to {decoded.model_year}, listing said {year}")
+        year = decoded.model_year
+
+    # A make the WMI was sold under in some year (a 2011 Dodge Dakota on a Ram WMI) is not a mistake
+    change = WMI_EARLIER_MAKES.get(decoded.wmi)
+    if change and make and any(makes_match(make, name) for name in (change[1], load_wmi_table().get(decoded.wmi))):
+        return year, make
+
+    if decoded.make and not makes_match(make, decoded.make):
+        if make:
+            logger.debug(f"VIN {decoded.vin} decodes to {decoded.make}, listing said {make}")
+        make = decoded.make
+
+    return year, make
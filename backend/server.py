@@ -1,22 +1,48 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, BackgroundTasks, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request
+from fastapi.responses import StreamingResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import MutableHeaders
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
 from datetime import datetime, timedelta
 from enum import Enum
 import asyncio
+import time
+import math
 import aiohttp
 import json
 from bs4 import BeautifulSoup
 import re
 from urllib.parse import urljoin, urlparse
 import base64
+import hashlib
+import zlib
+import orjson
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses fall back to gzip
+    brotli = None
+
+from scraper.dedup import VehicleDeduplicator
+from scraper.geocoder import EARTH_RADIUS_MILES, METERS_PER_MILE, extract_zip, geocode
+from scraper.parsers import parse_autotrader_listing, parse_autotrader_search
+from scraper.pipeline import BatchWriter, IngestPipeline, Stage, download_photos
+from scraper.shop_hours import format_hours, minute_of_week, open_intervals_documents, parse_hours
+from scraper.vin_decoder import canonical_make, decode_vin, make_spellings, reconcile_with_vin
+from autocomplete import MakeModelAutocomplete
+from recommender import CATEGORICAL_FIELDS, NUMERIC_FIELDS, VehicleFeatureIndex, as_list
+from rate_book import RateBook
+from service_estimates import ServiceEstimateIndex, service_key
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -26,6 +52,9 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Re-validate fast-path responses against their pydantic models (debugging only)
+VALIDATE_RESPONSES = os.environ.get('VALIDATE_RESPONSES', 'false').lower() in ('1', 'true', 'yes')
+
 # CRM Service Classes (from existing system)
 class VehicleImageManager:
     """Manages vehicle images with compression and optimization"""
@@ -46,42 +75,316 @@ class VehicleImageManager:
         return processed_images
 
 class AICRMService:
-    """AI-powered CRM service for customer management"""
-    def __init__(self, db):
+    """AI-powered CRM service for customer management.
+
+    Recommendations are scored against an in-memory feature matrix of active
+    inventory, rebuilt in the background when the inventory generation changes.
+    """
+    DEAL_WEIGHT = 2.0
+    FAVORITE_WEIGHT = 1.5
+    VIEW_WEIGHT = 1.0
+
+    def __init__(self, db, version_service: "InventoryVersionService", refresh_interval: float = 30.0):
         self.db = db
-    
+        self.version_service = version_service
+        self.refresh_interval = refresh_interval
+        self.index = VehicleFeatureIndex()
+        self._token: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.refresh_index()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh_index()
+            except Exception as e:
+                logging.error(f"Recommendation index refresh failed: {str(e)}")
+
+    async def refresh_index(self):
+        token = await self.version_service.current()
+        if token == self._token:
+            return
+        projection = {field: 1 for field in ("id", "make", *NUMERIC_FIELDS, *CATEGORICAL_FIELDS)}
+        projection["_id"] = 0
+        vehicles = await self.db.vehicles.find({"status": "active"}, projection).to_list(None)
+        index = VehicleFeatureIndex()
+        # Encoding 100k rows takes about a second; keep it off the event loop
+        await asyncio.to_thread(index.build, vehicles)
+        # Swap in the finished index so requests never see a half-built matrix
+        self.index = index
+        self._token = token
+
     async def analyze_customer_behavior(self, customer_id: str) -> Dict[str, Any]:
         """Analyze customer behavior patterns"""
+        customer = await self.db.customers.find_one({"id": customer_id}, {"_id": 0, "preferences": 1})
+        preferences = (customer or {}).get("preferences")
+        preferences = preferences if isinstance(preferences, dict) else {}
+        profile = await self.db.customer_profiles.find_one({"customer_id": customer_id}, {"_id": 0}) or {}
+        activity = summarize_customer_profile(profile)
+        deals = await self.db.deals.find(
+            {"customer_id": customer_id}, {"_id": 0, "vehicle_id": 1}
+        ).to_list(100)
+        deal_vehicle_ids = [deal["vehicle_id"] for deal in deals if deal.get("vehicle_id")]
+        # Preferences are free-form customer data; only string ids are kept
+        favorite_vehicle_ids = list(dict.fromkeys(
+            vehicle_id for vehicle_id in as_list(preferences.get("saved_vehicles")) +
+            as_list(profile.get("favorite_vehicle_ids")) if isinstance(vehicle_id, str)
+        ))
+        viewed_vehicle_ids = list(dict.fromkeys(
+            vehicle_id for vehicle_id in as_list(preferences.get("viewed_vehicles")) +
+            as_list(profile.get("recent_vehicle_ids")) if isinstance(vehicle_id, str)
+        ))
+
+        # Explicit preferences win; observed behavior fills in what the customer didn't state
+        inferred = {key: activity[key] for key in ("budget_range", "body_styles", "makes") if activity[key]}
+        budget_range = preferences.get("budget_range") or activity["budget_range"]
+        if not budget_range and deal_vehicle_ids:
+            prices = [vehicle["price"] for vehicle in await self.db.vehicles.find(
+                {"id": {"$in": deal_vehicle_ids}}, {"_id": 0, "price": 1}
+            ).to_list(None) if vehicle.get("price")]
+            budget_range = [min(prices), max(prices)] if prices else None
+
         return {
-            "preferences": ["SUV", "Low Mileage"],
-            "budget_range": [25000, 45000],
-            "likelihood_to_purchase": 0.8
+            "preferences": {**inferred, **preferences},
+            "body_styles": preferences.get("body_styles") or activity["body_styles"],
+            "budget_range": budget_range,
+            "deal_vehicle_ids": deal_vehicle_ids,
+            "favorite_vehicle_ids": favorite_vehicle_ids,
+            "viewed_vehicle_ids": viewed_vehicle_ids,
+            "event_counts": profile.get("event_counts", {}),
+            "likelihood_to_purchase": round(min(1.0, 0.1 + 0.3 * len(deal_vehicle_ids) + 0.6 * activity["engagement"]), 2)
         }
-    
-    async def recommend_vehicles(self, customer_id: str) -> List[str]:
-        """AI-powered vehicle recommendations"""
+
+    def preference_vector(self, behavior: Dict[str, Any]):
+        """Blend explicit preferences with the vehicles the customer dealt on, saved or viewed"""
+        vectors = []
+        explicit = self.index.vector_for_preferences(behavior["preferences"])
+        if explicit is not None:
+            vectors.append(explicit)
+        vehicle_ids, weights = [], []
+        for key, weight in (("deal_vehicle_ids", self.DEAL_WEIGHT),
+                            ("favorite_vehicle_ids", self.FAVORITE_WEIGHT),
+                            ("viewed_vehicle_ids", self.VIEW_WEIGHT)):
+            vehicle_ids.extend(behavior[key])
+            weights.extend([weight] * len(behavior[key]))
+        history = self.index.vector_for_vehicles(vehicle_ids, weights)
+        if history is not None:
+            vectors.append(history)
+        if not vectors:
+            return None
+        vector = np.sum(vectors, axis=0)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    async def score_recommendations(self, customer_id: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """(vehicle_id, cosine similarity) of the best matches for a customer"""
         behavior = await self.analyze_customer_behavior(customer_id)
-        # Return vehicle IDs based on AI analysis
-        return []
+        query = self.preference_vector(behavior)
+        if query is None:
+            return []
+        # Vehicles the customer already has a deal on aren't recommended back to them
+        return self.index.top_k(query, limit, exclude=behavior["deal_vehicle_ids"])
+
+    async def recommend_vehicles(self, customer_id: str, limit: int = 10) -> List[str]:
+        """AI-powered vehicle recommendations"""
+        return [vehicle_id for vehicle_id, _ in await self.score_recommendations(customer_id, limit)]
+
+    def similar_vehicles(self, vehicle_id: str, limit: int = 10) -> List[Tuple[str, float]]:
+        return self.index.similar(vehicle_id, limit)
+
+def monthly_payments(principal, interest_rate, term_months) -> np.ndarray:
+    """Level monthly payment for broadcastable arrays of principal, APR (%) and term.
+
+    Uses P*r / (1 - (1+r)^-n), computed with log1p/expm1 so tiny rates stay
+    accurate, and P / n where the APR is zero.
+    """
+    principal = np.asarray(principal, dtype=np.float64)
+    monthly_rate = np.asarray(interest_rate, dtype=np.float64) / 12 / 100
+    term_months = np.asarray(term_months, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        amortizing = principal * monthly_rate / -np.expm1(-term_months * np.log1p(monthly_rate))
+    return np.where(monthly_rate > 0, amortizing, principal / term_months)
 
 class DeskingService:
     """Deal structuring and financing service"""
-    def __init__(self, db):
+    def __init__(self, db, rate_book: RateBook):
         self.db = db
-    
-    async def calculate_payment(self, vehicle_price: float, down_payment: float, 
+        self.rate_book = rate_book
+
+    async def quote_service_contract(self, request: "ServiceContractQuoteRequest") -> Dict[str, Any]:
+        """Dealer cost of a service contract from the loaded rate book"""
+        if not len(self.rate_book):
+            raise HTTPException(status_code=503, detail="No rate book loaded")
+        vehicle = {}
+        if request.vehicle_id:
+            vehicle = await self.db.vehicles.find_one(
+                {"id": request.vehicle_id},
+                {"_id": 0, "make": 1, "model": 1, "year": 1, "mileage": 1, "price": 1, "fuel_type": 1}
+            )
+            if not vehicle:
+                raise HTTPException(status_code=404, detail="Vehicle not found")
+        quote = self.rate_book.quote(
+            request.coverage,
+            request.make or vehicle.get("make"),
+            request.model or vehicle.get("model"),
+            request.year or vehicle.get("year"),
+            request.mileage if request.mileage is not None else vehicle.get("mileage"),
+            request.term_months,
+            request.term_miles,
+            price=request.price if request.price is not None else vehicle.get("price"),
+            fuel_type=request.fuel_type or vehicle.get("fuel_type"),
+            surcharges=request.surcharges,
+            deductible=request.deductible
+        )
+        if request.amount_financed is not None:
+            value = request.vehicle_value or request.price or vehicle.get("price") or 0
+            quote["gap"] = self.rate_book.gap_eligibility(request.amount_financed, value, request.term_months)
+        return quote
+
+    async def calculate_payment(self, vehicle_price: float, down_payment: float,
                                interest_rate: float, term_months: int) -> Dict[str, Any]:
         """Calculate monthly payments and deal structure"""
-        loan_amount = vehicle_price - down_payment
-        monthly_rate = interest_rate / 12 / 100
-        payment = loan_amount * (monthly_rate * (1 + monthly_rate)**term_months) / ((1 + monthly_rate)**term_months - 1)
-        
+        if term_months <= 0:
+            raise HTTPException(status_code=400, detail="term_months must be positive")
+        loan_amount = max(vehicle_price - down_payment, 0.0)
+        payment = float(monthly_payments(loan_amount, interest_rate, term_months))
+
         return {
             "monthly_payment": round(payment, 2),
             "total_interest": round((payment * term_months) - loan_amount, 2),
             "total_cost": round(payment * term_months + down_payment, 2)
         }
-    
+
+    def payment_matrix(self, request: "PaymentMatrixRequest") -> Dict[str, Any]:
+        """Every term x rate x down payment combination in one vectorized pass"""
+        terms = np.array(request.terms, dtype=np.float64).reshape(-1, 1, 1)
+        rates = np.array(request.rates, dtype=np.float64).reshape(1, -1, 1)
+        down_payments = np.array(request.down_payments, dtype=np.float64).reshape(1, 1, -1)
+
+        # Most states tax the price net of the trade-in allowance
+        taxable = request.vehicle_price - (request.trade_in_value if request.trade_in_tax_credit else 0)
+        sales_tax = max(taxable, 0) * request.tax_rate / 100
+        # Negative equity (payoff above the trade value) rolls into the loan
+        trade_equity = request.trade_in_value - request.trade_in_payoff
+        amount_financed = np.maximum(
+            request.vehicle_price + sales_tax + request.fees - trade_equity - down_payments, 0
+        )
+
+        payments = monthly_payments(amount_financed, rates, terms)
+        total_of_payments = payments * terms
+        return {
+            "terms": request.terms,
+            "rates": request.rates,
+            "down_payments": request.down_payments,
+            "sales_tax": round(sales_tax, 2),
+            "trade_equity": round(trade_equity, 2),
+            "amount_financed": np.round(amount_financed[0, 0], 2).tolist(),
+            # Indexed [term][rate][down_payment]
+            "monthly_payment": np.round(payments, 2).tolist(),
+            "total_interest": np.round(total_of_payments - amount_financed, 2).tolist(),
+            "total_cost": np.round(total_of_payments + down_payments + np.maximum(trade_equity, 0), 2).tolist()
+        }
+
+    def amortization_schedule(self, amount_financed: float, interest_rate: float,
+                              term_months: int) -> List[Dict[str, Any]]:
+        """Month-by-month payment split, computed in closed form for all months at once"""
+        payment = float(monthly_payments(amount_financed, interest_rate, term_months))
+        monthly_rate = interest_rate / 12 / 100
+        months = np.arange(0, term_months + 1, dtype=np.float64)
+        if monthly_rate > 0:
+            growth = np.power(1 + monthly_rate, months)
+            balances = amount_financed * growth - payment * (growth - 1) / monthly_rate
+        else:
+            balances = amount_financed - payment * months
+        balances = np.maximum(balances, 0)
+        interest = balances[:-1] * monthly_rate
+        principal = balances[:-1] - balances[1:]
+        return [
+            {"month": month, "payment": round(float(i + p), 2), "principal": round(float(p), 2),
+             "interest": round(float(i), 2), "balance": round(float(b), 2)}
+            for month, i, p, b in zip(range(1, term_months + 1), interest, principal, balances[1:])
+        ]
+
+    async def recalculate_pending_deals(self, rate_sheet: List["RateTier"], dealer_id: Optional[str] = None,
+                                        chunk_size: int = 5000, progress=None) -> Dict[str, int]:
+        """Reprice pending deals against a new rate sheet.
+
+        Deals are streamed from a cursor `chunk_size` at a time, repriced with
+        one vectorized payment calculation per chunk and written back with an
+        unordered bulk_write, so memory stays flat however many deals there are.
+        Each tier applies to terms up to its `max_term_months`; deals longer than
+        the last tier are left alone. `progress(processed, updated)` is awaited
+        after every chunk.
+        """
+        tiers = sorted(rate_sheet, key=lambda tier: tier.max_term_months)
+        max_terms = np.array([tier.max_term_months for tier in tiers])
+        tier_rates = np.array([tier.interest_rate for tier in tiers], dtype=np.float64)
+
+        query = {"status": DealStatus.PENDING}
+        if dealer_id:
+            query["dealer_id"] = dealer_id
+        projection = {"_id": 0, "id": 1, "purchase_price": 1, "down_payment": 1,
+                      "term_months": 1, "interest_rate": 1, "monthly_payment": 1}
+
+        processed = updated = 0
+
+        async def reprice(chunk: List[Dict[str, Any]]) -> int:
+            terms = np.array([deal.get("term_months") or 0 for deal in chunk])
+            principal = np.maximum(np.array(
+                [(deal.get("purchase_price") or 0) - (deal.get("down_payment") or 0) for deal in chunk],
+                dtype=np.float64
+            ), 0)
+            old_rates = np.array([deal.get("interest_rate") or 0 for deal in chunk], dtype=np.float64)
+            old_payments = np.array([deal.get("monthly_payment") or 0 for deal in chunk], dtype=np.float64)
+
+            tier_index = np.searchsorted(max_terms, terms)
+            priced = np.array([deal.get("purchase_price") is not None for deal in chunk])
+            covered = priced & (terms > 0) & (tier_index < len(tiers))
+            new_rates = np.where(covered, tier_rates[np.minimum(tier_index, len(tiers) - 1)], old_rates)
+            new_payments = np.round(monthly_payments(principal, new_rates, np.maximum(terms, 1)), 2)
+            changed = covered & ((new_rates != old_rates) | (np.abs(new_payments - old_payments) >= 0.005))
+
+            rows = np.nonzero(changed)[0]
+            if not len(rows):
+                return 0
+            now = datetime.utcnow()
+            # The status filter keeps a deal approved mid-run from being repriced
+            await self.db.deals.bulk_write([
+                UpdateOne(
+                    {"id": chunk[row]["id"], "status": DealStatus.PENDING},
+                    {"$set": {"interest_rate": float(new_rates[row]),
+                              "monthly_payment": float(new_payments[row]),
+                              "repriced_at": now}}
+                ) for row in rows
+            ], ordered=False)
+            return len(rows)
+
+        chunk = []
+        async for deal in self.db.deals.find(query, projection).batch_size(chunk_size):
+            chunk.append(deal)
+            if len(chunk) >= chunk_size:
+                updated += await reprice(chunk)
+                processed += len(chunk)
+                chunk = []
+                if progress:
+                    await progress(processed, updated)
+        if chunk:
+            updated += await reprice(chunk)
+            processed += len(chunk)
+            if progress:
+                await progress(processed, updated)
+
+        return {"processed": processed, "updated": updated}
+
     async def create_deal(self, vehicle_id: str, customer_id: str, deal_terms: Dict[str, Any]) -> str:
         """Create a new deal structure"""
         deal_id = str(uuid.uuid4())
@@ -130,14 +433,234 @@ class BillingService:
             "due_date": datetime.utcnow() + timedelta(days=30)
         }
 
+MAX_REPAIR_SHOP_IMPORT = 10000
+
+# Initial repair shop directory, seeded into `repair_shops` on first start
+SAMPLE_REPAIR_SHOPS = [
+    {
+        "id": "shop1",
+        "name": "Nashville Auto Care",
+        "address": "123 Main St, Nashville, TN 37201",
+        "phone": "(615) 555-0101",
+        "rating": 4.8,
+        "services": ["Oil Change", "Brake Service", "Tire Service", "Engine Repair"],
+        "hours": "Mon-Fri 8AM-6PM, Sat 8AM-4PM"
+    },
+    {
+        "id": "shop2", 
+        "name": "Music City Motors",
+        "address": "456 Broadway, Nashville, TN 37203",
+        "phone": "(615) 555-0102",
+        "rating": 4.6,
+        "services": ["Transmission", "AC Repair", "Oil Change", "Inspection"],
+        "hours": "Mon-Fri 7AM-7PM, Sat 9AM-5PM"
+    },
+    {
+        "id": "shop3",
+        "name": "Franklin Auto Service",
+        "address": "789 Cool Springs Blvd, Franklin, TN 37067", 
+        "phone": "(615) 555-0103",
+        "rating": 4.9,
+        "services": ["Oil Change", "Brake Service", "Engine Diagnostics", "Tire Service"],
+        "hours": "Mon-Fri 8AM-6PM, Sat 8AM-2PM"
+    }
+]
+
+SLOT_MINUTES = 30
+DEFAULT_SHOP_BAYS = 2
+MAX_AVAILABILITY_DAYS = 31
+# Bay time each service type blocks; anything else books one hour
+SERVICE_DURATION_MINUTES = {
+    "oilchange": 30, "inspection": 30, "batteryreplacement": 30, "tireservice": 60,
+    "wheelalignment": 60, "enginediagnostics": 60, "brakeservice": 120, "acrepair": 120,
+    "enginerepair": 240, "transmission": 480,
+}
+
+def service_duration(service_type: Optional[str]) -> int:
+    minutes = SERVICE_DURATION_MINUTES.get(service_key(service_type), 60)
+    return -(-minutes // SLOT_MINUTES) * SLOT_MINUTES
+
+def shop_capacity(shop: Dict[str, Any]) -> int:
+    """Concurrent appointments a shop can take: its bays, or fewer if it has fewer technicians"""
+    bays = shop.get("bays") or DEFAULT_SHOP_BAYS
+    technicians = shop.get("technicians")
+    return max(min(bays, technicians) if technicians else bays, 1)
+
+class AppointmentScheduler:
+    """Bay capacity per shop in fixed slots.
+
+    `shop_slots` holds one counter document per (shop, slot start), indexed by
+    shop and start time, so a date range of bookings is one index range scan.
+    A slot's counter is created on first use, then reserved with a conditional
+    increment that only matches while the counter is below capacity, so a
+    full slot matches nothing instead of overbooking. Multi-slot appointments
+    roll back the slots they already took when a later one is full.
+    """
+    def __init__(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        await self.db.shop_slots.create_index([("shop_id", 1), ("start", 1)])
+
+    async def get_shop(self, shop_id: str) -> Dict[str, Any]:
+        shop = await self.db.repair_shops.find_one(
+            {"id": shop_id}, {"_id": 0, "id": 1, "name": 1, "bays": 1, "technicians": 1, "open_intervals": 1}
+        )
+        if not shop:
+            raise HTTPException(status_code=404, detail="Repair shop not found")
+        return shop
+
+    async def resolve_shop_id(self, shop: str) -> str:
+        """Shop id from an id or a shop name (the public booking form sends the name)"""
+        match = await self.db.repair_shops.find_one({"$or": [{"id": shop}, {"name": shop}]}, {"_id": 0, "id": 1})
+        if not match:
+            raise HTTPException(status_code=404, detail="Repair shop not found")
+        return match["id"]
+
+    @staticmethod
+    def _slot_id(shop_id: str, start: datetime) -> str:
+        return f"{shop_id}|{start:%Y-%m-%dT%H:%M}"
+
+    @staticmethod
+    def _is_open(shop: Dict[str, Any], start: datetime, duration: int) -> bool:
+        minute = minute_of_week(start)
+        return any(interval["start"] <= minute and minute + duration <= interval["end"]
+                   for interval in shop.get("open_intervals") or [])
+
+    async def reserve(self, shop_id: str, start: datetime, duration: int) -> List[str]:
+        """Take one unit of capacity in every slot the appointment covers, or raise 409"""
+        shop = await self.get_shop(shop_id)
+        start = start.replace(second=0, microsecond=0, tzinfo=None)
+        if start.minute % SLOT_MINUTES:
+            raise HTTPException(status_code=400, detail=f"Appointments start on {SLOT_MINUTES}-minute boundaries")
+        if not self._is_open(shop, start, duration):
+            raise HTTPException(status_code=409, detail="The shop is not open for the whole appointment")
+
+        capacity = shop_capacity(shop)
+        reserved = []
+        for offset in range(0, duration, SLOT_MINUTES):
+            slot_start = start + timedelta(minutes=offset)
+            slot_id = self._slot_id(shop_id, slot_start)
+            # Create the counter with an _id-only upsert (concurrent creators retry instead of
+            # colliding), then take capacity with a conditional increment that never upserts
+            await self.db.shop_slots.update_one(
+                {"_id": slot_id},
+                {"$setOnInsert": {"shop_id": shop_id, "start": slot_start, "booked": 0}},
+                upsert=True
+            )
+            result = await self.db.shop_slots.update_one(
+                {"_id": slot_id, "booked": {"$lt": capacity}}, {"$inc": {"booked": 1}}
+            )
+            if not result.matched_count:
+                await self.release(reserved)
+                raise HTTPException(status_code=409, detail=f"No capacity at {slot_start:%Y-%m-%d %H:%M}")
+            reserved.append(slot_id)
+        return reserved
+
+    async def release(self, slot_ids: List[str]):
+        if slot_ids:
+            await self.db.shop_slots.update_many({"_id": {"$in": slot_ids}, "booked": {"$gt": 0}},
+                                                 {"$inc": {"booked": -1}})
+
+    async def availability(self, shop_id: str, start: datetime, end: datetime,
+                           duration: int) -> List[Dict[str, Any]]:
+        """Open appointment start times in [start, end) with the capacity left at each"""
+        shop = await self.get_shop(shop_id)
+        capacity = shop_capacity(shop)
+        start = start.replace(minute=start.minute - start.minute % SLOT_MINUTES, second=0, microsecond=0, tzinfo=None)
+        end = end.replace(tzinfo=None)
+        booked = {
+            slot["start"]: slot["booked"]
+            async for slot in self.db.shop_slots.find(
+                {"shop_id": shop_id, "start": {"$gte": start, "$lt": end + timedelta(minutes=duration)}},
+                {"_id": 0, "start": 1, "booked": 1}
+            )
+        }
+        step = timedelta(minutes=SLOT_MINUTES)
+        slots_needed = duration // SLOT_MINUTES
+        open_slots = []
+        slot_start = start
+        while slot_start < end:
+            if self._is_open(shop, slot_start, duration):
+                used = max(booked.get(slot_start + step * i, 0) for i in range(slots_needed))
+                if used < capacity:
+                    open_slots.append({
+                        "start": slot_start,
+                        "end": slot_start + timedelta(minutes=duration),
+                        "available": capacity - used
+                    })
+            slot_start += step
+        return open_slots
+
+    async def nearest_start(self, shop_id: str, requested: datetime, duration: int) -> datetime:
+        """The open appointment start closest to a requested time on the same day, or raise 409.
+
+        The public booking form takes any time ("10:15"), so it is snapped to a
+        bookable slot rather than rejected.
+        """
+        requested = requested.replace(second=0, microsecond=0, tzinfo=None)
+        day = requested.replace(hour=0, minute=0)
+        slots = await self.availability(shop_id, day, day + timedelta(days=1), duration)
+        if not slots:
+            raise HTTPException(status_code=409, detail=f"No open appointment times on {requested:%Y-%m-%d}")
+        return min((slot["start"] for slot in slots), key=lambda start: (abs(start - requested), start))
+
 class RepairShopService:
     """Service and repair shop management"""
-    def __init__(self, db):
+    def __init__(self, db, scheduler: AppointmentScheduler, refresh_interval: float = 600.0):
         self.db = db
+        self.scheduler = scheduler
+        self.refresh_interval = refresh_interval
+        self.estimates = ServiceEstimateIndex()
+        self._history_token: Optional[Tuple[Any, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await asyncio.to_thread(self.estimates.load_table)
+        await self.refresh_estimates()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh_estimates()
+            except Exception as e:
+                logging.error(f"Service estimate refresh failed: {str(e)}")
+
+    async def refresh_estimates(self):
+        """Rebuild estimate history from completed jobs when a new one has been recorded"""
+        latest = []
+        for collection in (self.db.services, self.db.public_services):
+            job = await collection.find_one({"status": "completed"}, {"_id": 0, "completed_at": 1},
+                                            sort=[("completed_at", -1)])
+            latest.append(job.get("completed_at") if job else None)
+        token = tuple(latest)
+        if token == self._history_token:
+            return
+
+        projection = {"_id": 0, "service_type": 1, "labor_cost": 1, "parts_cost": 1}
+        jobs = await self.db.services.aggregate([
+            {"$match": {"status": "completed"}},
+            {"$lookup": {"from": "vehicles", "localField": "vehicle_id", "foreignField": "id", "as": "vehicle"}},
+            {"$unwind": "$vehicle"},
+            {"$project": {**projection, "make": "$vehicle.make", "model": "$vehicle.model", "year": "$vehicle.year"}}
+        ]).to_list(None)
+        jobs += await self.db.public_services.aggregate([
+            {"$match": {"status": "completed"}},
+            {"$project": {**projection, "make": "$vehicle_make", "model": "$vehicle_model", "year": "$vehicle_year"}}
+        ]).to_list(None)
+        await asyncio.to_thread(self.estimates.build_history, jobs)
+        self._history_token = token
     
     async def schedule_service(self, vehicle_id: str, service_type: str, 
-                              scheduled_date: datetime) -> str:
-        """Schedule vehicle service"""
+                              scheduled_date: datetime, shop_id: Optional[str] = None) -> str:
+        """Schedule vehicle service, reserving bay time when a shop is given"""
         service_id = str(uuid.uuid4())
         service = {
             "id": service_id,
@@ -147,8 +670,48 @@ class RepairShopService:
             "status": "scheduled",
             "created_at": datetime.utcnow()
         }
-        await self.db.services.insert_one(service)
+        await self.book_appointment(self.db.services, service, shop_id)
         return service_id
+
+    async def book_appointment(self, collection, appointment: Dict[str, Any], shop_id: Optional[str]):
+        """Store an appointment after reserving its slots; the slots are released if the insert fails"""
+        slot_ids = []
+        if shop_id:
+            duration = service_duration(appointment["service_type"])
+            slot_ids = await self.scheduler.reserve(shop_id, appointment["scheduled_date"], duration)
+            appointment.update({
+                "shop_id": shop_id,
+                "scheduled_end": appointment["scheduled_date"] + timedelta(minutes=duration),
+                "slot_ids": slot_ids
+            })
+        try:
+            await collection.insert_one(appointment)
+        except Exception:
+            await self.scheduler.release(slot_ids)
+            raise
+
+    async def cancel_service(self, service_id: str) -> bool:
+        """Cancel a scheduled appointment and free its slots"""
+        for collection in (self.db.services, self.db.public_services):
+            appointment = await collection.find_one_and_update(
+                {"id": service_id, "status": "scheduled"},
+                {"$set": {"status": "cancelled", "cancelled_at": datetime.utcnow()}},
+                projection={"_id": 0, "slot_ids": 1}
+            )
+            if appointment:
+                await self.scheduler.release(appointment.get("slot_ids", []))
+                return True
+        return False
+
+    async def complete_service(self, service_id: str, labor_cost: float, parts_cost: float) -> bool:
+        """Record the final labor and parts cost of a job; completed jobs feed the estimates"""
+        update = {"$set": {"status": "completed", "labor_cost": labor_cost, "parts_cost": parts_cost,
+                           "completed_at": datetime.utcnow()}}
+        for collection in (self.db.services, self.db.public_services):
+            result = await collection.update_one({"id": service_id}, update)
+            if result.matched_count:
+                return True
+        return False
     
     async def get_service_history(self, vehicle_id: str) -> List[Dict[str, Any]]:
         """Get service history for a vehicle"""
@@ -159,81 +722,697 @@ class RepairShopService:
                 service["_id"] = str(service["_id"])
         return services
     
-    async def get_nearby_repair_shops(self, city: str, state: str, service_type: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Get nearby repair shops"""
-        # Sample repair shops data
-        repair_shops = [
-            {
-                "id": "shop1",
-                "name": "Nashville Auto Care",
-                "address": "123 Main St, Nashville, TN 37201",
-                "phone": "(615) 555-0101",
-                "rating": 4.8,
-                "services": ["Oil Change", "Brake Service", "Tire Service", "Engine Repair"],
-                "hours": "Mon-Fri 8AM-6PM, Sat 8AM-4PM",
-                "distance": "2.3 miles"
-            },
-            {
-                "id": "shop2", 
-                "name": "Music City Motors",
-                "address": "456 Broadway, Nashville, TN 37203",
-                "phone": "(615) 555-0102",
-                "rating": 4.6,
-                "services": ["Transmission", "AC Repair", "Oil Change", "Inspection"],
-                "hours": "Mon-Fri 7AM-7PM, Sat 9AM-5PM",
-                "distance": "3.1 miles"
-            },
-            {
-                "id": "shop3",
-                "name": "Franklin Auto Service",
-                "address": "789 Cool Springs Blvd, Franklin, TN 37067", 
-                "phone": "(615) 555-0103",
-                "rating": 4.9,
-                "services": ["Oil Change", "Brake Service", "Engine Diagnostics", "Tire Service"],
-                "hours": "Mon-Fri 8AM-6PM, Sat 8AM-2PM",
-                "distance": "8.5 miles"
-            }
-        ]
+    async def ensure_repair_shops(self):
+        """Create the repair shop indexes and seed the directory on first start"""
+        await self.db.repair_shops.create_index("id", unique=True)
+        await self.db.repair_shops.create_index([("location", "2dsphere")])
+        await self.db.repair_shops.create_index("service_keys")
+        await self.db.repair_shops.create_index([("rating", -1)])
+        if not await self.db.repair_shops.count_documents({}, limit=1):
+            await self.import_repair_shops([RepairShopImport(**shop) for shop in SAMPLE_REPAIR_SHOPS])
+            return
+        # Shops stored before hours/service normalization are re-imported once
+        legacy = await self.db.repair_shops.find({"service_keys": {"$exists": False}}, {"_id": 0}).to_list(None)
+        if legacy:
+            await self.import_repair_shops([RepairShopImport(**shop) for shop in legacy])
+
+    def normalize_repair_shop(self, shop: "RepairShopImport") -> Optional[Dict[str, Any]]:
+        """Directory document with a geo point, parsed hours and service keys; None if it can't be located"""
+        if shop.latitude is not None and shop.longitude is not None:
+            location = {"type": "Point", "coordinates": [shop.longitude, shop.latitude]}
+        else:
+            location = geocode(shop.zip_code or extract_zip(shop.address), shop.city, shop.state)
+        if not location:
+            return None
+        intervals = parse_hours(shop.hours)
+        document = shop.dict(exclude={"latitude", "longitude"})
+        document.update({
+            # Re-importing the same shop updates it rather than duplicating it
+            "id": shop.id or str(uuid.uuid5(uuid.NAMESPACE_URL, f"{shop.name}|{shop.address}".lower())),
+            "location": location,
+            "service_keys": sorted({service_key(service) for service in shop.services if service_key(service)}),
+            "open_intervals": open_intervals_documents(intervals),
+            "hours_by_day": format_hours(intervals) if intervals else None,
+            "updated_at": datetime.utcnow(),
+        })
+        return document
+
+    async def import_repair_shops(self, shops: List["RepairShopImport"], chunk_size: int = 1000) -> Dict[str, int]:
+        """Upsert shops into the directory in unordered bulk writes"""
+        imported = skipped = 0
+        operations = []
+        for shop in shops:
+            document = self.normalize_repair_shop(shop)
+            if document is None:
+                skipped += 1
+                continue
+            operations.append(UpdateOne({"id": document["id"]}, {"$set": document}, upsert=True))
+            if len(operations) >= chunk_size:
+                await self.db.repair_shops.bulk_write(operations, ordered=False)
+                imported += len(operations)
+                operations = []
+        if operations:
+            await self.db.repair_shops.bulk_write(operations, ordered=False)
+            imported += len(operations)
+        return {"imported": imported, "skipped": skipped}
+    
+    async def get_nearby_repair_shops(self, city: Optional[str], state: Optional[str],
+                                      service_type: Optional[str] = None, zip_code: Optional[str] = None,
+                                      radius: int = 50, latitude: Optional[float] = None,
+                                      longitude: Optional[float] = None, open_at: Optional[datetime] = None,
+                                      min_rating: Optional[float] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get repair shops near a point, ZIP or city centroid, nearest first.
+
+        `open_at` is a local time; only shops whose parsed hours cover it are returned.
+        """
+        if latitude is not None and longitude is not None:
+            center = {"type": "Point", "coordinates": [longitude, latitude]}
+        else:
+            center = geocode(zip_code, city, state)
+        if not center:
+            raise HTTPException(status_code=400, detail="Unknown location")
         
-        # Filter by service type if specified
+        query = {}
         if service_type:
-            repair_shops = [shop for shop in repair_shops if service_type in shop["services"]]
-            
+            query["service_keys"] = service_key(service_type)
+        if min_rating is not None:
+            query["rating"] = {"$gte": min_rating}
+        if open_at is not None:
+            minute = minute_of_week(open_at)
+            query["open_intervals"] = {"$elemMatch": {"start": {"$lte": minute}, "end": {"$gt": minute}}}
+        repair_shops = await self.db.repair_shops.aggregate([
+            {"$geoNear": {
+                "near": center,
+                "distanceField": "distance_meters",
+                "maxDistance": radius * METERS_PER_MILE,
+                "query": query,
+                "spherical": True
+            }},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "location": 0, "service_keys": 0, "open_intervals": 0}}
+        ]).to_list(limit)
+        
+        for shop in repair_shops:
+            miles = round(shop.pop("distance_meters") / METERS_PER_MILE, 1)
+            shop["distance_miles"] = miles
+            shop["distance"] = f"{miles} miles"
         return repair_shops
     
-    async def get_service_estimates(self, service_type: str, vehicle_make: str, vehicle_model: str) -> Dict[str, Any]:
+    def get_service_estimates(self, service_type: str, vehicle_make: str, vehicle_model: str,
+                              year: Optional[int] = None) -> Dict[str, Any]:
         """Get service cost estimates"""
-        estimates = {
-            "Oil Change": {"min": 35, "max": 75, "average": 55},
-            "Brake Service": {"min": 200, "max": 500, "average": 350},
-            "Tire Service": {"min": 100, "max": 800, "average": 400},
-            "Engine Repair": {"min": 500, "max": 2500, "average": 1200},
-            "Transmission": {"min": 1500, "max": 4000, "average": 2500},
-            "AC Repair": {"min": 150, "max": 800, "average": 400},
-            "Inspection": {"min": 25, "max": 50, "average": 35}
-        }
-        
-        base_estimate = estimates.get(service_type, {"min": 100, "max": 500, "average": 250})
-        
-        # Adjust for vehicle make (luxury brands cost more)
-        luxury_brands = ["BMW", "Mercedes-Benz", "Audi", "Lexus", "Infiniti"]
-        multiplier = 1.3 if vehicle_make in luxury_brands else 1.0
-        
+        estimate = self.estimates.estimate(service_type, vehicle_make, vehicle_model, year)
         return {
-            "service_type": service_type,
-            "vehicle": f"{vehicle_make} {vehicle_model}",
-            "min_cost": round(base_estimate["min"] * multiplier),
-            "max_cost": round(base_estimate["max"] * multiplier),
-            "average_cost": round(base_estimate["average"] * multiplier),
+            **estimate,
+            "vehicle": " ".join(str(part) for part in (year, vehicle_make, vehicle_model) if part),
             "note": "Prices may vary based on vehicle condition and shop location"
         }
 
+# Market Check API key tiers: sustained requests/second, burst size and default monthly quota
+API_KEY_TIERS = {
+    "basic": {"rate_per_second": 5, "burst": 10, "monthly_quota": 1000},
+    "premium": {"rate_per_second": 25, "burst": 50, "monthly_quota": 25000},
+    "enterprise": {"rate_per_second": 100, "burst": 200, "monthly_quota": 250000},
+}
+API_KEY_MISS_TTL = 5.0  # seconds an unknown key is rejected from memory before Mongo is asked again
+MAX_MISSED_API_KEYS = 10000
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def consume(self, amount: float = 1) -> bool:
+        """Take `amount` tokens if available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+    def retry_after(self, amount: float = 1) -> float:
+        """Seconds until `amount` tokens will be available"""
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+class CachedAPIKey:
+    """In-memory view of an API key with its local rate limit state"""
+    __slots__ = ("key", "quota", "committed", "pending", "period", "bucket")
+
+    def __init__(self, key: "MarketCheckAPIKey", committed: int, period: str):
+        tier = API_KEY_TIERS.get(key.tier, API_KEY_TIERS["basic"])
+        self.key = key
+        self.quota = key.requests_limit or tier["monthly_quota"]
+        self.committed = committed  # usage already persisted in Mongo
+        self.pending = 0  # usage not yet flushed
+        self.period = period
+        self.bucket = TokenBucket(tier["rate_per_second"], tier["burst"])
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.quota - self.committed - self.pending)
+
+class APIKeyAuthService:
+    """Validates Market Check API keys and enforces rate limits from memory.
+
+    Key metadata is loaded from `api_keys` in the background, so validation on
+    the request path only touches Mongo for a key created since the last
+    refresh; unknown keys are remembered for API_KEY_MISS_TTL seconds. Usage is
+    counted locally and flushed in batches with an update that clamps
+    `requests_used` at the key's limit.
+    """
+    def __init__(self, db, refresh_interval: float = 30.0, flush_interval: float = 1.0):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.flush_interval = flush_interval
+        self.keys: Dict[str, CachedAPIKey] = {}
+        self.missing: Dict[str, float] = {}  # unknown key -> monotonic time the miss expires
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def current_period() -> str:
+        return datetime.utcnow().strftime("%Y-%m")
+
+    async def start(self):
+        """Load all keys and start the background refresh/flush loop"""
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background loop and flush any outstanding usage"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        last_refresh = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() - last_refresh >= self.refresh_interval:
+                    await self.refresh()
+                    last_refresh = time.monotonic()
+            except Exception as e:
+                logging.error(f"API key sync failed: {str(e)}")
+
+    async def refresh(self):
+        """Reload key metadata and persisted usage, keeping unflushed usage"""
+        async with self._lock:
+            period = self.current_period()
+            refreshed = {}
+            async for doc in self.db.api_keys.find({"is_active": True}):
+                key = MarketCheckAPIKey(**doc)
+                committed = key.requests_used if doc.get("usage_period", period) == period else 0
+                cached = self.keys.get(key.key)
+                if cached and cached.period == period:
+                    cached.key = key
+                    cached.committed = committed
+                    cached.quota = key.requests_limit or API_KEY_TIERS.get(key.tier, API_KEY_TIERS["basic"])["monthly_quota"]
+                    refreshed[key.key] = cached
+                else:
+                    refreshed[key.key] = CachedAPIKey(key, committed, period)
+            # Usage recorded against keys that were just revoked still has to be persisted
+            for api_key, cached in self.keys.items():
+                if api_key not in refreshed and cached.pending:
+                    await self._flush_entries([cached])
+            self.keys = refreshed
+            self.missing = {api_key: expires for api_key, expires in self.missing.items() if api_key not in refreshed}
+
+    async def flush(self):
+        """Persist locally counted usage in a single bulk write"""
+        async with self._lock:
+            await self._flush_entries([cached for cached in self.keys.values() if cached.pending])
+
+    async def _flush_entries(self, entries: List[CachedAPIKey]):
+        if not entries:
+            return
+        counts = [(cached, cached.pending) for cached in entries]
+        operations = []
+        for cached, count in counts:
+            # Pipeline update: restart the count on a new period and never exceed the limit,
+            # even when several API workers flush against the same key
+            operations.append(UpdateOne(
+                {"key": cached.key.key},
+                [{"$set": {
+                    "requests_used": {"$min": [
+                        cached.quota,
+                        {"$cond": [
+                            {"$eq": ["$usage_period", cached.period]},
+                            {"$add": ["$requests_used", count]},
+                            count
+                        ]}
+                    ]},
+                    "usage_period": cached.period
+                }}]
+            ))
+        await self.db.api_keys.bulk_write(operations, ordered=False)
+        for cached, count in counts:
+            cached.pending -= count
+            cached.committed = min(cached.quota, cached.committed + count)
+
+    async def _load_key(self, api_key: str) -> Optional[CachedAPIKey]:
+        """A key missing from the cache, looked up once (a key created since the last refresh)"""
+        now = time.monotonic()
+        if self.missing.get(api_key, 0.0) > now:
+            return None
+        doc = await self.db.api_keys.find_one({"key": api_key, "is_active": True})
+        if not doc:
+            if len(self.missing) >= MAX_MISSED_API_KEYS:
+                self.missing = {key: expires for key, expires in self.missing.items() if expires > now}
+                if len(self.missing) >= MAX_MISSED_API_KEYS:
+                    self.missing.clear()
+            self.missing[api_key] = now + API_KEY_MISS_TTL
+            return None
+        period = self.current_period()
+        key = MarketCheckAPIKey(**doc)
+        committed = key.requests_used if doc.get("usage_period", period) == period else 0
+        # Another request may have loaded it meanwhile; keep the entry holding its usage
+        return self.keys.setdefault(api_key, CachedAPIKey(key, committed, period))
+
+    async def deactivate(self, key_id: str) -> bool:
+        """Revoke a key: stored inactive and dropped from this worker's cache at once"""
+        doc = await self.db.api_keys.find_one_and_update(
+            {"id": key_id}, {"$set": {"is_active": False}}, projection={"_id": 0, "key": 1}
+        )
+        if not doc:
+            return False
+        async with self._lock:
+            cached = self.keys.pop(doc["key"], None)
+            if cached and cached.pending:
+                await self._flush_entries([cached])
+        self.missing[doc["key"]] = time.monotonic() + API_KEY_MISS_TTL
+        return True
+
+    async def authorize(self, api_key: str, cost: int = 1) -> "MarketCheckAPIKey":
+        """Validate a key, charge `cost` against its monthly quota and one burst token"""
+        cached = self.keys.get(api_key) or await self._load_key(api_key)
+        if not cached or not cached.key.is_active:
+            raise HTTPException(status_code=401, detail="Invalid API key")
+        if cached.key.expires_at and cached.key.expires_at <= datetime.utcnow():
+            raise HTTPException(status_code=401, detail="API key expired")
+
+        period = self.current_period()
+        if cached.period != period:
+            cached.period = period
+            cached.committed = 0
+
+        if cached.remaining < cost:
+            raise HTTPException(status_code=429, detail="API rate limit exceeded")
+        if not cached.bucket.consume():
+            raise HTTPException(
+                status_code=429,
+                detail="API burst limit exceeded",
+                headers={"Retry-After": str(max(1, int(cached.bucket.retry_after() + 0.999)))}
+            )
+        cached.pending += cost
+        return cached.key
+
+class InventoryVersionService:
+    """Tracks an inventory generation token used to build HTTP cache validators.
+
+    The token combines a counter bumped by API writes with the newest
+    `updated_at` and the collection size, so writes made directly by the
+    standalone scrapers also invalidate cached listings. It is refreshed from
+    Mongo at most every `refresh_interval` seconds, never per request.
+    """
+    def __init__(self, db, refresh_interval: float = 2.0):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.token = "0"
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def current(self) -> str:
+        """Current generation token, refreshed if stale"""
+        if time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return self.token
+        async with self._lock:
+            if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+                await self._refresh()
+        return self.token
+
+    async def _refresh(self):
+        counter = await self.db.counters.find_one({"_id": "inventory"}) or {}
+        latest = await self.db.vehicles.find({}, {"updated_at": 1, "_id": 0}).sort("updated_at", -1).limit(1).to_list(1)
+        latest_ts = latest[0]["updated_at"].timestamp() if latest and latest[0].get("updated_at") else 0
+        count = await self.db.vehicles.estimated_document_count()
+        self.token = f"{counter.get('generation', 0)}.{int(latest_ts * 1000)}.{count}"
+        self._refreshed_at = time.monotonic()
+
+    async def bump(self):
+        """Invalidate cached listings after an inventory write"""
+        await self.db.counters.update_one({"_id": "inventory"}, {"$inc": {"generation": 1}}, upsert=True)
+        self._refreshed_at = 0.0
+
+    @staticmethod
+    def vehicle_etag(vehicle_id: str, updated_at: Optional[datetime]) -> str:
+        version = int(updated_at.timestamp() * 1000) if updated_at else 0
+        return f'W/"v-{vehicle_id}-{version}"'
+
+    async def listing_etag(self, scope: str, params: Dict[str, Any]) -> str:
+        token = await self.current()
+        key = orjson.dumps(params, option=orjson.OPT_SORT_KEYS, default=str)
+        return f'W/"{scope}-{token}-{hashlib.sha1(key).hexdigest()[:16]}"'
+
+class AutocompleteService:
+    """Keeps the make/model autocomplete trie in sync with active inventory.
+
+    Requests are answered from memory; the trie's counts are re-aggregated in
+    the background only when the inventory generation token changes.
+    """
+    def __init__(self, db, version_service: InventoryVersionService, refresh_interval: float = 30.0):
+        self.db = db
+        self.version_service = version_service
+        self.refresh_interval = refresh_interval
+        self.index = MakeModelAutocomplete()
+        self._token: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error(f"Autocomplete refresh failed: {str(e)}")
+
+    async def refresh(self):
+        token = await self.version_service.current()
+        if token == self._token:
+            return
+        rows = await self.db.vehicles.aggregate([
+            {"$match": {"status": "active"}},
+            {"$group": {"_id": {"make": "$make", "model": "$model"}, "count": {"$sum": 1}}}
+        ]).to_list(None)
+        self.index.update_counts((row["_id"].get("make"), row["_id"].get("model"), row["count"]) for row in rows)
+        self._token = token
+
+    def suggest(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        return self.index.suggest(query, limit=limit)
+
+# How strongly each event type signals interest in a vehicle's attributes
+CUSTOMER_EVENT_WEIGHTS = {"view": 1.0, "search": 0.5, "favorite": 3.0}
+RECENT_VEHICLES_KEPT = 50
+
+def profile_key(value: str) -> str:
+    """Make a body style/make usable as a Mongo sub-document key"""
+    return value.replace(".", "_").lstrip("$")
+
+def summarize_customer_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Derive budget, preferred body styles/makes and an engagement score from a rolled-up profile"""
+    if not profile:
+        return {"budget_range": None, "body_styles": [], "makes": [], "engagement": 0.0}
+
+    def top(counts: Dict[str, float], n: int = 3) -> List[str]:
+        return [name for name, _ in sorted(counts.items(), key=lambda item: -item[1])[:n]]
+
+    budget_range = None
+    if profile.get("price_weight"):
+        average = profile["price_weighted_sum"] / profile["price_weight"]
+        # Centre the budget on what they look at most, bounded by what they have looked at
+        budget_range = [
+            round(max(profile.get("price_min", 0), average * 0.8), -2),
+            round(min(profile.get("price_max", average * 1.2), average * 1.2), -2)
+        ]
+
+    counts = profile.get("event_counts", {})
+    activity = sum(CUSTOMER_EVENT_WEIGHTS.get(kind, 0) * count for kind, count in counts.items())
+    idle_days = (datetime.utcnow() - profile.get("last_event_at", datetime.utcnow())).total_seconds() / 86400
+    engagement = (1 - np.exp(-activity / 20)) * np.exp(-max(idle_days, 0) / 14)
+
+    return {
+        "budget_range": budget_range,
+        "body_styles": top(profile.get("body_styles", {})),
+        "makes": top(profile.get("makes", {})),
+        "engagement": round(float(engagement), 3)
+    }
+
+SEARCH_PRICE_FIELDS = ("price_min", "price_max")
+
+def search_price(value: Any) -> Optional[float]:
+    """A search event's price filter as a number ("25000", "$25,000"); ValueError if it isn't one"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid price filter: {value!r}")
+    if isinstance(value, str):
+        value = value.replace("$", "").replace(",", "").strip()
+    price = float(value)
+    if not math.isfinite(price) or price < 0:
+        raise ValueError(f"Invalid price filter: {value!r}")
+    return price
+
+class CustomerEventService:
+    """Buffers client events in memory and appends them to monthly collections.
+
+    `record` only appends to a list, so ingestion never waits on Mongo. A
+    background loop flushes the buffer with unordered insert_many into
+    `customer_events_YYYYMM` and periodically rolls new events up into
+    `customer_profiles` with one bulk upsert of $inc/$min/$max counters.
+    """
+    ROLLUP_LAG = timedelta(seconds=5)  # leaves room for in-flight inserts from other workers
+    ROLLUP_BATCH = 5000  # events folded into profiles per bulk write
+
+    def __init__(self, db, flush_interval: float = 1.0, rollup_interval: float = 60.0,
+                 flush_size: int = 5000, max_buffer: int = 100000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.rollup_interval = rollup_interval
+        self.flush_size = flush_size
+        self.max_buffer = max_buffer
+        self.buffer: List[Dict[str, Any]] = []
+        self._flush_requested = asyncio.Event()
+        self._indexed_partitions = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def partition(moment: datetime) -> str:
+        return f"customer_events_{moment:%Y%m}"
+
+    def record(self, events: List[Dict[str, Any]]) -> int:
+        """Queue events for the next flush"""
+        if len(self.buffer) + len(events) > self.max_buffer:
+            raise HTTPException(status_code=503, detail="Event buffer full", headers={"Retry-After": "1"})
+        self.buffer.extend(events)
+        if len(self.buffer) >= self.flush_size:
+            self._flush_requested.set()
+        return len(events)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background loop and persist what is still buffered"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        last_rollup = time.monotonic()
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+                if time.monotonic() - last_rollup >= self.rollup_interval:
+                    await self.rollup()
+                    last_rollup = time.monotonic()
+            except Exception as e:
+                logging.error(f"Customer event sync failed: {str(e)}")
+
+    async def flush(self):
+        """Append buffered events to their monthly partition"""
+        if not self.buffer:
+            return
+        events, self.buffer = self.buffer, []
+        ingested_at = datetime.utcnow()
+        collection = self.partition(ingested_at)
+        for event in events:
+            event["ingested_at"] = ingested_at
+        try:
+            if collection not in self._indexed_partitions:
+                await self.db[collection].create_index("ingested_at")
+                self._indexed_partitions.add(collection)
+            await self.db[collection].insert_many(events, ordered=False)
+        except Exception as e:
+            logging.error(f"Failed to write {len(events)} customer events: {str(e)}")
+            # Keep what still fits so a Mongo blip doesn't drop the batch
+            room = max(0, self.max_buffer - len(self.buffer))
+            self.buffer = events[:room] + self.buffer
+
+    async def rollup(self) -> int:
+        """Fold events ingested since the last checkpoint into customer profiles"""
+        checkpoint = await self.db.counters.find_one({"_id": "customer_event_rollup"})
+        start = checkpoint["ingested_at"] if checkpoint else datetime.utcnow() - timedelta(days=31)
+        end = datetime.utcnow() - self.ROLLUP_LAG
+        if end <= start:
+            return 0
+
+        # Claim the window first so concurrent API workers never fold the same events twice
+        if checkpoint:
+            claimed = await self.db.counters.find_one_and_update(
+                {"_id": "customer_event_rollup", "ingested_at": start}, {"$set": {"ingested_at": end}}
+            )
+            if claimed is None:
+                return 0
+        else:
+            try:
+                await self.db.counters.insert_one({"_id": "customer_event_rollup", "ingested_at": end})
+            except DuplicateKeyError:
+                return 0
+
+        progress = {"ingested_at": start}
+        try:
+            return await self._rollup_window(start, end, progress)
+        except Exception:
+            # Hand back what wasn't folded yet so the next run retries it
+            await self.db.counters.update_one(
+                {"_id": "customer_event_rollup", "ingested_at": end}, {"$set": {"ingested_at": progress["ingested_at"]}}
+            )
+            raise
+
+    async def _rollup_window(self, start: datetime, end: datetime, progress: Dict[str, datetime]) -> int:
+        """Stream the window's events in ingestion order, folding them ROLLUP_BATCH at a time.
+
+        Batches end between flushes (events of one flush share an ingested_at),
+        so `progress` always marks a point up to which everything is folded.
+        """
+        partitions = []
+        month = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        while month <= end:
+            partitions.append(self.partition(month))
+            month = (month + timedelta(days=32)).replace(day=1)
+        folded = 0
+        batch: List[Dict[str, Any]] = []
+        for collection in partitions:
+            async for event in self.db[collection].find(
+                {"ingested_at": {"$gt": start, "$lte": end}},
+                {"_id": 0, "customer_id": 1, "type": 1, "vehicle_id": 1, "query": 1, "occurred_at": 1,
+                 "ingested_at": 1}
+            ).sort("ingested_at", 1):
+                if len(batch) >= self.ROLLUP_BATCH and event["ingested_at"] != batch[-1]["ingested_at"]:
+                    folded += await self._fold_events(batch, end)
+                    progress["ingested_at"] = batch[-1]["ingested_at"]
+                    batch = []
+                batch.append(event)
+        if batch:
+            folded += await self._fold_events(batch, end)
+        return folded
+
+    async def _fold_events(self, events: List[Dict[str, Any]], end: datetime) -> int:
+        vehicle_ids = list({event["vehicle_id"] for event in events if event.get("vehicle_id")})
+        vehicles = {}
+        for i in range(0, len(vehicle_ids), 1000):
+            async for vehicle in self.db.vehicles.find(
+                {"id": {"$in": vehicle_ids[i:i + 1000]}},
+                {"_id": 0, "id": 1, "price": 1, "body_style": 1, "make": 1}
+            ):
+                vehicles[vehicle["id"]] = vehicle
+
+        updates: Dict[str, Dict[str, Any]] = {}
+        folded = 0
+        for event in events:
+            kind = event.get("type")
+            try:
+                # Events stored before price filters were validated may hold anything
+                prices = [price for price in (search_price((event.get("query") or {}).get(key))
+                                              for key in SEARCH_PRICE_FIELDS) if price is not None] \
+                    if kind == "search" else []
+                if not event.get("customer_id"):
+                    raise ValueError("missing customer_id")
+            except (TypeError, ValueError) as e:
+                logging.warning(f"Skipping unreadable customer event: {str(e)}")
+                continue
+            folded += 1
+            weight = CUSTOMER_EVENT_WEIGHTS.get(kind, 0)
+            update = updates.setdefault(event["customer_id"], {
+                "$inc": {}, "$min": {}, "$max": {}, "recent": [], "favorites": []
+            })
+            increments = update["$inc"]
+            increments[f"event_counts.{kind}"] = increments.get(f"event_counts.{kind}", 0) + 1
+            occurred_at = event.get("occurred_at") or end
+            if occurred_at > update["$max"].get("last_event_at", datetime.min):
+                update["$max"]["last_event_at"] = occurred_at
+
+            if kind == "search":
+                query = event.get("query") or {}
+                attributes = {"body_style": query.get("body_style"), "make": query.get("make")}
+            else:
+                vehicle = vehicles.get(event.get("vehicle_id"))
+                if not vehicle:
+                    continue
+                attributes = vehicle
+                prices = [vehicle["price"]] if vehicle.get("price") else []
+                update["favorites" if kind == "favorite" else "recent"].append(vehicle["id"])
+
+            for field, group in (("body_style", "body_styles"), ("make", "makes")):
+                value = attributes.get(field)
+                if value and isinstance(value, str):
+                    value = canonical_make(value) if field == "make" else value
+                    key = f"{group}.{profile_key(value)}"
+                    increments[key] = increments.get(key, 0) + weight
+            for price in prices:
+                increments["price_weighted_sum"] = increments.get("price_weighted_sum", 0) + price * weight
+                increments["price_weight"] = increments.get("price_weight", 0) + weight
+                update["$min"]["price_min"] = min(update["$min"].get("price_min", price), price)
+                update["$max"]["price_max"] = max(update["$max"].get("price_max", price), price)
+
+        operations = []
+        for customer_id, update in updates.items():
+            recent, favorites = update.pop("recent"), update.pop("favorites")
+            update = {operator: fields for operator, fields in update.items() if fields}
+            update["$set"] = {"updated_at": datetime.utcnow()}
+            if recent:
+                update["$push"] = {"recent_vehicle_ids": {"$each": recent, "$slice": -RECENT_VEHICLES_KEPT}}
+            if favorites:
+                update["$addToSet"] = {"favorite_vehicle_ids": {"$each": list(dict.fromkeys(favorites))}}
+            operations.append(UpdateOne({"customer_id": customer_id}, update, upsert=True))
+        if operations:
+            await self.db.customer_profiles.bulk_write(operations, ordered=False)
+        return folded
+
 # Initialize CRM services
 image_manager = VehicleImageManager(db)
-ai_crm_service = AICRMService(db)
-desking_service = DeskingService(db)
+rate_book = RateBook()
+desking_service = DeskingService(db, rate_book)
 billing_service = BillingService(db)
-repair_shop_service = RepairShopService(db)
+appointment_scheduler = AppointmentScheduler(db)
+repair_shop_service = RepairShopService(db, appointment_scheduler)
+api_key_auth_service = APIKeyAuthService(db)
+inventory_version_service = InventoryVersionService(db)
+ai_crm_service = AICRMService(db, inventory_version_service)
+customer_event_service = CustomerEventService(db)
+autocomplete_service = AutocompleteService(db, inventory_version_service)
 
 # Create the main app - COMBINED SYSTEM
 app = FastAPI(title="Pulse Auto Market API - Complete CRM & Marketplace", version="2.0.0")
@@ -283,7 +1462,7 @@ class Vehicle(BaseModel):
     year: int
     trim: Optional[str] = None
     price: float
-    mileage: int
+    mileage: Optional[int] = None  # None when the listing didn't state it
     condition: VehicleCondition
     status: VehicleStatus = VehicleStatus.ACTIVE
     exterior_color: Optional[str] = None
@@ -303,7 +1482,10 @@ class Vehicle(BaseModel):
     dealer_city: Optional[str] = None
     dealer_state: Optional[str] = None
     dealer_zip: Optional[str] = None
+    location: Optional[Dict[str, Any]] = None  # GeoJSON point of the dealer, for radius search
     source_url: Optional[str] = None
+    sources: List[Dict[str, Any]] = Field(default_factory=list)  # every dealer listing merged into this vehicle
+    photo_hash: Optional[str] = None  # perceptual hash of the primary photo, for duplicate detection
     scraped_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -321,6 +1503,29 @@ class Customer(BaseModel):
     preferences: Dict[str, Any] = Field(default_factory=dict)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class CustomerEventType(str, Enum):
+    VIEW = "view"
+    SEARCH = "search"
+    FAVORITE = "favorite"
+
+class CustomerEvent(BaseModel):
+    customer_id: str
+    type: CustomerEventType
+    vehicle_id: Optional[str] = None
+    query: Dict[str, Any] = Field(default_factory=dict)  # search filters for "search" events
+    occurred_at: Optional[datetime] = None
+
+    @field_validator("query")
+    @classmethod
+    def coerce_price_filters(cls, query: Dict[str, Any]) -> Dict[str, Any]:
+        query = dict(query)
+        for key in SEARCH_PRICE_FIELDS:
+            query[key] = search_price(query.get(key))
+        return {key: value for key, value in query.items() if value is not None}
+
+class CustomerEventBatch(BaseModel):
+    events: List[CustomerEvent] = Field(..., max_length=1000)
+
 class Deal(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     vehicle_id: str
@@ -335,7 +1540,81 @@ class Deal(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     approved_at: Optional[datetime] = None
 
+class AmortizationSelection(BaseModel):
+    term_months: int = Field(..., gt=0, le=120)
+    interest_rate: float = Field(..., ge=0)
+    down_payment: float = Field(0.0, ge=0)
+
+class PaymentMatrixRequest(BaseModel):
+    vehicle_price: float = Field(..., gt=0)
+    terms: List[int] = Field(..., min_length=1, max_length=50)
+    rates: List[float] = Field(..., min_length=1, max_length=50)  # APR percent
+    down_payments: List[float] = Field(default_factory=lambda: [0.0], min_length=1, max_length=50)
+    tax_rate: float = Field(0.0, ge=0)  # percent
+    fees: float = Field(0.0, ge=0)
+    trade_in_value: float = Field(0.0, ge=0)
+    trade_in_payoff: float = Field(0.0, ge=0)
+    trade_in_tax_credit: bool = True
+    amortization: Optional[AmortizationSelection] = None
+
+class ServiceContractQuoteRequest(BaseModel):
+    coverage: str
+    term_months: int = Field(..., gt=0)
+    term_miles: int = Field(..., gt=0)
+    vehicle_id: Optional[str] = None
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = None
+    mileage: Optional[int] = Field(None, ge=0)
+    price: Optional[float] = Field(None, ge=0)
+    fuel_type: Optional[str] = None
+    surcharges: List[str] = []
+    deductible: Optional[str] = None
+    amount_financed: Optional[float] = Field(None, ge=0)  # adds a GAP eligibility check
+    vehicle_value: Optional[float] = Field(None, ge=0)  # MSRP/NADA value for GAP
+
+class RepairShopImport(BaseModel):
+    id: Optional[str] = None
+    name: str
+    address: str
+    city: Optional[str] = None
+    state: Optional[str] = None
+    zip_code: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    phone: Optional[str] = None
+    rating: Optional[float] = Field(None, ge=0, le=5)
+    review_count: Optional[int] = Field(None, ge=0)
+    services: List[str] = []
+    hours: Optional[str] = None  # e.g. "Mon-Fri 8AM-6PM, Sat 8AM-4PM"
+    bays: int = Field(DEFAULT_SHOP_BAYS, ge=1)
+    technicians: Optional[int] = Field(None, ge=1)
+
+class ServiceEstimateBatchRequest(BaseModel):
+    vehicle_make: str
+    vehicle_model: str
+    year: Optional[int] = None
+    service_types: List[str] = Field(..., min_length=1, max_length=50)
+
+class RateTier(BaseModel):
+    max_term_months: int = Field(..., gt=0, le=120)
+    interest_rate: float = Field(..., ge=0)  # APR percent
+
+class DealRecalculationJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    rate_sheet: List[RateTier]
+    dealer_id: Optional[str] = None
+    status: ScrapingStatus = ScrapingStatus.PENDING
+    deals_total: int = 0
+    deals_processed: int = 0
+    deals_updated: int = 0
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    error_message: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 class VehicleCreate(BaseModel):
+    vin: Optional[str] = None
     make: str
     model: str
     year: int
@@ -384,160 +1663,381 @@ class ScrapingJob(BaseModel):
     error_message: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-class Dealer(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    phone: Optional[str] = None
-    email: Optional[str] = None
-    address: Optional[str] = None
-    city: Optional[str] = None
-    state: Optional[str] = None
-    zip_code: Optional[str] = None
-    website: Optional[str] = None
-    license_number: Optional[str] = None
-    is_active: bool = True
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+class Dealer(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    address: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    zip_code: Optional[str] = None
+    website: Optional[str] = None
+    location: Optional[Dict[str, Any]] = None  # GeoJSON point
+    license_number: Optional[str] = None
+    is_active: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class MarketCheckAPIKey(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    key: str
+    user_id: str
+    tier: str  # "basic", "premium", "enterprise"
+    requests_used: int = 0
+    requests_limit: int
+    usage_period: Optional[str] = None  # "YYYY-MM" that requests_used counts against
+    is_active: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: Optional[datetime] = None
+
+# Fast response path: Mongo documents are projected to the model's fields and
+# serialized straight to JSON with orjson (datetimes and enums handled natively),
+# skipping model construction and FastAPI's response_model re-validation.
+def model_projection(model) -> Dict[str, int]:
+    """Mongo projection returning only the model's fields, without `_id`"""
+    projection = {field: 1 for field in model.model_fields}
+    projection["_id"] = 0
+    return projection
+
+def document_response(documents: Any, model) -> ORJSONResponse:
+    """Serialize raw documents directly; validate through `model` only in debug mode"""
+    if VALIDATE_RESPONSES:
+        if isinstance(documents, list):
+            documents = [model(**document).dict() for document in documents]
+        else:
+            documents = model(**documents).dict()
+    return ORJSONResponse(documents)
+
+def dealer_location(vehicle: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Geocode a vehicle's dealer from its ZIP, address or city"""
+    return geocode(
+        vehicle.get("dealer_zip") or extract_zip(vehicle.get("dealer_address")),
+        vehicle.get("dealer_city"),
+        vehicle.get("dealer_state")
+    )
+
+def build_vehicle_query(make: Optional[str] = None, model: Optional[str] = None,
+                        year_min: Optional[int] = None, year_max: Optional[int] = None,
+                        price_min: Optional[float] = None, price_max: Optional[float] = None,
+                        mileage_max: Optional[int] = None, condition: Optional["VehicleCondition"] = None,
+                        city: Optional[str] = None, state: Optional[str] = None) -> Dict[str, Any]:
+    """Structured filters shared by the customer search endpoints"""
+    query = {"status": VehicleStatus.ACTIVE}
+    
+    if make:
+        query["make"] = {"$regex": make, "$options": "i"}
+    if model:
+        query["model"] = {"$regex": model, "$options": "i"}
+    if year_min:
+        query["year"] = {"$gte": year_min}
+    if year_max:
+        if "year" in query:
+            query["year"]["$lte"] = year_max
+        else:
+            query["year"] = {"$lte": year_max}
+    if price_min:
+        query["price"] = {"$gte": price_min}
+    if price_max:
+        if "price" in query:
+            query["price"]["$lte"] = price_max
+        else:
+            query["price"] = {"$lte": price_max}
+    if mileage_max:
+        query["mileage"] = {"$lte": mileage_max}
+    if condition:
+        query["condition"] = condition
+    if city:
+        query["dealer_city"] = {"$regex": city, "$options": "i"}
+    if state:
+        query["dealer_state"] = {"$regex": state, "$options": "i"}
+    return query
+
+# Weighted text index over listing fields; matches in make/model outrank the description
+VEHICLE_TEXT_INDEX_WEIGHTS = {
+    "make": 10,
+    "model": 10,
+    "trim": 6,
+    "body_style": 5,
+    "drivetrain": 5,
+    "engine": 4,
+    "fuel_type": 4,
+    "transmission": 3,
+    "features": 3,
+    "exterior_color": 2,
+    "interior_color": 2,
+    "description": 1
+}
+
+# HTTP caching: ETags on listing/detail endpoints so revalidation can answer 304
+CACHE_CONTROL_REVALIDATE = "public, no-cache"
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of If-None-Match against `etag`"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tag = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == tag
+        for candidate in (part.strip() for part in header.split(","))
+    )
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL_REVALIDATE})
+
+def cached_response(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL_REVALIDATE
+    return response
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with brotli (if installed) or gzip.
+
+    Bodies smaller than `minimum_size`, already-encoded responses and binary
+    media types are passed through. Streaming responses are compressed chunk
+    by chunk so NDJSON streams keep flowing.
+    """
+    COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "application/javascript")
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose_encoding(self, scope) -> Optional[str]:
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1").lower()
+                break
+        # "gzip;q=0.8, br" -> {"gzip": 0.8, "br": 1.0}; "*" covers encodings not listed
+        weights: Dict[str, float] = {}
+        for token in accept.split(","):
+            coding, *params = [part.strip() for part in token.split(";")]
+            if not coding:
+                continue
+            quality = 1.0
+            for param in params:
+                if param.startswith("q="):
+                    try:
+                        quality = float(param[2:])
+                    except ValueError:
+                        quality = 0.0
+            weights[coding] = quality
+        supported = (["br"] if brotli is not None else []) + ["gzip"]
+        # Ties go to the server's preference (brotli compresses JSON smaller)
+        ranked = [(weights.get(coding, weights.get("*", 0.0)), -order, coding)
+                  for order, coding in enumerate(supported)]
+        quality, _, coding = max(ranked)
+        return coding if quality > 0 else None
+
+    def _compressor(self, encoding: str):
+        """(compress, sync_flush, finish) callables for the chosen encoding"""
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.flush, compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compress = flush = finish = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compress, flush, finish, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compress is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                content_type = headers.get("content-type", "")
+                if (start_message["status"] < 200 or start_message["status"] in (204, 304)
+                        or "content-encoding" in headers
+                        or not content_type.startswith(self.COMPRESSIBLE_TYPES)
+                        or (not more_body and len(body) < self.minimum_size)):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compress, flush, finish = self._compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    body = compress(body) + finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                await send(start_message)
 
-class MarketCheckAPIKey(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    key: str
-    user_id: str
-    tier: str  # "basic", "premium", "enterprise"
-    requests_used: int = 0
-    requests_limit: int
-    is_active: bool = True
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    expires_at: Optional[datetime] = None
+            # Flush every chunk so streamed lines reach the client without waiting for the next one
+            chunk = compress(body) + (flush() if more_body else finish())
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
 
 # Scraper Engine
+SCRAPE_BATCH_SIZE = 50  # scraped vehicles written (and made searchable) per bulk write
+
+# Scraping job filters (the customer search filter names) -> AutoTrader search parameters
+AUTOTRADER_FILTER_PARAMS = {
+    "make": "makeCodeList",
+    "model": "modelCodeList",
+    "year_min": "startYear",
+    "year_max": "endYear",
+    "price_min": "minPrice",
+    "price_max": "maxPrice",
+    "mileage_max": "mileage",
+    "zip": "zip",
+    "radius": "searchRadius",
+    "condition": "listingTypes",
+    "sort": "sortBy",
+}
+AUTOTRADER_NUMERIC_FILTERS = {"year_min", "year_max", "price_min", "price_max", "mileage_max", "radius"}
+AUTOTRADER_LISTING_TYPES = {"new": "NEW", "used": "USED", "certified": "CERTIFIED"}
+
+def autotrader_search_params(filters: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """AutoTrader search query parameters for a job's filters; raises ValueError on unsupported ones"""
+    params = {}
+    for name, value in (filters or {}).items():
+        if value is None or value == "":
+            continue
+        param = AUTOTRADER_FILTER_PARAMS.get(name)
+        if param is None:
+            raise ValueError(f"Unsupported AutoTrader filter: {name}")
+        if name in AUTOTRADER_NUMERIC_FILTERS:
+            value = str(int(float(value)))
+        elif name == "make":
+            value = (canonical_make(str(value)) or str(value)).upper()
+        elif name == "model":
+            value = str(value).upper()
+        elif name == "condition":
+            listing_type = AUTOTRADER_LISTING_TYPES.get(str(value).lower())
+            if listing_type is None:
+                raise ValueError(f"Unsupported AutoTrader condition: {value}")
+            value = listing_type
+        params[param] = str(value)
+    return params
+
 class VehicleScraper:
-    def __init__(self):
+    """AutoTrader scraper built on the staged ingest pipeline.
+
+    Search pages feed detail-page fetchers; parsing runs in a process pool and
+    photo downloads in their own workers, and each stage is bounded, so memory
+    stays flat however many listings a search returns. Requests to any one host
+    are capped at `host_concurrency`, which is what sets job throughput.
+    """
+    SEARCH_URL = "https://www.autotrader.com/cars-for-sale"
+
+    def __init__(self, host_concurrency: int = 6, parse_workers: int = 2, photo_concurrency: int = 4,
+                 max_photos: int = 10):
         self.session = None
+        self.host_concurrency = host_concurrency
+        self.parse_workers = parse_workers
+        self.photo_concurrency = photo_concurrency
+        self.max_photos = max_photos
+        self.search_stats: Dict[str, Any] = {}
         
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=self.host_concurrency))
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.session:
             await self.session.close()
     
-    async def scrape_autotrader_page(self, url: str) -> Dict[str, Any]:
-        """Scrape a single AutoTrader vehicle page"""
-        try:
-            async with self.session.get(url) as response:
-                if response.status != 200:
-                    return None
-                    
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                vehicle_data = {}
-                
-                # Extract basic info
-                title_elem = soup.find('h1', class_='listing-title')
-                if title_elem:
-                    title_text = title_elem.get_text().strip()
-                    # Parse "2020 Ford F-150 XLT" format
-                    title_parts = title_text.split()
-                    if len(title_parts) >= 3:
-                        vehicle_data['year'] = int(title_parts[0])
-                        vehicle_data['make'] = title_parts[1]
-                        vehicle_data['model'] = ' '.join(title_parts[2:])
-                
-                # Extract price
-                price_elem = soup.find('span', class_='first-price')
-                if price_elem:
-                    price_text = price_elem.get_text().strip()
-                    price_match = re.search(r'[\d,]+', price_text.replace('$', ''))
-                    if price_match:
-                        vehicle_data['price'] = float(price_match.group().replace(',', ''))
-                
-                # Extract mileage
-                mileage_elem = soup.find('span', {'data-cmp': 'mileage'})
-                if mileage_elem:
-                    mileage_text = mileage_elem.get_text().strip()
-                    mileage_match = re.search(r'[\d,]+', mileage_text)
-                    if mileage_match:
-                        vehicle_data['mileage'] = int(mileage_match.group().replace(',', ''))
-                
-                # Extract images and process them
-                images = []
-                img_elems = soup.find_all('img', class_='listing-photo')
-                for img in img_elems:
-                    img_url = img.get('src') or img.get('data-src')
-                    if img_url:
-                        try:
-                            async with self.session.get(img_url) as img_response:
-                                if img_response.status == 200:
-                                    img_data = await img_response.read()
-                                    img_base64 = base64.b64encode(img_data).decode('utf-8')
-                                    images.append(f"data:image/jpeg;base64,{img_base64}")
-                        except:
-                            continue
-                
-                # Use image manager to process images
-                vehicle_data['images'] = await image_manager.store_images("temp", images[:10])
-                
-                # Extract dealer info
-                dealer_elem = soup.find('div', class_='dealer-info')
-                if dealer_elem:
-                    dealer_name_elem = dealer_elem.find('h3')
-                    if dealer_name_elem:
-                        vehicle_data['dealer_name'] = dealer_name_elem.get_text().strip()
-                
-                vehicle_data['source_url'] = url
-                vehicle_data['condition'] = VehicleCondition.USED  # Default for AutoTrader
-                
-                return vehicle_data
-                
-        except Exception as e:
-            logging.error(f"Error scraping AutoTrader page {url}: {str(e)}")
-            return None
-    
-    async def scrape_autotrader_search(self, filters: Dict[str, Any], max_pages: int = 10) -> List[Dict[str, Any]]:
-        """Scrape AutoTrader search results"""
-        vehicles = []
-        
-        # Build search URL based on filters
-        base_url = "https://www.autotrader.com/cars-for-sale"
-        
+    async def search_result_urls(self, filters: Dict[str, Any], max_pages: int = 10,
+                                 base_url: Optional[str] = None):
+        """Detail page URLs from AutoTrader search results, one results page at a time"""
+        params = autotrader_search_params(filters)
         for page in range(1, max_pages + 1):
             try:
-                search_url = f"{base_url}?page={page}"
-                
-                async with self.session.get(search_url) as response:
+                async with self.session.get(base_url or self.SEARCH_URL, params={**params, "page": page}) as response:
                     if response.status != 200:
                         break
-                        
                     html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    
-                    # Find vehicle links
-                    vehicle_links = soup.find_all('a', href=re.compile(r'/cars-for-sale/vehicledetails'))
-                    
-                    if not vehicle_links:
-                        break
-                    
-                    # Process each vehicle
-                    for link in vehicle_links[:5]:  # Limit to 5 per page for demo
-                        vehicle_url = urljoin("https://www.autotrader.com", link.get('href'))
-                        vehicle_data = await self.scrape_autotrader_page(vehicle_url)
-                        
-                        if vehicle_data:
-                            vehicles.append(vehicle_data)
-                            
-                        # Add delay to be respectful
-                        await asyncio.sleep(1)
-                    
-                    # Add delay between pages
-                    await asyncio.sleep(2)
-                    
             except Exception as e:
                 logging.error(f"Error scraping AutoTrader search page {page}: {str(e)}")
                 break
-        
-        return vehicles
+            vehicle_urls = await asyncio.to_thread(parse_autotrader_search, html)
+            if not vehicle_urls:
+                break
+            for vehicle_url in vehicle_urls:
+                yield vehicle_url
+
+    async def fetch_page(self, url: str) -> Optional[Tuple[str, str]]:
+        async with self.session.get(url) as response:
+            if response.status != 200:
+                return None
+            return url, await response.text()
+
+    async def attach_photos(self, vehicle_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate a parsed listing, then download and store its photos"""
+        vehicle = build_scraped_vehicle(vehicle_data)
+        images = await download_photos(self.session, vehicle_data.get('image_urls', []), limit=self.max_photos)
+        vehicle.images = await image_manager.store_images(vehicle.id, images)
+        return vehicle.dict()
+
+    async def scrape_autotrader_search(self, filters: Dict[str, Any], max_pages: int = 10,
+                                       base_url: Optional[str] = None):
+        """Vehicles from an AutoTrader search, yielded as each one is parsed and its photos stored.
+
+        Counts for the search so far are in `search_stats`.
+        """
+        pipeline = IngestPipeline([
+            Stage("fetch", self.fetch_page, concurrency=self.host_concurrency),
+            Stage("parse", parse_autotrader_listing, concurrency=self.parse_workers, kind="process"),
+            Stage("photos", self.attach_photos, concurrency=self.photo_concurrency),
+        ])
+        stream = pipeline.stream(self.search_result_urls(filters, max_pages, base_url))
+        try:
+            async for vehicle in stream:
+                self.search_stats = pipeline.stats
+                yield vehicle
+        finally:
+            await stream.aclose()
+            self.search_stats = pipeline.stats
+
+def build_scraped_vehicle(vehicle_data: Dict[str, Any]) -> "Vehicle":
+    """Vehicle from parsed listing fields, with canonical make, VIN reconciliation and dealer location"""
+    vehicle_data = {key: value for key, value in vehicle_data.items() if key != 'image_urls'}
+    vehicle_data['make'] = canonical_make(vehicle_data.get('make'))
+    if vehicle_data.get('vin'):
+        vehicle_data['year'], vehicle_data['make'] = reconcile_with_vin(
+            vehicle_data['vin'], vehicle_data.get('year'), vehicle_data.get('make')
+        )
+    vehicle_data.setdefault('condition', VehicleCondition.USED)  # Default for AutoTrader
+    return Vehicle(
+        **vehicle_data,
+        dealer_id=vehicle_data.get('dealer_name', 'unknown'),
+        location=dealer_location(vehicle_data),
+    )
 
 # Background task for scraping
 async def run_scraping_job(job_id: str):
@@ -559,26 +2059,22 @@ async def run_scraping_job(job_id: str):
             }}
         )
         
+        async def publish_progress(written: int):
+            # Each batch is searchable as soon as it is written
+            await inventory_version_service.bump()
+            await db.scraping_jobs.update_one({"id": job_id}, {"$set": {"vehicles_processed": written}})
+        
         # Run scraper
         async with VehicleScraper() as scraper:
             if job.source == "autotrader":
-                vehicles_data = await scraper.scrape_autotrader_search(job.filters)
-                
-                # Process and save vehicles
-                for vehicle_data in vehicles_data:
-                    try:
-                        # Create vehicle object
-                        vehicle = Vehicle(
-                            **vehicle_data,
-                            dealer_id=vehicle_data.get('dealer_name', 'unknown'),
-                        )
-                        
-                        # Save to database
-                        await db.vehicles.insert_one(vehicle.dict())
-                        
-                    except Exception as e:
-                        logging.error(f"Error saving vehicle: {str(e)}")
-                        continue
+                # Listings of a car already in inventory are merged into it as extra sources
+                deduplicator = VehicleDeduplicator()
+                await deduplicator.load(db.vehicles)
+                writer = BatchWriter(db.vehicles, batch_size=SCRAPE_BATCH_SIZE, transform=deduplicator.resolve,
+                                     on_flush=publish_progress)
+                async for vehicle in scraper.scrape_autotrader_search(job.filters, base_url=job.target_url):
+                    await writer.add(vehicle)
+                await writer.flush()
                 
                 # Update job completion
                 await db.scraping_jobs.update_one(
@@ -586,8 +2082,8 @@ async def run_scraping_job(job_id: str):
                     {"$set": {
                         "status": ScrapingStatus.COMPLETED,
                         "completed_at": datetime.utcnow(),
-                        "vehicles_found": len(vehicles_data),
-                        "vehicles_processed": len(vehicles_data)
+                        "vehicles_found": scraper.search_stats["stages"]["parse"]["out"],
+                        "vehicles_processed": writer.written
                     }}
                 )
         
@@ -603,6 +2099,54 @@ async def run_scraping_job(job_id: str):
         )
         logging.error(f"Scraping job {job_id} failed: {str(e)}")
 
+async def run_deal_recalculation_job(job_id: str):
+    """Background task repricing pending deals for a new rate sheet"""
+    try:
+        job_doc = await db.deal_recalculation_jobs.find_one({"id": job_id})
+        if not job_doc:
+            return
+        job = DealRecalculationJob(**job_doc)
+
+        query = {"status": DealStatus.PENDING}
+        if job.dealer_id:
+            query["dealer_id"] = job.dealer_id
+        await db.deal_recalculation_jobs.update_one(
+            {"id": job_id},
+            {"$set": {
+                "status": ScrapingStatus.IN_PROGRESS,
+                "started_at": datetime.utcnow(),
+                "deals_total": await db.deals.count_documents(query)
+            }}
+        )
+
+        async def report(processed: int, updated: int):
+            await db.deal_recalculation_jobs.update_one(
+                {"id": job_id},
+                {"$set": {"deals_processed": processed, "deals_updated": updated}}
+            )
+
+        result = await desking_service.recalculate_pending_deals(job.rate_sheet, job.dealer_id, progress=report)
+        await db.deal_recalculation_jobs.update_one(
+            {"id": job_id},
+            {"$set": {
+                "status": ScrapingStatus.COMPLETED,
+                "completed_at": datetime.utcnow(),
+                "deals_processed": result["processed"],
+                "deals_updated": result["updated"]
+            }}
+        )
+
+    except Exception as e:
+        await db.deal_recalculation_jobs.update_one(
+            {"id": job_id},
+            {"$set": {
+                "status": ScrapingStatus.FAILED,
+                "completed_at": datetime.utcnow(),
+                "error_message": str(e)
+            }}
+        )
+        logging.error(f"Deal recalculation job {job_id} failed: {str(e)}")
+
 # API Routes
 
 # Core API Routes
@@ -628,6 +2172,7 @@ async def health_check():
 # Customer Interface Routes
 @customer_router.get("/vehicles", response_model=List[Vehicle])
 async def search_vehicles(
+    request: Request,
     make: Optional[str] = None,
     model: Optional[str] = None,
     year_min: Optional[int] = None,
@@ -638,57 +2183,145 @@ async def search_vehicles(
     condition: Optional[VehicleCondition] = None,
     city: Optional[str] = None,
     state: Optional[str] = None,
+    zip_code: Optional[str] = None,
+    radius: int = 50,
     page: int = 1,
     limit: int = 20
 ):
-    """Search vehicles for customers"""
-    query = {"status": VehicleStatus.ACTIVE}
-    
-    if make:
-        query["make"] = {"$regex": make, "$options": "i"}
-    if model:
-        query["model"] = {"$regex": model, "$options": "i"}
-    if year_min:
-        query["year"] = {"$gte": year_min}
-    if year_max:
-        if "year" in query:
-            query["year"]["$lte"] = year_max
-        else:
-            query["year"] = {"$lte": year_max}
-    if price_min:
-        query["price"] = {"$gte": price_min}
-    if price_max:
-        if "price" in query:
-            query["price"]["$lte"] = price_max
-        else:
-            query["price"] = {"$lte": price_max}
-    if mileage_max:
-        query["mileage"] = {"$lte": mileage_max}
-    if condition:
-        query["condition"] = condition
-    if city:
-        query["dealer_city"] = {"$regex": city, "$options": "i"}
-    if state:
-        query["dealer_state"] = {"$regex": state, "$options": "i"}
+    """Search vehicles for customers, nearest first when a ZIP code is given"""
+    etag = await inventory_version_service.listing_etag("search", dict(request.query_params))
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
     
+    query = build_vehicle_query(make, model, year_min, year_max, price_min, price_max,
+                                mileage_max, condition, city, state)
     skip = (page - 1) * limit
     
-    vehicles = await db.vehicles.find(query).skip(skip).limit(limit).to_list(limit)
-    return [Vehicle(**vehicle) for vehicle in vehicles]
+    if zip_code:
+        center = geocode(zip_code)
+        if not center:
+            raise HTTPException(status_code=400, detail="Unknown ZIP code")
+        projection = model_projection(Vehicle)
+        projection["distance_meters"] = 1
+        vehicles = await db.vehicles.aggregate([
+            {"$geoNear": {
+                "near": center,
+                "distanceField": "distance_meters",
+                "maxDistance": radius * METERS_PER_MILE,
+                "query": query,
+                "spherical": True
+            }},
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": projection}
+        ]).to_list(limit)
+        for vehicle in vehicles:
+            vehicle["distance_miles"] = round(vehicle.pop("distance_meters") / METERS_PER_MILE, 1)
+    else:
+        vehicles = await db.vehicles.find(query, model_projection(Vehicle)).skip(skip).limit(limit).to_list(limit)
+    return cached_response(document_response(vehicles, Vehicle), etag)
+
+@customer_router.get("/search", response_model=List[Vehicle])
+async def full_text_search(
+    request: Request,
+    q: str = Query(..., min_length=1, description='Free text, e.g. leather heated seats awd or "third row"'),
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    mileage_max: Optional[int] = None,
+    condition: Optional[VehicleCondition] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    zip_code: Optional[str] = None,
+    radius: int = 50,
+    page: int = 1,
+    limit: int = 20
+):
+    """Full-text vehicle search ranked by relevance, combined with the structured filters"""
+    etag = await inventory_version_service.listing_etag("text", dict(request.query_params))
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    
+    query = build_vehicle_query(make, model, year_min, year_max, price_min, price_max,
+                                mileage_max, condition, city, state)
+    query["$text"] = {"$search": q}
+    if zip_code:
+        center = geocode(zip_code)
+        if not center:
+            raise HTTPException(status_code=400, detail="Unknown ZIP code")
+        # $geoNear cannot be combined with $text, so radius is a filter here and results stay relevance-ordered
+        query["location"] = {"$geoWithin": {"$centerSphere": [
+            center["coordinates"], radius / EARTH_RADIUS_MILES
+        ]}}
+    
+    projection = model_projection(Vehicle)
+    projection["relevance"] = {"$meta": "textScore"}
+    skip = (page - 1) * limit
+    vehicles = await db.vehicles.find(query, projection).sort(
+        [("relevance", {"$meta": "textScore"})]
+    ).skip(skip).limit(limit).to_list(limit)
+    return cached_response(document_response(vehicles, Vehicle), etag)
 
 @customer_router.get("/vehicles/{vehicle_id}", response_model=Vehicle)
-async def get_vehicle(vehicle_id: str):
+async def get_vehicle(vehicle_id: str, request: Request):
     """Get specific vehicle details"""
-    vehicle = await db.vehicles.find_one({"id": vehicle_id, "status": VehicleStatus.ACTIVE})
+    query = {"id": vehicle_id, "status": VehicleStatus.ACTIVE}
+    
+    # Revalidation only needs the version, not the full document with its images
+    if request.headers.get("if-none-match"):
+        version = await db.vehicles.find_one(query, {"updated_at": 1, "_id": 0})
+        if not version:
+            raise HTTPException(status_code=404, detail="Vehicle not found")
+        etag = inventory_version_service.vehicle_etag(vehicle_id, version.get("updated_at"))
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+    
+    vehicle = await db.vehicles.find_one(query, model_projection(Vehicle))
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
-    return Vehicle(**vehicle)
+    etag = inventory_version_service.vehicle_etag(vehicle_id, vehicle.get("updated_at"))
+    return cached_response(document_response(vehicle, Vehicle), etag)
+
+@customer_router.get("/vehicles/{vehicle_id}/similar")
+async def get_similar_vehicles(vehicle_id: str, limit: int = Query(10, ge=1, le=50)):
+    """Vehicles most similar to this one, scored from the in-memory feature matrix"""
+    scores = ai_crm_service.similar_vehicles(vehicle_id, limit)
+    if not scores:
+        if not await db.vehicles.find_one({"id": vehicle_id, "status": VehicleStatus.ACTIVE}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Vehicle not found")
+        return ORJSONResponse([])
+
+    vehicles = await db.vehicles.find(
+        {"id": {"$in": [similar_id for similar_id, _ in scores]}, "status": VehicleStatus.ACTIVE},
+        model_projection(Vehicle)
+    ).to_list(limit)
+    by_id = {vehicle["id"]: vehicle for vehicle in vehicles}
+    results = []
+    for similar_id, score in scores:
+        if similar_id in by_id:
+            by_id[similar_id]["similarity"] = round(score, 4)
+            results.append(by_id[similar_id])
+    return ORJSONResponse(results)
 
 @customer_router.get("/recommendations/{customer_id}")
-async def get_recommendations(customer_id: str):
+async def get_recommendations(customer_id: str, limit: int = Query(10, ge=1, le=50)):
     """Get AI-powered vehicle recommendations"""
-    recommendations = await ai_crm_service.recommend_vehicles(customer_id)
-    return {"recommendations": recommendations}
+    scores = await ai_crm_service.score_recommendations(customer_id, limit)
+    return {
+        "recommendations": [vehicle_id for vehicle_id, _ in scores],
+        "scores": {vehicle_id: round(score, 4) for vehicle_id, score in scores}
+    }
+
+@customer_router.post("/events", status_code=202)
+async def ingest_customer_events(batch: CustomerEventBatch):
+    """Accept a batch of client view/search/favorite events; persisted asynchronously"""
+    accepted = customer_event_service.record([
+        {**event.dict(), "type": event.type.value} for event in batch.events
+    ])
+    return {"accepted": accepted}
 
 @customer_router.get("/makes")
 async def get_makes():
@@ -696,6 +2329,11 @@ async def get_makes():
     makes = await db.vehicles.distinct("make", {"status": VehicleStatus.ACTIVE})
     return sorted(makes)
 
+@customer_router.get("/autocomplete")
+async def autocomplete_make_model(q: str = Query(..., min_length=1), limit: int = Query(8, ge=1, le=20)):
+    """Typo-tolerant make/model suggestions, answered from memory"""
+    return {"query": q, "suggestions": autocomplete_service.suggest(q, limit)}
+
 @customer_router.get("/models/{make}")
 async def get_models(make: str):
     """Get models for a specific make"""
@@ -707,16 +2345,27 @@ async def get_models(make: str):
 async def create_vehicle(vehicle: VehicleCreate):
     """Create a new vehicle listing"""
     vehicle_dict = vehicle.dict()
+    vehicle_dict["year"], vehicle_dict["make"] = reconcile_with_vin(
+        vehicle_dict.get("vin"), vehicle_dict["year"], canonical_make(vehicle_dict["make"])
+    )
+    vehicle_dict["location"] = dealer_location(vehicle_dict)
     vehicle_obj = Vehicle(**vehicle_dict)
     await db.vehicles.insert_one(vehicle_obj.dict())
+    await inventory_version_service.bump()
     return vehicle_obj
 
 @dealer_router.get("/vehicles", response_model=List[Vehicle])
-async def get_dealer_vehicles(dealer_id: str, page: int = 1, limit: int = 20):
+async def get_dealer_vehicles(dealer_id: str, request: Request, page: int = 1, limit: int = 20):
     """Get vehicles for a specific dealer"""
+    etag = await inventory_version_service.listing_etag("dealer", dict(request.query_params))
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    
     skip = (page - 1) * limit
-    vehicles = await db.vehicles.find({"dealer_id": dealer_id}).skip(skip).limit(limit).to_list(limit)
-    return [Vehicle(**vehicle) for vehicle in vehicles]
+    vehicles = await db.vehicles.find(
+        {"dealer_id": dealer_id}, model_projection(Vehicle)
+    ).skip(skip).limit(limit).to_list(limit)
+    return cached_response(document_response(vehicles, Vehicle), etag)
 
 @dealer_router.put("/vehicles/{vehicle_id}", response_model=Vehicle)
 async def update_vehicle(vehicle_id: str, vehicle_update: Dict[str, Any]):
@@ -726,8 +2375,12 @@ async def update_vehicle(vehicle_id: str, vehicle_update: Dict[str, Any]):
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Vehicle not found")
+    await inventory_version_service.bump()
     
     updated_vehicle = await db.vehicles.find_one({"id": vehicle_id})
+    if {"dealer_zip", "dealer_address", "dealer_city", "dealer_state"} & vehicle_update.keys():
+        updated_vehicle["location"] = dealer_location(updated_vehicle)
+        await db.vehicles.update_one({"id": vehicle_id}, {"$set": {"location": updated_vehicle["location"]}})
     return Vehicle(**updated_vehicle)
 
 @dealer_router.delete("/vehicles/{vehicle_id}")
@@ -740,6 +2393,7 @@ async def delete_vehicle(vehicle_id: str):
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Vehicle not found")
+    await inventory_version_service.bump()
     
     return {"message": "Vehicle deleted successfully"}
 
@@ -811,6 +2465,11 @@ async def create_scraping_job(
     """Create a new scraping job"""
     if filters is None:
         filters = {}
+    if source == "autotrader":
+        try:
+            autotrader_search_params(filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     job = ScrapingJob(
         source=source,
@@ -829,8 +2488,10 @@ async def create_scraping_job(
 async def get_scraping_jobs(page: int = 1, limit: int = 20):
     """Get scraping jobs"""
     skip = (page - 1) * limit
-    jobs = await db.scraping_jobs.find().sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    return [ScrapingJob(**job) for job in jobs]
+    jobs = await db.scraping_jobs.find(
+        {}, model_projection(ScrapingJob)
+    ).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    return document_response(jobs, ScrapingJob)
 
 @admin_router.get("/scraping-jobs/{job_id}", response_model=ScrapingJob)
 async def get_scraping_job(job_id: str):
@@ -857,47 +2518,58 @@ async def admin_login(username: str, password: str):
     else:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+def dealer_vehicle_document(vehicle_data) -> Dict[str, Any]:
+    """Vehicle document from a DealerCarSearch scraper vehicle"""
+    return Vehicle(
+        vin=vehicle_data.vin,
+        make=canonical_make(vehicle_data.make),
+        model=vehicle_data.model,
+        year=vehicle_data.year,
+        price=vehicle_data.price,
+        mileage=vehicle_data.mileage,
+        condition="used",
+        images=vehicle_data.photos,  # Real dealer photos
+        dealer_id=vehicle_data.dealer_name or "dealer_scraped",
+        dealer_name=vehicle_data.dealer_name or "Scraped Dealer",
+        dealer_city=vehicle_data.dealer_city,
+        dealer_state=vehicle_data.dealer_state,
+        dealer_zip=vehicle_data.dealer_zip,
+        location=geocode(vehicle_data.dealer_zip, vehicle_data.dealer_city, vehicle_data.dealer_state),
+        source_url=vehicle_data.vehicle_url or vehicle_data.dealer_url
+    ).dict()
+
 @admin_router.post("/scrape-dealer-photos")
 async def scrape_dealer_photos(dealer_url: str, max_vehicles: int = 5):
     """Run the DealerCarSearch scraper to get real dealer photos"""
+    scraper = None
     try:
         # Import the dealercarsearch scraper
-        from backend.scraper.dealercarsearch_scraper import DealerCarSearchScraper
+        from scraper.dealercarsearch_scraper import DealerCarSearchScraper
         
-        scraper = DealerCarSearchScraper()
-        await scraper.initialize_browser()
+        # Dealers whose JSON inventory feed is known are read from it without a browser
+        scraper = DealerCarSearchScraper(feed_store=db.inventory_feeds)
         
-        # Scrape vehicles with real photos
-        vehicles_data = await scraper.scrape_dealer(dealer_url, max_vehicles=max_vehicles)
+        # Vehicles are saved in batches while the rest are still being scraped
+        async def publish_progress(written: int):
+            await inventory_version_service.bump()
         
-        # Save vehicles to database
-        saved_count = 0
-        for vehicle_data in vehicles_data:
-            # Convert to Vehicle model and save
-            vehicle = Vehicle(
-                make=vehicle_data.make,
-                model=vehicle_data.model,
-                year=vehicle_data.year,
-                price=vehicle_data.price,
-                mileage=vehicle_data.mileage,
-                condition="used",
-                images=vehicle_data.images,  # Real dealer photos
-                dealer_id=vehicle_data.dealer_id or "dealer_scraped",
-                dealer_name=vehicle_data.dealer_name or "Scraped Dealer",
-                dealer_city=vehicle_data.dealer_city,
-                dealer_state=vehicle_data.dealer_state,
-                source_url=dealer_url
-            )
-            await db.vehicles.insert_one(vehicle.dict())
-            saved_count += 1
+        deduplicator = VehicleDeduplicator()
+        await deduplicator.load(db.vehicles)
         
-        await scraper.close()
+        async def to_operations(vehicle_data):
+            return await deduplicator.resolve(dealer_vehicle_document(vehicle_data))
+        
+        writer = BatchWriter(db.vehicles, batch_size=SCRAPE_BATCH_SIZE, transform=to_operations,
+                             on_flush=publish_progress)
+        stats = await scraper.stream_dealer(dealer_url, writer, max_vehicles=max_vehicles)
+        saved_count = writer.written
         
         return {
             "status": "success",
             "dealer_url": dealer_url,
-            "vehicles_found": len(vehicles_data),
+            "vehicles_found": stats["emitted"],
             "vehicles_saved": saved_count,
+            "mode": stats["mode"],
             "message": f"Successfully scraped {saved_count} vehicles with real dealer photos"
         }
         
@@ -911,6 +2583,9 @@ async def scrape_dealer_photos(dealer_url: str, max_vehicles: int = 5):
             "error": str(e),
             "message": "Failed to scrape dealer photos"
         }
+    finally:
+        if scraper:
+            await scraper.close()
 
 @admin_router.get("/stats")
 async def get_admin_stats():
@@ -933,6 +2608,42 @@ async def get_admin_stats():
         "scraping_jobs_running": await db.scraping_jobs.count_documents({"status": ScrapingStatus.IN_PROGRESS})
     }
 
+@admin_router.post("/api-keys/{key_id}/deactivate")
+async def deactivate_api_key(key_id: str):
+    """Revoke a Market Check API key"""
+    if not await api_key_auth_service.deactivate(key_id):
+        raise HTTPException(status_code=404, detail="API key not found")
+    return {"message": "API key deactivated"}
+
+@admin_router.post("/repair-shops/import")
+async def import_repair_shops(shops: List[RepairShopImport]):
+    """Bulk upsert repair shops into the directory"""
+    if len(shops) > MAX_REPAIR_SHOP_IMPORT:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_REPAIR_SHOP_IMPORT} shops per import")
+    return await repair_shop_service.import_repair_shops(shops)
+
+@admin_router.post("/geocode-inventory")
+async def geocode_inventory(batch_size: int = 1000):
+    """Backfill dealer locations for vehicles stored before geocoding at ingest"""
+    fields = {"id": 1, "dealer_zip": 1, "dealer_address": 1, "dealer_city": 1, "dealer_state": 1, "_id": 0}
+    updated = unresolved = 0
+    operations = []
+    async for vehicle in db.vehicles.find({"location": None}, fields):
+        location = dealer_location(vehicle)
+        if not location:
+            unresolved += 1
+            continue
+        operations.append(UpdateOne({"id": vehicle["id"]}, {"$set": {"location": location}}))
+        if len(operations) >= batch_size:
+            await db.vehicles.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        await db.vehicles.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    
+    return {"vehicles_geocoded": updated, "vehicles_unresolved": unresolved}
+
 # CRM Interface Routes
 @crm_router.post("/customers", response_model=Customer)
 async def create_customer(customer: Customer):
@@ -974,12 +2685,97 @@ async def calculate_payment(vehicle_price: float, down_payment: float,
                                                    interest_rate, term_months)
     return result
 
+@crm_router.post("/deals/recalculate", response_model=DealRecalculationJob)
+async def recalculate_deals(background_tasks: BackgroundTasks, rate_sheet: List[RateTier],
+                            dealer_id: Optional[str] = None):
+    """Reprice all pending deals against a new lender rate sheet in the background"""
+    if not rate_sheet:
+        raise HTTPException(status_code=400, detail="Rate sheet is empty")
+    job = DealRecalculationJob(rate_sheet=rate_sheet, dealer_id=dealer_id)
+    await db.deal_recalculation_jobs.insert_one(job.dict())
+    background_tasks.add_task(run_deal_recalculation_job, job.id)
+    return job
+
+@crm_router.get("/deals/recalculate/{job_id}", response_model=DealRecalculationJob)
+async def get_deal_recalculation_job(job_id: str):
+    """Progress of a deal recalculation job"""
+    job = await db.deal_recalculation_jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return DealRecalculationJob(**job)
+
+@crm_router.post("/deals/payment-matrix")
+async def calculate_payment_matrix(request: PaymentMatrixRequest):
+    """Monthly payments for every term x rate x down payment, with taxes, fees and trade-in"""
+    if any(term <= 0 or term > 120 for term in request.terms):
+        raise HTTPException(status_code=400, detail="Terms must be between 1 and 120 months")
+    if any(rate < 0 for rate in request.rates) or any(down < 0 for down in request.down_payments):
+        raise HTTPException(status_code=400, detail="Rates and down payments cannot be negative")
+
+    matrix = desking_service.payment_matrix(request)
+    if request.amortization:
+        selection = request.amortization
+        financed = float(np.maximum(
+            request.vehicle_price + matrix["sales_tax"] + request.fees
+            - matrix["trade_equity"] - selection.down_payment, 0
+        ))
+        matrix["amortization"] = {
+            **selection.dict(),
+            "amount_financed": round(financed, 2),
+            "schedule": desking_service.amortization_schedule(
+                financed, selection.interest_rate, selection.term_months
+            )
+        }
+    return ORJSONResponse(matrix)
+
+@crm_router.post("/deals/service-contract-quote")
+async def quote_service_contract(request: ServiceContractQuoteRequest):
+    """Dealer cost of a service contract, with surcharges, deductible and eligibility"""
+    if not request.vehicle_id and not request.make:
+        raise HTTPException(status_code=400, detail="Provide a vehicle_id or the vehicle make and model")
+    return await desking_service.quote_service_contract(request)
+
+@crm_router.get("/service-contracts/options")
+async def get_service_contract_options(vehicle_id: str):
+    """Every service contract a vehicle qualifies for, at the standard deductible"""
+    if not len(rate_book):
+        raise HTTPException(status_code=503, detail="No rate book loaded")
+    vehicle = await db.vehicles.find_one(
+        {"id": vehicle_id},
+        {"_id": 0, "make": 1, "model": 1, "year": 1, "mileage": 1, "price": 1, "fuel_type": 1}
+    )
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    options = rate_book.options(vehicle.get("make"), vehicle.get("model"), vehicle.get("year"),
+                                vehicle.get("mileage"), vehicle.get("price"), vehicle.get("fuel_type"))
+    return ORJSONResponse({
+        "rate_book": rate_book.version,
+        "vehicle_class": options[0]["vehicle_class"] if options else None,
+        "options": options
+    })
+
 @crm_router.post("/service/schedule")
-async def schedule_service(vehicle_id: str, service_type: str, scheduled_date: datetime):
+async def schedule_service(vehicle_id: str, service_type: str, scheduled_date: datetime,
+                           shop_id: Optional[str] = None):
     """Schedule vehicle service"""
-    service_id = await repair_shop_service.schedule_service(vehicle_id, service_type, scheduled_date)
+    service_id = await repair_shop_service.schedule_service(vehicle_id, service_type, scheduled_date, shop_id)
     return {"service_id": service_id, "status": "scheduled"}
 
+@crm_router.post("/service/{service_id}/cancel")
+async def cancel_service(service_id: str):
+    """Cancel a scheduled appointment and release its bay time"""
+    if not await repair_shop_service.cancel_service(service_id):
+        raise HTTPException(status_code=404, detail="Scheduled service not found")
+    return {"service_id": service_id, "status": "cancelled"}
+
+@crm_router.post("/service/{service_id}/complete")
+async def complete_service(service_id: str, labor_cost: float = Query(..., ge=0),
+                           parts_cost: float = Query(..., ge=0)):
+    """Close out a service job with its final labor and parts cost"""
+    if not await repair_shop_service.complete_service(service_id, labor_cost, parts_cost):
+        raise HTTPException(status_code=404, detail="Service not found")
+    return {"service_id": service_id, "status": "completed"}
+
 @crm_router.get("/service/history/{vehicle_id}")
 async def get_service_history(vehicle_id: str):
     """Get service history for a vehicle"""
@@ -987,16 +2783,54 @@ async def get_service_history(vehicle_id: str):
     return {"service_history": history}
 
 @api_router.get("/repair-shops")
-async def get_repair_shops(city: str = "Nashville", state: str = "TN", service_type: Optional[str] = None):
-    """Get nearby repair shops"""
-    shops = await repair_shop_service.get_nearby_repair_shops(city, state, service_type)
+async def get_repair_shops(city: str = "Nashville", state: str = "TN", service_type: Optional[str] = None,
+                           zip_code: Optional[str] = None, radius: int = Query(50, gt=0, le=500),
+                           latitude: Optional[float] = Query(None, ge=-90, le=90),
+                           longitude: Optional[float] = Query(None, ge=-180, le=180),
+                           open_at: Optional[datetime] = None, min_rating: Optional[float] = Query(None, ge=0, le=5),
+                           limit: int = Query(50, ge=1, le=200)):
+    """Get nearby repair shops, optionally only those open at a local time"""
+    shops = await repair_shop_service.get_nearby_repair_shops(
+        city, state, service_type, zip_code, radius, latitude, longitude, open_at, min_rating, limit
+    )
     return {"repair_shops": shops, "total": len(shops)}
 
+@api_router.get("/repair-shops/{shop_id}/availability")
+async def get_repair_shop_availability(shop_id: str, start_date: datetime, end_date: datetime,
+                                       service_type: Optional[str] = None):
+    """Open appointment times at a shop between two local times"""
+    if end_date <= start_date:
+        raise HTTPException(status_code=400, detail="end_date must be after start_date")
+    if end_date - start_date > timedelta(days=MAX_AVAILABILITY_DAYS):
+        raise HTTPException(status_code=400, detail=f"At most {MAX_AVAILABILITY_DAYS} days per request")
+    duration = service_duration(service_type)
+    slots = await appointment_scheduler.availability(shop_id, start_date, end_date, duration)
+    return ORJSONResponse({
+        "shop_id": shop_id,
+        "service_type": service_type,
+        "duration_minutes": duration,
+        "slots": slots
+    })
+
 @api_router.get("/service/estimate")
-async def get_service_estimate(service_type: str, vehicle_make: str, vehicle_model: str):
+async def get_service_estimate(service_type: str, vehicle_make: str, vehicle_model: str,
+                               year: Optional[int] = None):
     """Get service cost estimate"""
-    estimate = await repair_shop_service.get_service_estimates(service_type, vehicle_make, vehicle_model)
-    return estimate
+    return repair_shop_service.get_service_estimates(service_type, vehicle_make, vehicle_model, year)
+
+@api_router.post("/service/estimates")
+async def get_service_estimates_batch(request: ServiceEstimateBatchRequest):
+    """Cost estimates for several services on one vehicle"""
+    estimates = [
+        repair_shop_service.get_service_estimates(service_type, request.vehicle_make,
+                                                  request.vehicle_model, request.year)
+        for service_type in dict.fromkeys(request.service_types)
+    ]
+    return {
+        "estimates": estimates,
+        "total_min_cost": sum(estimate["min_cost"] for estimate in estimates),
+        "total_max_cost": sum(estimate["max_cost"] for estimate in estimates)
+    }
 
 @api_router.post("/service/schedule")
 async def schedule_public_service(
@@ -1006,13 +2840,19 @@ async def schedule_public_service(
     customer_name: str,
     customer_phone: str,
     preferred_shop: str,
-    scheduled_date: str
+    scheduled_date: datetime,
+    vehicle_year: Optional[int] = None
 ):
-    """Schedule service for public customers"""
+    """Schedule service for public customers at the preferred shop's open slot nearest the requested time"""
+    shop_id = await appointment_scheduler.resolve_shop_id(preferred_shop)
+    scheduled_date = await appointment_scheduler.nearest_start(shop_id, scheduled_date, service_duration(service_type))
     service_id = str(uuid.uuid4())
     service_record = {
         "id": service_id,
         "vehicle_info": f"{vehicle_make} {vehicle_model}",
+        "vehicle_make": vehicle_make,
+        "vehicle_model": vehicle_model,
+        "vehicle_year": vehicle_year,
         "service_type": service_type,
         "customer_name": customer_name,
         "customer_phone": customer_phone,
@@ -1022,60 +2862,77 @@ async def schedule_public_service(
         "created_at": datetime.utcnow()
     }
     
-    await db.public_services.insert_one(service_record)
+    await repair_shop_service.book_appointment(db.public_services, service_record, shop_id)
     
     return {
         "service_id": service_id,
         "status": "scheduled",
-        "message": f"Service appointment scheduled for {scheduled_date}",
+        "scheduled_date": scheduled_date,
+        "scheduled_end": service_record["scheduled_end"],
+        "message": f"Service appointment scheduled for {scheduled_date:%Y-%m-%d %H:%M}",
         "confirmation": f"PULSE{service_id[:8].upper()}"
     }
 
 # Market Check API Routes (Monetization)
-@api_router.post("/market-check/pricing")
-async def market_check_pricing(
-    vin: Optional[str] = None,
-    make: Optional[str] = None,
-    model: Optional[str] = None,
-    year: Optional[int] = None,
-    mileage: Optional[int] = None,
-    api_key: str = Query(..., description="API Key for Market Check service")
-):
-    """Market Check style pricing API"""
-    # Validate API key
-    key_doc = await db.api_keys.find_one({"key": api_key, "is_active": True})
-    if not key_doc:
-        raise HTTPException(status_code=401, detail="Invalid API key")
-    
-    api_key_obj = MarketCheckAPIKey(**key_doc)
-    
-    # Check rate limits
-    if api_key_obj.requests_used >= api_key_obj.requests_limit:
-        raise HTTPException(status_code=429, detail="API rate limit exceeded")
-    
-    # Update usage count
-    await db.api_keys.update_one(
-        {"key": api_key},
-        {"$inc": {"requests_used": 1}}
-    )
-    
-    # Find similar vehicles for pricing
+MAX_BATCH_PRICING_ITEMS = 1000
+PRICING_MILEAGE_BUCKET = 5000  # batch requests within the same 5k-mile band share a computation
+PRICING_BUCKET_CONCURRENCY = 16
+
+class PricingRequest(BaseModel):
+    vin: Optional[str] = None
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = None
+    mileage: Optional[int] = None
+
+def build_pricing_query(vin: Optional[str] = None, make: Optional[str] = None, model: Optional[str] = None,
+                        year: Optional[int] = None, mileage: Optional[int] = None) -> Dict[str, Any]:
+    """Build the comparable-vehicle query used for market pricing"""
     query = {}
     if vin:
         query["vin"] = vin
     else:
         if make:
-            query["make"] = {"$regex": make, "$options": "i"}
+            query["make"] = {"$regex": re.escape(make), "$options": "i"}
         if model:
-            query["model"] = {"$regex": model, "$options": "i"}
+            query["model"] = {"$regex": re.escape(model), "$options": "i"}
         if year:
             query["year"] = {"$gte": year - 2, "$lte": year + 2}
         if mileage:
             query["mileage"] = {"$gte": mileage - 10000, "$lte": mileage + 10000}
-    
-    similar_vehicles = await db.vehicles.find(query).limit(100).to_list(100)
-    
-    if not similar_vehicles:
+    return query
+
+def pricing_bucket(item: PricingRequest) -> tuple:
+    """Key under which batch pricing requests share one computation"""
+    mileage = None
+    if item.mileage:
+        mileage = round(item.mileage / PRICING_MILEAGE_BUCKET) * PRICING_MILEAGE_BUCKET
+    if item.vin:
+        return ("vin", item.vin.strip().upper(), mileage)
+    return (
+        "spec",
+        (item.make or "").strip().lower() or None,
+        (item.model or "").strip().lower() or None,
+        item.year,
+        mileage
+    )
+
+async def compute_market_pricing(query: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize prices of up to 100 comparable vehicles in a single aggregation"""
+    pipeline = [
+        {"$match": query},
+        {"$limit": 100},
+        {"$group": {
+            "_id": None,
+            "average_price": {"$avg": "$price"},
+            "min_price": {"$min": "$price"},
+            "max_price": {"$max": "$price"},
+            "sample_size": {"$sum": 1}
+        }}
+    ]
+    summary = await db.vehicles.aggregate(pipeline).to_list(1)
+
+    if not summary:
         return {
             "pricing": {
                 "average_price": None,
@@ -1085,23 +2942,146 @@ async def market_check_pricing(
             },
             "sample_size": 0
         }
-    
-    prices = [v["price"] for v in similar_vehicles]
-    avg_price = sum(prices) / len(prices)
-    min_price = min(prices)
-    max_price = max(prices)
-    
+
+    summary = summary[0]
+    sample_size = summary["sample_size"]
     return {
         "pricing": {
-            "average_price": round(avg_price, 2),
-            "price_range": {"min": min_price, "max": max_price},
-            "market_position": "competitive" if len(similar_vehicles) > 10 else "limited_data",
-            "confidence": min(len(similar_vehicles) / 50, 1.0)
+            "average_price": round(summary["average_price"], 2),
+            "price_range": {"min": summary["min_price"], "max": summary["max_price"]},
+            "market_position": "competitive" if sample_size > 10 else "limited_data",
+            "confidence": min(sample_size / 50, 1.0)
         },
-        "sample_size": len(similar_vehicles),
+        "sample_size": sample_size,
         "last_updated": datetime.utcnow()
     }
 
+async def price_vehicle(item: PricingRequest) -> Dict[str, Any]:
+    """Price by exact VIN, falling back to make/year bucket pricing for unseen VINs"""
+    result = await compute_market_pricing(build_pricing_query(
+        item.vin, item.make, item.model, item.year, item.mileage
+    ))
+    if not item.vin or result["sample_size"]:
+        return result
+
+    decoded = decode_vin(item.vin)
+    if not decoded or not decoded.make:
+        return result
+
+    query = build_pricing_query(
+        model=item.model, year=decoded.model_year or item.year, mileage=item.mileage
+    )
+    query["make"] = {
+        "$regex": "^(" + "|".join(re.escape(make) for make in make_spellings(decoded.make)) + ")",
+        "$options": "i"
+    }
+    result = await compute_market_pricing(query)
+    result["decoded_vin"] = decoded._asdict()
+    return result
+
+async def read_pricing_batch(request: Request) -> List[Any]:
+    """Read batch pricing items from a JSON body or an NDJSON stream"""
+    items = []
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    items.append(json.loads(line))
+            if len(items) > MAX_BATCH_PRICING_ITEMS:
+                break
+        if buffer.strip():
+            items.append(json.loads(buffer))
+    else:
+        body = await request.json()
+        items = body.get("vehicles", []) if isinstance(body, dict) else body
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a list of vehicles")
+
+    if len(items) > MAX_BATCH_PRICING_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch limited to {MAX_BATCH_PRICING_ITEMS} vehicles")
+    return items
+
+@api_router.post("/market-check/pricing")
+async def market_check_pricing(
+    vin: Optional[str] = None,
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    year: Optional[int] = None,
+    mileage: Optional[int] = None,
+    api_key: str = Query(..., description="API Key for Market Check service")
+):
+    """Market Check style pricing API"""
+    # Validate API key and charge usage (in-memory, flushed to Mongo in the background)
+    await api_key_auth_service.authorize(api_key)
+    
+    # Find similar vehicles for pricing
+    return await price_vehicle(PricingRequest(vin=vin, make=make, model=model, year=year, mileage=mileage))
+
+@api_router.post("/market-check/pricing/batch")
+async def market_check_pricing_batch(
+    request: Request,
+    api_key: str = Query(..., description="API Key for Market Check service")
+):
+    """Price many vehicles in one request.
+
+    Accepts a JSON array (or {"vehicles": [...]}) or an NDJSON stream of VINs or
+    make/model/year/mileage objects. Items falling into the same pricing bucket are
+    computed once; results stream back as NDJSON lines tagged with the input index.
+    """
+    try:
+        raw_items = await read_pricing_batch(request)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {str(e)}")
+
+    # Each vehicle counts against the monthly quota; the burst bucket is charged once
+    await api_key_auth_service.authorize(api_key, cost=max(1, len(raw_items)))
+
+    buckets: Dict[tuple, List[int]] = {}
+    bucket_items: Dict[tuple, PricingRequest] = {}
+    errors = []
+    for index, raw in enumerate(raw_items):
+        try:
+            item = PricingRequest(**raw) if isinstance(raw, dict) else PricingRequest(vin=str(raw))
+        except Exception as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        key = pricing_bucket(item)
+        buckets.setdefault(key, []).append(index)
+        bucket_items.setdefault(key, item)
+
+    semaphore = asyncio.Semaphore(PRICING_BUCKET_CONCURRENCY)
+
+    async def price_bucket(key: tuple):
+        item = bucket_items[key]
+        if key[-1] is not None:
+            item = item.copy(update={"mileage": key[-1]})
+        try:
+            async with semaphore:
+                return key, await price_vehicle(item), None
+        except Exception as e:
+            # One bad bucket is reported against its items; the rest of the stream carries on
+            logging.error(f"Batch pricing failed for bucket {key}: {str(e)}")
+            return key, None, e.detail if isinstance(e, HTTPException) else str(e)
+
+    async def stream_results():
+        for error in errors:
+            yield json.dumps(error) + "\n"
+        for next_result in asyncio.as_completed([price_bucket(key) for key in buckets]):
+            key, result, error = await next_result
+            for index in buckets[key]:
+                line = {"index": index, "error": error} if error is not None else {"index": index, **result}
+                yield json.dumps(line, default=str) + "\n"
+
+    return StreamingResponse(
+        stream_results(),
+        media_type="application/x-ndjson",
+        headers={"X-Pricing-Items": str(len(raw_items)), "X-Pricing-Buckets": str(len(buckets))}
+    )
+
 # Include all routers
 app.include_router(api_router)
 app.include_router(customer_router)
@@ -1109,6 +3089,9 @@ app.include_router(dealer_router)
 app.include_router(admin_router)
 app.include_router(crm_router)
 
+# Compress JSON responses above 1 KB (brotli when available, else gzip)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -1125,8 +3108,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_api_key_auth():
+    await api_key_auth_service.start()
+
+@app.on_event("startup")
+async def create_vehicle_indexes():
+    await db.vehicles.create_index("id")
+    await db.vehicles.create_index("updated_at")
+    await db.vehicles.create_index("source_url")
+    await db.vehicles.create_index("sources.source_url")
+    await db.inventory_feeds.create_index("dealer_url", unique=True)
+    await db.vehicles.create_index([("location", "2dsphere")])
+    await db.vehicles.create_index(
+        [(field, "text") for field in VEHICLE_TEXT_INDEX_WEIGHTS],
+        weights=VEHICLE_TEXT_INDEX_WEIGHTS,
+        name="vehicle_text",
+        default_language="english"
+    )
+
+@app.on_event("startup")
+async def start_autocomplete():
+    await autocomplete_service.start()
+
+@app.on_event("startup")
+async def start_recommendations():
+    await ai_crm_service.start()
+
+@app.on_event("startup")
+async def start_customer_events():
+    await db.customer_profiles.create_index("customer_id", unique=True)
+    await customer_event_service.start()
+
+@app.on_event("startup")
+async def load_rate_book():
+    await asyncio.to_thread(rate_book.load)
+
+@app.on_event("startup")
+async def seed_repair_shops():
+    await repair_shop_service.ensure_repair_shops()
+
+@app.on_event("startup")
+async def start_appointment_scheduler():
+    await appointment_scheduler.ensure_indexes()
+
+@app.on_event("startup")
+async def start_service_estimates():
+    await db.services.create_index([("status", 1), ("completed_at", -1)])
+    await db.public_services.create_index([("status", 1), ("completed_at", -1)])
+    await repair_shop_service.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await api_key_auth_service.stop()
+    await autocomplete_service.stop()
+    await ai_crm_service.stop()
+    await customer_event_service.stop()
+    await repair_shop_service.stop()
     client.close()
 
 if __name__ == "__main__":
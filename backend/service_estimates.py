@@ -0,0 +1,155 @@
+import csv
+import logging
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from scraper.vin_decoder import canonical_make
+
+logger = logging.getLogger(__name__)
+
+# Published labor/parts ranges (service_type,make,model,year_min,year_max,labor_min,
+# labor_max,parts_min,parts_max); blank make/model/years match any vehicle
+SERVICE_ESTIMATES_PATH = Path(__file__).resolve().parent / 'data' / 'service_estimates.csv'
+
+YEAR_BAND = 5  # history is grouped into 5 model-year bands
+MIN_HISTORY_SAMPLES = 5  # fewer completed jobs than this fall back to the published table
+DEFAULT_ESTIMATE = {"labor_min": 50, "labor_max": 250, "parts_min": 50, "parts_max": 250}
+MAX_CACHED_ESTIMATES = 4096  # keys come from request input, so the memo keeps only the most recent
+
+def service_key(service_type: Optional[str]) -> str:
+    """Case/spacing-insensitive service type key ("Oil Change", "oil-change")"""
+    return re.sub(r'[^a-z0-9]', '', (service_type or '').lower())
+
+def model_key(model: Optional[str]) -> str:
+    return re.sub(r'[^a-z0-9]', '', (model or '').lower())
+
+def year_band(year: Optional[int]) -> Optional[int]:
+    return int(year) // YEAR_BAND * YEAR_BAND if year else None
+
+def _int(value: str) -> Optional[int]:
+    return int(value) if value and value.strip() else None
+
+class ServiceEstimateIndex:
+    """Service cost ranges answered from memory.
+
+    Completed jobs are grouped by (service, make, model, year band) and
+    summarized as 10th-90th percentile labor/parts ranges; the published table
+    fills in where history is thin. Lookups walk from the most specific key to
+    the service-wide default and are memoized (least recently used first out)
+    until the next rebuild.
+    """
+    def __init__(self):
+        self.service_names: Dict[str, str] = {}
+        self.table: Dict[Tuple[str, str, str], List[Tuple[Optional[int], Optional[int], Dict[str, int]]]] = {}
+        self.history: Dict[Tuple[str, str, str, Optional[int]], Dict[str, Any]] = {}
+        self._cache: "OrderedDict[Tuple[str, str, str, Optional[int]], Dict[str, Any]]" = OrderedDict()
+
+    def load_table(self, path: Path = SERVICE_ESTIMATES_PATH):
+        table = {}
+        try:
+            with open(path, newline='') as f:
+                for row in csv.DictReader(f):
+                    service = service_key(row['service_type'])
+                    self.service_names.setdefault(service, row['service_type'])
+                    key = (service, canonical_make(row['make']) or '', model_key(row['model']))
+                    ranges = {field: int(row[field]) for field in DEFAULT_ESTIMATE}
+                    table.setdefault(key, []).append((_int(row['year_min']), _int(row['year_max']), ranges))
+        except OSError as e:
+            logger.error(f"Could not load service estimates {path}: {str(e)}")
+        # Narrower year ranges win within a key
+        for rows in table.values():
+            rows.sort(key=lambda row: (row[1] or 9999) - (row[0] or 0))
+        self.table = table
+        self._cache.clear()
+
+    def build_history(self, jobs: Iterable[Dict[str, Any]]):
+        """Summarize completed jobs (service_type, make, model, year, labor_cost, parts_cost)"""
+        samples: Dict[Tuple[str, str, str, Optional[int]], List[Tuple[float, float]]] = {}
+        for job in jobs:
+            service = service_key(job.get("service_type"))
+            make = canonical_make(job.get("make")) or ''
+            if not service or not make:
+                continue
+            labor, parts = float(job.get("labor_cost") or 0), float(job.get("parts_cost") or 0)
+            if labor + parts <= 0:
+                continue
+            self.service_names.setdefault(service, job["service_type"])
+            model, band = model_key(job.get("model")), year_band(job.get("year"))
+            # Every job also counts toward the broader keys it falls under
+            for key in {(service, make, model, band), (service, make, model, None), (service, make, '', None)}:
+                samples.setdefault(key, []).append((labor, parts))
+
+        history = {}
+        for key, values in samples.items():
+            if len(values) < MIN_HISTORY_SAMPLES:
+                continue
+            costs = np.array(values)
+            low, high = np.percentile(costs, [10, 90], axis=0)
+            history[key] = {
+                "labor_min": round(float(low[0])), "labor_max": round(float(high[0])),
+                "parts_min": round(float(low[1])), "parts_max": round(float(high[1])),
+                "average": round(float(costs.sum(axis=1).mean())), "sample_size": len(values),
+            }
+        self.history = history
+        self._cache.clear()
+
+    def _table_ranges(self, key: Tuple[str, str, str], year: Optional[int]) -> Optional[Dict[str, int]]:
+        for year_min, year_max, ranges in self.table.get(key, []):
+            if year is None and (year_min or year_max):
+                continue
+            if year is not None and ((year_min and year < year_min) or (year_max and year > year_max)):
+                continue
+            return ranges
+        return None
+
+    def estimate(self, service_type: str, make: Optional[str], model: Optional[str],
+                 year: Optional[int] = None) -> Dict[str, Any]:
+        """Labor, parts and total cost range for one service on one vehicle"""
+        service, make, model = service_key(service_type), canonical_make(make) or '', model_key(model)
+        cache_key = (service, make, model, year)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self._cache.move_to_end(cache_key)
+            return cached
+
+        band = year_band(year)
+        levels = [("model_year", make, model, band), ("model", make, model, None),
+                  ("make", make, '', None), ("default", '', '', None)]
+        ranges, source, match, sample_size, average = None, "default", "default", 0, None
+        for level, level_make, level_model, level_band in levels:
+            if (level == "model_year" and band is None) or (level.startswith("model") and not model):
+                continue
+            summary = self.history.get((service, level_make, level_model, level_band))
+            if summary:
+                ranges, source, match = summary, "history", level
+                sample_size, average = summary["sample_size"], summary["average"]
+                break
+            # Published rows carry their own year ranges, so they are matched per model/make
+            table_ranges = None if level == "model_year" else \
+                self._table_ranges((service, level_make, level_model), year)
+            if table_ranges:
+                ranges, source, match = table_ranges, "table", level
+                break
+        ranges = ranges or DEFAULT_ESTIMATE
+
+        min_cost = ranges["labor_min"] + ranges["parts_min"]
+        max_cost = ranges["labor_max"] + ranges["parts_max"]
+        result = {
+            "service_type": self.service_names.get(service, service_type),
+            "labor": {"min": ranges["labor_min"], "max": ranges["labor_max"]},
+            "parts": {"min": ranges["parts_min"], "max": ranges["parts_max"]},
+            "min_cost": min_cost,
+            "max_cost": max_cost,
+            "average_cost": average if average is not None else round((min_cost + max_cost) / 2),
+            "source": source,
+            "match": match,
+            "sample_size": sample_size,
+        }
+        self._cache[cache_key] = result
+        if len(self._cache) > MAX_CACHED_ESTIMATES:
+            self._cache.popitem(last=False)
+        return result
@@ -14,11 +14,11 @@ from datetime import datetime
 import uuid
 import json
 import aiohttp
-import base64
-from bs4 import BeautifulSoup
-import re
-from urllib.parse import urljoin, urlparse
-import time
+
+from scraper.dedup import VehicleDeduplicator
+from scraper.geocoder import extract_zip, geocode
+from scraper.parsers import parse_dealer_listings
+from scraper.pipeline import BatchWriter, IngestPipeline, Stage, download_photos
 
 # Dealer websites by state
 DEALER_WEBSITES = {
@@ -85,9 +85,17 @@ DEALER_WEBSITES = {
 }
 
 class MultiDealerScraper:
-    def __init__(self):
+    """Scrapes every dealer site through a staged pipeline.
+
+    Dealer pages are fetched concurrently, parsed in a process pool and their
+    photos downloaded by separate workers, with bounded queues in between, so
+    vehicles are written while later dealers are still loading.
+    """
+    def __init__(self, fetch_concurrency=8, parse_workers=2, photo_concurrency=8):
         self.session = None
-        self.scraped_vehicles = []
+        self.fetch_concurrency = fetch_concurrency
+        self.parse_workers = parse_workers
+        self.photo_concurrency = photo_concurrency
         
     async def __aenter__(self):
         timeout = aiohttp.ClientTimeout(total=30)
@@ -98,252 +106,123 @@ class MultiDealerScraper:
         if self.session:
             await self.session.close()
 
-    async def extract_vehicle_from_element(self, element, dealer_info, base_url):
-        """Extract vehicle information from a DOM element"""
-        try:
-            vehicle_data = {
-                'id': str(uuid.uuid4()),
-                'dealer_name': dealer_info['name'],
-                'dealer_city': dealer_info.get('city', 'Unknown'),
-                'dealer_state': dealer_info.get('state', 'Unknown'),
-                'dealer_phone': dealer_info.get('phone', ''),
-                'scraped_at': datetime.utcnow(),
-                'updated_at': datetime.utcnow(),
-                'created_at': datetime.utcnow(),
-                'status': 'active',
-                'condition': 'used',
-                'images': []
-            }
-
-            # Extract text content
-            element_text = element.get_text().strip()
-            
-            # Extract year (look for 4-digit number starting with 19 or 20)
-            year_match = re.search(r'\b(19|20)\d{2}\b', element_text)
-            if year_match:
-                try:
-                    vehicle_data['year'] = int(year_match.group())
-                except:
-                    vehicle_data['year'] = 2020
-            else:
-                vehicle_data['year'] = 2020
-
-            # Extract price (look for $X,XXX or $XX,XXX)
-            price_match = re.search(r'\$[\d,]+', element_text)
-            if price_match:
-                price_str = price_match.group().replace('$', '').replace(',', '')
-                try:
-                    vehicle_data['price'] = float(price_str)
-                except:
-                    vehicle_data['price'] = 15000.0
-            else:
-                vehicle_data['price'] = 15000.0
-
-            # Extract mileage (look for XXX,XXX miles or mi)
-            mileage_match = re.search(r'(\d+,?\d*)\s*(miles|mi|mileage)', element_text, re.IGNORECASE)
-            if mileage_match:
-                mileage_str = mileage_match.group(1).replace(',', '')
-                try:
-                    vehicle_data['mileage'] = int(mileage_str)
-                except:
-                    vehicle_data['mileage'] = 50000
-            else:
-                vehicle_data['mileage'] = 50000
-
-            # Extract make and model (common patterns)
-            # Look for common car makes
-            makes = ['Ford', 'Toyota', 'Honda', 'Chevrolet', 'Chevy', 'BMW', 'Mercedes', 'Audi', 
-                    'Nissan', 'Hyundai', 'Kia', 'Volkswagen', 'VW', 'Mazda', 'Subaru', 'Lexus',
-                    'Acura', 'Infiniti', 'Cadillac', 'Buick', 'GMC', 'Jeep', 'Chrysler', 'Dodge',
-                    'Ram', 'Tesla', 'Volvo', 'Jaguar', 'Land Rover', 'Porsche', 'Mini', 'Mitsubishi']
-            
-            make_found = None
-            for make in makes:
-                if re.search(r'\b' + re.escape(make) + r'\b', element_text, re.IGNORECASE):
-                    make_found = make
-                    break
-            
-            vehicle_data['make'] = make_found or 'Unknown'
-            
-            # Extract model (everything after make, before year or specs)
-            if make_found:
-                model_pattern = f'{re.escape(make_found)}\\s+([A-Za-z0-9\\s-]+)'
-                model_match = re.search(model_pattern, element_text, re.IGNORECASE)
-                if model_match:
-                    model_text = model_match.group(1).strip()
-                    # Clean up model text (remove year, price, etc.)
-                    model_clean = re.sub(r'\b(19|20)\d{2}\b.*', '', model_text).strip()
-                    model_clean = re.sub(r'\$.*', '', model_clean).strip()
-                    vehicle_data['model'] = model_clean[:30] if model_clean else 'Unknown'
-                else:
-                    vehicle_data['model'] = 'Unknown'
-            else:
-                vehicle_data['model'] = 'Unknown'
-
-            # Extract images from the element
-            images = []
-            img_tags = element.find_all('img')
-            for img in img_tags:
-                img_src = img.get('src') or img.get('data-src') or img.get('data-lazy')
-                if img_src:
-                    # Convert relative URLs to absolute
-                    if not img_src.startswith('http'):
-                        img_src = urljoin(base_url, img_src)
-                    
-                    # Skip small images, logos, icons
-                    if any(skip in img_src.lower() for skip in ['logo', 'icon', 'button', 'arrow', 'star']):
-                        continue
-                        
-                    try:
-                        # Download and convert image to base64
-                        async with self.session.get(img_src) as img_response:
-                            if img_response.status == 200:
-                                img_data = await img_response.read()
-                                # Only process reasonable sized images
-                                if len(img_data) > 5000 and len(img_data) < 2000000:  # 5KB to 2MB
-                                    img_base64 = base64.b64encode(img_data).decode('utf-8')
-                                    img_format = 'jpeg'
-                                    if img_src.lower().endswith('.png'):
-                                        img_format = 'png'
-                                    images.append(f"data:image/{img_format};base64,{img_base64}")
-                                    
-                                    if len(images) >= 3:  # Limit to 3 images per vehicle
-                                        break
-                    except Exception as e:
-                        print(f"   Error downloading image {img_src}: {str(e)}")
-                        continue
-
-            vehicle_data['images'] = images
-
-            # Only return vehicles with reasonable data
-            if (vehicle_data['price'] > 1000 and 
-                vehicle_data['make'] != 'Unknown' and 
-                vehicle_data['model'] != 'Unknown' and
-                len(vehicle_data['model']) > 2):
-                return vehicle_data
-            
-            return None
-
-        except Exception as e:
-            print(f"   Error extracting vehicle data: {str(e)}")
-            return None
-
-    async def scrape_dealer_website(self, dealer_info, state):
-        """Scrape a single dealer website"""
-        print(f"\n🚗 Scraping {dealer_info['name']} ({state})")
+    async def fetch_dealer_page(self, dealer_info):
+        """Load a dealer website; returns (dealer, html) for the parse stage"""
+        print(f"\n🚗 Scraping {dealer_info['name']} ({dealer_info['state']})")
         print(f"   URL: {dealer_info['url']}")
         
-        vehicles = []
-        dealer_info_extended = {**dealer_info, 'state': state, 'city': 'Unknown'}
-        
-        try:
-            async with self.session.get(dealer_info['url']) as response:
-                if response.status != 200:
-                    print(f"   ❌ Failed to load website (status: {response.status})")
-                    return vehicles
-                
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # Look for common vehicle listing containers
-                vehicle_selectors = [
-                    '.vehicle', '.car', '.inventory-item', '.vehicle-card', '.listing',
-                    '.inventory-vehicle', '.used-vehicle', '.auto-item', '.vehicle-listing',
-                    '[data-vehicle]', '[data-car]', '.search-result', '.vehicle-info',
-                    '.inventory-card', '.car-item', '.vehicle-container', '.auto-listing'
-                ]
-                
-                vehicle_elements = []
-                for selector in vehicle_selectors:
-                    elements = soup.select(selector)
-                    if elements and len(elements) > 1:  # Found multiple vehicles
-                        vehicle_elements = elements
-                        print(f"   ✓ Found {len(elements)} vehicles using selector: {selector}")
-                        break
-                
-                # If no specific selectors work, try finding divs with vehicle-related content
-                if not vehicle_elements:
-                    all_divs = soup.find_all('div')
-                    potential_vehicles = []
-                    
-                    for div in all_divs:
-                        div_text = div.get_text().strip()
-                        # Look for patterns that suggest this is a vehicle listing
-                        if (re.search(r'\$[\d,]+', div_text) and 
-                            re.search(r'\b(Ford|Toyota|Honda|Chevrolet|BMW|Mercedes)\b', div_text, re.IGNORECASE) and
-                            re.search(r'\b(19|20)\d{2}\b', div_text)):
-                            potential_vehicles.append(div)
-                    
-                    if potential_vehicles:
-                        vehicle_elements = potential_vehicles[:20]  # Limit to 20
-                        print(f"   ✓ Found {len(vehicle_elements)} potential vehicles through text analysis")
-                
-                if not vehicle_elements:
-                    print(f"   ❌ No vehicle listings found")
-                    return vehicles
-                
-                # Process each vehicle element
-                for i, element in enumerate(vehicle_elements[:15]):  # Limit to 15 vehicles per dealer
-                    try:
-                        vehicle_data = await self.extract_vehicle_from_element(
-                            element, dealer_info_extended, dealer_info['url']
-                        )
-                        
-                        if vehicle_data:
-                            vehicles.append(vehicle_data)
-                            print(f"   ✓ Vehicle {i+1}: {vehicle_data['year']} {vehicle_data['make']} {vehicle_data['model']} - ${vehicle_data['price']:,.0f} ({len(vehicle_data['images'])} images)")
-                        
-                        # Add delay between vehicles to be respectful
-                        await asyncio.sleep(0.5)
-                        
-                    except Exception as e:
-                        print(f"   ❌ Error processing vehicle {i+1}: {str(e)}")
-                        continue
-                
-                print(f"   🎉 Successfully scraped {len(vehicles)} vehicles from {dealer_info['name']}")
-                
-        except Exception as e:
-            print(f"   ❌ Error scraping {dealer_info['name']}: {str(e)}")
-        
-        return vehicles
+        async with self.session.get(dealer_info['url']) as response:
+            if response.status != 200:
+                print(f"   ❌ Failed to load website (status: {response.status})")
+                return None
+            return dealer_info, await response.text()
 
-    async def scrape_all_dealers(self):
-        """Scrape all dealer websites"""
+    async def attach_images(self, vehicle_data):
+        """Download up to 3 listing photos (5KB to 2MB) and finish the vehicle record"""
+        vehicle_data['images'] = await download_photos(
+            self.session, vehicle_data.pop('image_urls', []), limit=3, min_bytes=5000, max_bytes=2000000
+        )
+        now = datetime.utcnow()
+        vehicle_data.update({
+            'id': str(uuid.uuid4()),
+            'scraped_at': now,
+            'updated_at': now,
+            'created_at': now,
+            'status': 'active',
+            'condition': 'used',
+        })
+        print(f"   ✓ {vehicle_data['dealer_name']}: {vehicle_data['year']} {vehicle_data['make']} {vehicle_data['model']} - ${vehicle_data['price']:,.0f} ({len(vehicle_data['images'])} images)")
+        return vehicle_data
+
+    async def scrape_all_dealers(self, sink):
+        """Scrape all dealer websites into a pipeline sink"""
         print("🚀 Starting multi-dealer scraping across 5 states...")
         print("=" * 60)
         
-        all_vehicles = []
-        total_dealers = sum(len(dealers) for dealers in DEALER_WEBSITES.values())
-        current_dealer = 0
-        
-        for state, dealers in DEALER_WEBSITES.items():
-            print(f"\n🏛️  SCRAPING {state.upper()} ({len(dealers)} dealers)")
-            print("-" * 40)
-            
-            for dealer in dealers:
-                current_dealer += 1
-                print(f"\n[{current_dealer}/{total_dealers}] Processing {dealer['name']}")
-                
-                try:
-                    vehicles = await self.scrape_dealer_website(dealer, state)
-                    all_vehicles.extend(vehicles)
-                    
-                    # Add delay between dealers to be respectful
-                    await asyncio.sleep(2)
-                    
-                except Exception as e:
-                    print(f"   ❌ Failed to scrape {dealer['name']}: {str(e)}")
-                    continue
+        dealers = [
+            {**dealer, 'state': state, 'city': 'Unknown'}
+            for state, state_dealers in DEALER_WEBSITES.items()
+            for dealer in state_dealers
+        ]
+        pipeline = IngestPipeline([
+            Stage("fetch", self.fetch_dealer_page, concurrency=self.fetch_concurrency),
+            Stage("parse", parse_dealer_listings, concurrency=self.parse_workers, kind="process", fan_out=True),
+            Stage("photos", self.attach_images, concurrency=self.photo_concurrency),
+        ], sink)
+        stats = await pipeline.run(dealers)
         
         print(f"\n🎉 SCRAPING COMPLETE!")
-        print(f"📊 Total vehicles found: {len(all_vehicles)}")
-        print(f"🖼️  Vehicles with images: {len([v for v in all_vehicles if v['images']])}")
+        print(f"🏢 Dealers loaded: {stats['stages']['fetch']['out']}/{len(dealers)}")
+        print(f"📊 Total vehicles found: {stats['emitted']}")
+        print(f"⏱️  Took {stats['seconds']:.1f}s")
         
-        return all_vehicles
+        return stats
+
+async def finish_scrape_run(db, run_started):
+    """Retire vehicles the run did not see and rebuild dealer records from inventory"""
+    # Vehicles are written as they stream in, so the previous inventory is only
+    # removed once this run has replaced it
+    result = await db.vehicles.delete_many({"scraped_at": {"$lt": run_started}})
+    print(f"🗑️  Cleared {result.deleted_count} vehicles not seen in this run")
+    
+    dealers = await db.vehicles.aggregate([
+        {"$group": {
+            "_id": "$dealer_name",
+            "city": {"$first": "$dealer_city"},
+            "state": {"$first": "$dealer_state"},
+            "phone": {"$first": "$dealer_phone"},
+            "address": {"$first": "$dealer_address"},
+            "zip_code": {"$first": "$dealer_zip"},
+            "vehicle_count": {"$sum": 1},
+        }}
+    ]).to_list(None)
+    for dealer in dealers:
+        dealer['zip_code'] = dealer.get('zip_code') or extract_zip(dealer.get('address'))
+    await db.dealers.delete_many({})
+    if dealers:
+        await db.dealers.insert_many([{
+            'id': str(uuid.uuid4()),
+            'name': dealer['_id'],
+            'city': dealer.get('city') or 'Unknown',
+            'state': dealer.get('state') or 'Unknown',
+            'phone': dealer.get('phone') or '',
+            'address': dealer.get('address'),
+            'zip_code': dealer['zip_code'],
+            'location': geocode(dealer['zip_code'], dealer.get('city'), dealer.get('state')),
+            'is_active': True,
+            'created_at': datetime.utcnow(),
+            'vehicle_count': dealer['vehicle_count']
+        } for dealer in dealers])
+        print(f"🏢 Updated {len(dealers)} dealer records")
+    
+    # Print statistics
+    totals = await db.vehicles.aggregate([
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "total_value": {"$sum": "$price"},
+            "with_images": {"$sum": {"$cond": [{"$gt": [{"$size": {"$ifNull": ["$images", []]}}, 0]}, 1, 0]}},
+        }}
+    ]).to_list(1)
+    if totals and totals[0]['count']:
+        count, total_value, with_images = totals[0]['count'], totals[0]['total_value'], totals[0]['with_images']
+        print(f"\n📈 INVENTORY STATISTICS:")
+        print(f"   💰 Total inventory value: ${total_value:,.2f}")
+        print(f"   💵 Average vehicle price: ${total_value / count:,.2f}")
+        print(f"   🖼️  Vehicles with images: {with_images}/{count} ({with_images/count*100:.1f}%)")
+    
+    by_state = await db.vehicles.aggregate([
+        {"$group": {"_id": "$dealer_state", "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}}
+    ]).to_list(None)
+    print(f"\n🗺️  VEHICLES BY STATE:")
+    for state in by_state:
+        print(f"   {state['_id'] or 'Unknown'}: {state['count']} vehicles")
 
-async def save_vehicles_to_database(vehicles):
-    """Save scraped vehicles to MongoDB"""
-    print(f"\n💾 Saving {len(vehicles)} vehicles to database...")
+async def main():
+    print("🚀 Pulse Auto Market - Multi-Dealer Scraper")
+    print("Scraping 50+ dealer websites across 5 states")
+    print("=" * 60)
     
     # Connect to MongoDB
     from dotenv import load_dotenv
@@ -356,89 +235,26 @@ async def save_vehicles_to_database(vehicles):
     db = client[db_name]
     
     try:
-        # Clear existing vehicles
-        result = await db.vehicles.delete_many({})
-        print(f"🗑️  Cleared {result.deleted_count} existing vehicles")
-        
-        # Insert new vehicles
-        if vehicles:
-            await db.vehicles.insert_many(vehicles)
-            print(f"✅ Successfully saved {len(vehicles)} vehicles to database")
-        
-        # Update dealer records
-        dealers_by_name = {}
-        for vehicle in vehicles:
-            dealer_name = vehicle['dealer_name']
-            if dealer_name not in dealers_by_name:
-                dealers_by_name[dealer_name] = {
-                    'id': str(uuid.uuid4()),
-                    'name': dealer_name,
-                    'city': vehicle.get('dealer_city', 'Unknown'),
-                    'state': vehicle.get('dealer_state', 'Unknown'),
-                    'phone': vehicle.get('dealer_phone', ''),
-                    'is_active': True,
-                    'created_at': datetime.utcnow(),
-                    'vehicle_count': 0
-                }
-            dealers_by_name[dealer_name]['vehicle_count'] += 1
-        
-        # Clear and insert dealers
-        await db.dealers.delete_many({})
-        if dealers_by_name:
-            await db.dealers.insert_many(list(dealers_by_name.values()))
-            print(f"🏢 Updated {len(dealers_by_name)} dealer records")
-        
-        # Print statistics
-        total_with_images = len([v for v in vehicles if v['images']])
-        avg_price = sum(v['price'] for v in vehicles) / len(vehicles) if vehicles else 0
-        total_value = sum(v['price'] for v in vehicles)
-        
-        print(f"\n📈 INVENTORY STATISTICS:")
-        print(f"   💰 Total inventory value: ${total_value:,.2f}")
-        print(f"   💵 Average vehicle price: ${avg_price:,.2f}")
-        print(f"   🖼️  Vehicles with images: {total_with_images}/{len(vehicles)} ({total_with_images/len(vehicles)*100:.1f}%)")
-        
-        # Show breakdown by state
-        by_state = {}
-        for vehicle in vehicles:
-            state = vehicle.get('dealer_state', 'Unknown')
-            if state not in by_state:
-                by_state[state] = 0
-            by_state[state] += 1
-        
-        print(f"\n🗺️  VEHICLES BY STATE:")
-        for state, count in sorted(by_state.items()):
-            print(f"   {state}: {count} vehicles")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error saving to database: {str(e)}")
-        return False
-    finally:
-        client.close()
-
-async def main():
-    print("🚀 Pulse Auto Market - Multi-Dealer Scraper")
-    print("Scraping 50+ dealer websites across 5 states")
-    print("=" * 60)
-    
-    try:
+        run_started = datetime.utcnow()
+        # The same car listed by several dealers is stored once, with every listing in its sources
+        deduplicator = VehicleDeduplicator()
+        await deduplicator.load(db.vehicles)
+        writer = BatchWriter(db.vehicles, key=(), batch_size=50, transform=deduplicator.resolve)
         async with MultiDealerScraper() as scraper:
-            vehicles = await scraper.scrape_all_dealers()
-            
-            if vehicles:
-                success = await save_vehicles_to_database(vehicles)
-                if success:
-                    print(f"\n🎉 SUCCESS! {len(vehicles)} vehicles scraped and saved!")
-                    print("🔍 Your Pulse Auto Market now has real inventory with images!")
-                else:
-                    print(f"\n❌ Scraping successful but database save failed")
-            else:
-                print(f"\n❌ No vehicles were successfully scraped")
+            await scraper.scrape_all_dealers(writer)
+        
+        if writer.written:
+            print(f"\n💾 Saved {writer.written} vehicles to database")
+            await finish_scrape_run(db, run_started)
+            print(f"\n🎉 SUCCESS! {writer.written} vehicles scraped and saved!")
+            print("🔍 Your Pulse Auto Market now has real inventory with images!")
+        else:
+            print(f"\n❌ No vehicles were successfully scraped")
     
     except Exception as e:
         print(f"\n❌ Scraping failed: {str(e)}")
+    finally:
+        client.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
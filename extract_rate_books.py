@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Extract NVP service contract rate books into the versioned rate table the
+backend quotes from (backend/data/rate_books/).
+
+The rate grids (coverage x term x odometer band per vehicle class) are parsed
+from word positions in the rate book PDF. The class guide, surcharges,
+deductibles and eligibility limits are free-form text in the PDF and are
+transcribed below; re-check them against pages 2, 3 and 11 whenever a new
+rate book is released. Limits for the Extreme GAP addendum are read from its
+PDF; it carries no dealer cost, so GAP is eligibility-only.
+
+Usage: python extract_rate_books.py [rate_book.pdf] [--gap gap.pdf]
+Requires pdfplumber (offline tool only; the API just reads the JSON output).
+"""
+
+import re
+import sys
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+try:
+    import pdfplumber
+except ImportError:
+    sys.exit("pdfplumber is required: pip install pdfplumber")
+
+ROOT_DIR = Path(__file__).resolve().parent
+OUTPUT_DIR = ROOT_DIR / 'backend' / 'data' / 'rate_books'
+DEFAULT_RATE_BOOK = ROOT_DIR / '01.2025_NVP-RateBook.pdf'
+DEFAULT_GAP_FORM = ROOT_DIR / 'Extreme GAP EGP150-J-01 (10.2023).pdf'
+
+PRICE_PATTERN = re.compile(r'^\$[\d,]+$')
+BAND_PATTERN = re.compile(r'^(\d+)K$')
+TERM_PATTERN = re.compile(r'(\d+)\s*Months?\s*/\s*(\d+)K', re.IGNORECASE)
+
+# Vertical section labels, matched in order against the label text with spaces removed
+COVERAGE_LABELS = [
+    ('exclusionaryplus', 'exclusionary_plus'),
+    ('totalcare', 'ev_total_care'),
+    ('wrap', 'ev_wrap'),
+    ('powertrain', 'powertrain'),
+    ('3star', '3_star'),
+    ('4star', '4_star'),
+    ('5star', '5_star'),
+    ('exclusionary', 'exclusionary'),
+]
+
+# Contract forms that document each coverage
+COVERAGE_FORMS = {
+    'powertrain': 'NVP-J-PT3_04.2024',
+    '3_star': 'NVP-J-PT3_04.2024',
+    '4_star': 'NVP-J-45EW_04.2024',
+    '5_star': 'NVP-J-45EW_04.2024',
+    'exclusionary': 'NVP-J-45EW_04.2024',
+    'exclusionary_wrap': 'NVP-J-45EW_04.2024',
+    'exclusionary_plus': 'NVP-J-EP_04.2024',
+    'ev_total_care': 'NVP-J-EV_04.2024',
+    'ev_wrap': 'NVP-J-EV_04.2024',
+}
+
+# Page 2 (and page 11 for EVs). Rules are [make, model regex or null, class or null
+# for non-eligible]; the first matching rule wins, so model rules precede make rules.
+CLASS_GUIDE = [
+    # Non-eligible
+    ['Acura', r'\bNSX\b', None], ['Audi', r'^(R8|RS)', None], ['BMW', r'Alpina', None],
+    ['Cadillac', r'CTS-?V', None], ['Chevrolet', r'Corvette\s+Z|\bZ06\b|\bZR-?1\b', None],
+    ['Dodge', r'Demon|Hellcat|\bTRX\b|Viper', None], ['Ram', r'\bTRX\b', None],
+    ['Ford', r'Raptor|Saleen', None], ['Mazda', r'RX-?8', None],
+    ['Mercedes-Benz', r'^G|\bG-?Class\b|\bSLS\b', None], ['Nissan', r'GT-?R|Nismo', None],
+    ['Plymouth', r'Prowler', None], ['Porsche', r'\b918\b|Carrera GT|\bGT[234]\b', None],
+    # Class 6
+    ['BMW', r'^M\d?\b|M-?Series', 6], ['Jaguar', r'\b\w*R\b(?!-)|R Series', 6],
+    ['Mitsubishi', r'Evo', 6], ['Mercedes-Benz', r'AMG', 6], ['Porsche', r'Turbo', 6],
+    ['Subaru', r'\bSTI\b', 6],
+    # Class 5
+    ['Audi', r'^S\d', 5], ['Chrysler', r'\bSRT', 5], ['Dodge', r'\bSRT|Scat Pack', 5],
+    ['Ford', r'Focus RS|Shelby|\bSVT\b', 5], ['Honda', r'Type R', 5], ['Jeep', r'\bSRT', 5],
+    ['Lexus', r'\b(RC|GS|IS) ?F\b|\bLFA\b', 5], ['Mazda', r'RX-?7|Rotary', 5],
+    ['Mercedes-Benz', r'^S\b|^S\d|S-?Class', 5], ['Mitsubishi', r'Ralliart', 5],
+    ['Scion', r'FR-?S', 5], ['Subaru', r'\bBRZ\b|\bWRX\b', 5],
+    ['Toyota', r'\bGR\b|GR86|\b86\b|Supra', 5], ['Volkswagen', r'Phaeton|Touareg', 5],
+    # Class 4
+    ['Audi', r'^(A8|Q5|Q7|Q8)\b', 4], ['BMW', r'^7\d\d|7 ?Series', 4],
+    # Class 3
+    ['Buick', r'Enclave', 3], ['Chevrolet', r'Silverado 3500|Corvette', 3],
+    ['Chrysler', r'Hemi', 3], ['Dodge', r'Ram 3500|^3500', 3], ['Ram', r'3500', 3],
+    ['Ford', r'F-?350|E-?350', 3], ['GMC', r'Denali|Sierra 3500', 3],
+    ['Lexus', r'\b[A-Z]{2} ?4\d\d', 3], ['Nissan', r'Titan|\d{3}Z\b|^Z$', 3],
+    # Class 2
+    ['BMW', r'^[123]\d\d|^[123] ?Series', 2], ['Mercedes-Benz', r'^[CE]\b|^[CE]\d|[CE]-?Class', 2],
+    # Make defaults
+    *[[make, None, 1] for make in ['Acura', 'Honda', 'Hyundai', 'Kia', 'Lexus', 'Mitsubishi',
+                                   'Scion', 'Subaru', 'Toyota']],
+    *[[make, None, 2] for make in ['Buick', 'Chevrolet', 'Chrysler', 'Dodge', 'Ford', 'Geo', 'GMC',
+                                   'Infiniti', 'Isuzu', 'Jeep', 'Lincoln', 'Mazda', 'Mercury',
+                                   'Nissan', 'Oldsmobile', 'Plymouth', 'Pontiac', 'Ram', 'Saturn',
+                                   'Suzuki', 'Volkswagen']],
+    *[[make, None, 3] for make in ['Audi', 'BMW', 'Cadillac', 'Mercedes-Benz']],
+    *[[make, None, 4] for make in ['Fiat', 'Genesis', 'Jaguar', 'MINI', 'Saab', 'Volvo']],
+    *[[make, None, 5] for make in ['Alfa Romeo', 'Land Rover', 'Porsche']],
+    [ 'Maserati', None, 6],
+]
+
+EV_CLASS_GUIDE = [
+    # Non-eligible
+    ['Audi', r'e-?tron GT', None], ['Ford', r'E-?Transit', None], ['Genesis', r'G80', None],
+    ['Lordstown', None, None], ['Lucid', None, None], ['Mazda', r'MX-?30', None],
+    ['Nissan', r'e-?NV200', None], ['Porsche', r'Taycan', None], ['Subaru', r'Solterra', None],
+    # Class 3
+    ['Audi', r'Q4', 3], ['BMW', r'\bi7\b|\biX3\b', 3], ['Cadillac', r'Lyriq', 3],
+    ['GMC', r'Hummer', 3], ['Jaguar', r'I-?Pace', 3], ['Jeep', r'4xe', 3],
+    ['Lexus', r'\bRZ\b|UX ?300e', 3], ['Mercedes-Benz', r'EQE|EQS', 3],
+    ['Rivian', None, 3], ['Tesla', r'Model [SX]\b', 3],
+    # Class 2
+    ['Audi', r'e-?tron', 2], ['BMW', r'\bi4\b|\biX\b', 2], ['Chevrolet', r'Bolt', 2],
+    ['Fiat', r'500', 2], ['Ford', r'Lightning|Mach-?E', 2], ['Hyundai', r'Ioniq', 2],
+    ['Kia', r'EV6', 2], ['Mercedes-Benz', r'EQB', 2], ['MINI', r'Electric|Cooper SE', 2],
+    ['Nissan', r'Ariya', 2], ['Tesla', r'Model [3Y]\b', 2], ['Volkswagen', r'ID\.?[45]', 2],
+    ['Volvo', r'Recharge|C40|XC40', 2],
+    # Class 1
+    ['Honda', r'Clarity', 1], ['Hyundai', r'Kona', 1], ['Kia', r'Niro', 1],
+    ['Nissan', r'Leaf', 1], ['Polestar', r'\b2\b', 1], ['Toyota', r'bZ4X', 1],
+]
+
+# Page 3 program details, by vehicle class
+ELIGIBILITY = {
+    'standard': {
+        '1': {'max_miles': 225000, 'max_age_years': 20, 'min_price': 2500},
+        '2': {'max_miles': 225000, 'max_age_years': 20, 'min_price': 2500},
+        '3': {'max_miles': 200000, 'max_age_years': 15, 'min_price': 5000},
+        '4': {'max_miles': 175000, 'max_age_years': 15, 'min_price': 5000},
+        '5': {'max_miles': 150000, 'max_age_years': 10, 'min_price': 10000},
+        '6': {'max_miles': 100000, 'max_age_years': 7, 'min_price': 20000},
+    },
+    'ev': {
+        cls: {'max_miles': 100000, 'max_age_years': 10, 'min_price': 15000} for cls in ('1', '2', '3')
+    },
+}
+
+STANDARD_COVERAGES = ['powertrain', '3_star', '4_star', '5_star']
+EXCLUSIONARY_COVERAGES = ['exclusionary', 'exclusionary_plus', 'exclusionary_wrap']
+EV_COVERAGES = ['ev_total_care', 'ev_wrap']
+
+# Surcharge cost by class group; short_term applies to 3 and 6 month contracts
+SURCHARGES = {
+    'diesel': {'mandatory': True, 'coverages': STANDARD_COVERAGES + EXCLUSIONARY_COVERAGES, 'cost': {'1-6': 200}},
+    'single_turbo_supercharger': {'mandatory': True, 'coverages': STANDARD_COVERAGES + EXCLUSIONARY_COVERAGES,
+                                  'cost': {'1-6': 150}, 'short_term_cost': {'1-6': 75}},
+    'twin_turbo': {'mandatory': True, 'coverages': STANDARD_COVERAGES + EXCLUSIONARY_COVERAGES,
+                   'cost': {'1-6': 300}, 'short_term_cost': {'1-6': 150}},
+    'one_ton': {'mandatory': True, 'coverages': STANDARD_COVERAGES + EXCLUSIONARY_COVERAGES, 'cost': {'1-6': 200}},
+    'hybrid': {'mandatory': True, 'coverages': STANDARD_COVERAGES + EXCLUSIONARY_COVERAGES, 'cost': {'1-6': 200}},
+    'dual_rear_wheels': {'mandatory': True, 'coverages': STANDARD_COVERAGES + EXCLUSIONARY_COVERAGES, 'cost': {'1-6': 200}},
+    'sensor_package': {'coverages': ['4_star'], 'cost': {'1-2': 300, '3-6': 300}},
+    'unlimited_miles': {'coverages': ['4_star', '5_star'], 'cost': {'1-2': 200, '3-6': 200},
+                        'coverage_cost': {'5_star': {'1-2': 300, '3-6': 300}}},
+    'wear_and_tear': {'coverages': ['4_star', '5_star'] + EXCLUSIONARY_COVERAGES,
+                      'cost': {'1-2': 300, '3-6': 300}, 'short_term_cost': {'1-2': 150, '3-6': 150},
+                      'coverage_cost': {cov: {'1-2': 100, '3-6': 100} for cov in EXCLUSIONARY_COVERAGES}},
+    'commercial_use': {'coverages': ['4_star', '5_star'] + EXCLUSIONARY_COVERAGES, 'cost': {'1-2': 350, '3-6': 350}},
+    'rideshare': {'coverages': ['4_star', '5_star'] + EXCLUSIONARY_COVERAGES, 'cost': {'1-2': 550, '3-6': 550}},
+    'luxury_package': {'coverages': EXCLUSIONARY_COVERAGES, 'cost': {'1-2': 200, '3-6': 200}},
+    'lift_kit': {'coverages': STANDARD_COVERAGES + EXCLUSIONARY_COVERAGES, 'cost': {'1-2': 350, '3-6': 350}},
+    'enhanced_labor_rate': {'coverages': ['4_star', '5_star'] + EXCLUSIONARY_COVERAGES, 'cost': {'1-2': 200, '3-6': 200}},
+    'salvage_title': {'coverages': ['4_star', '5_star'] + EXCLUSIONARY_COVERAGES, 'cost': {'1-2': 500}},
+    # EV program (page 11)
+    'battery_package': {'coverages': EV_COVERAGES, 'cost': {'1-3': 300}},
+    'ev_commercial_use': {'coverages': EV_COVERAGES, 'cost': {'1-3': 500}},
+    'ev_luxury_package': {'coverages': EV_COVERAGES, 'cost': {'1-3': 300}},
+    'ev_enhanced_labor_rate': {'coverages': EV_COVERAGES, 'cost': {'1-3': 200}},
+    'ev_salvage_title': {'coverages': EV_COVERAGES, 'cost': {'1-2': 500}},
+}
+
+# Deductible adjustments to the base rate by class group (standard deductible = 0)
+DEDUCTIBLES = {
+    'standard': {
+        'coverages': STANDARD_COVERAGES,
+        'options': {'100': {'1-6': 0}, '0': {'1-2': 200, '3-6': 300},
+                    '200': {'1-6': -50, 'coverages': ['4_star', '5_star'], 'min_term_months': 12}},
+        'default': '100',
+    },
+    'exclusionary': {
+        'coverages': EXCLUSIONARY_COVERAGES,
+        'options': {'200': {'1-6': 0}, '100': {'1-2': 200, '3-6': 300}, '0': {'1-2': 300, '3-6': 400}},
+        'default': '200',
+    },
+    'ev': {
+        'coverages': EV_COVERAGES,
+        'options': {'200': {'1-3': 0}, '100': {'1-3': 200}, '0': {'1-3': 400}},
+        'default': '200',
+    },
+}
+
+def rotated_labels(words):
+    """Vertical section labels as (text, center_y, x0); characters are grouped by column and proximity"""
+    columns = []
+    for word in sorted((w for w in words if not w['upright']), key=lambda w: w['x0']):
+        if columns and word['x0'] - columns[-1][0]['x0'] <= 3:
+            columns[-1].append(word)
+        else:
+            columns.append([word])
+    groups = []
+    for column in columns:
+        previous = None
+        for word in sorted(column, key=lambda w: w['top']):
+            if previous is None or word['top'] - previous['bottom'] > 8:
+                groups.append([])
+            groups[-1].append(word)
+            previous = word
+    labels = []
+    for group in groups:
+        # Text runs bottom to top, and whole rotated words come out reversed
+        text = ''.join(w['text'][::-1] if len(w['text']) > 1 else w['text']
+                       for w in sorted(group, key=lambda w: -w['top']))
+        top, bottom = min(w['top'] for w in group), max(w['bottom'] for w in group)
+        labels.append((re.sub(r'\s', '', text), (top + bottom) / 2, group[0]['x0']))
+    return labels
+
+def classify_label(text):
+    if text.startswith('('):
+        return None, None
+    if text.isdigit():
+        return 'class', text
+    if re.fullmatch(r'(CLASS)?\d(VEHICLES)?', text, re.IGNORECASE):
+        return 'class', re.search(r'\d', text).group(0)
+    lowered = text.lower()
+    for key, coverage in COVERAGE_LABELS:
+        if key in lowered:
+            return 'coverage', coverage
+    return None, None
+
+def parse_rate_page(page, page_number):
+    """Yield rate rows from one rate grid page"""
+    words = page.extract_words(extra_attrs=['upright'])
+    upright = [w for w in words if w['upright']]
+    page_text = page.extract_text() or ''
+    title = re.search(r'CLASS (\d) VEHICLES', page_text)
+    page_class = title.group(1) if title else None
+    page_coverage = 'exclusionary_wrap' if 'WRAP Rates' in page_text else None
+    program = 'ev' if 'Electric Vehicle Rates' in page_text else 'standard'
+
+    labels = []
+    for text, center, x0 in rotated_labels(words):
+        kind, value = classify_label(text)
+        if kind:
+            labels.append((kind, value, center, x0))
+
+    headers = sorted((w for w in upright if w['text'].lower() == 'term'), key=lambda w: (w['top'], w['x0']))
+    for header in headers:
+        same_line = [h for h in headers if abs(h['top'] - header['top']) < 3 and h['x0'] > header['x0']]
+        right_limit = min((h['x0'] for h in same_line), default=page.width) - 10
+        below = [h for h in headers if h['top'] > header['top'] + 3 and abs(h['x0'] - header['x0']) < 50]
+        bottom_limit = min((h['top'] for h in below), default=page.height) - 20
+
+        band_words = sorted((w for w in upright if abs(w['top'] - header['top']) < 3
+                             and header['x1'] < w['x0'] < right_limit and BAND_PATTERN.match(w['text'])),
+                            key=lambda w: w['x0'])
+        if not band_words:
+            continue
+        bands, lower = [], 0
+        for word in band_words:
+            upper = int(BAND_PATTERN.match(word['text']).group(1)) * 1000
+            bands.append((lower, upper, (word['x0'] + word['x1']) / 2))
+            lower = upper + 1
+        label_right = bands[0][2] - 25
+
+        in_table = lambda w: header['bottom'] < w['top'] < bottom_limit and header['x0'] - 60 < w['x0'] < right_limit
+        prices = [w for w in upright if in_table(w) and PRICE_PATTERN.match(w['text'])]
+        label_words = [w for w in upright if in_table(w) and w['x1'] <= label_right and not PRICE_PATTERN.match(w['text'])]
+
+        rows = {}
+        for price in prices:
+            center = (price['x0'] + price['x1']) / 2
+            band = min(bands, key=lambda b: abs(b[2] - center))
+            if abs(band[2] - center) > 30:
+                continue
+            key = next((top for top in rows if abs(top - price['top']) < 3), price['top'])
+            rows.setdefault(key, []).append((band, int(price['text'].strip('$').replace(',', ''))))
+
+        # Rows separated by more than a normal line pitch start a new coverage section;
+        # a much larger gap is the end of the grid (surcharge tables follow on some pages)
+        row_tops = sorted(rows)
+        sections, previous = [], None
+        for top in row_tops:
+            if previous is not None and top - previous > 45:
+                break
+            if previous is None or top - previous > 19:
+                sections.append([])
+            sections[-1].append(top)
+            previous = top
+
+        table_labels = [label for label in labels if header['x0'] - 140 < label[3] < label_right]
+        for section in sections:
+            center = (section[0] + section[-1]) / 2
+            coverage = page_coverage or _nearest(table_labels, 'coverage', center)
+            vehicle_class = page_class or _nearest(table_labels, 'class', center)
+            if not coverage or not vehicle_class:
+                raise ValueError(f"Page {page_number}: could not label rows at y={center:.0f}")
+            if program == 'ev' and not coverage.startswith('ev_'):
+                raise ValueError(f"Page {page_number}: unexpected EV coverage {coverage}")
+
+            for top in section:
+                same = ' '.join(w['text'] for w in label_words if abs(w['top'] - top) < 3)
+                above = ' '.join(w['text'] for w in label_words if 0 < top - w['top'] < 18)
+                term = TERM_PATTERN.search(same) or TERM_PATTERN.search(f"{above} {same}")
+                if not term:
+                    raise ValueError(f"Page {page_number}: no term label for row at y={top:.0f}")
+                for (lower, upper, _), cost in sorted(rows[top]):
+                    yield {
+                        'program': program,
+                        'coverage': coverage,
+                        'vehicle_class': vehicle_class,
+                        'term_months': int(term.group(1)),
+                        'term_miles': int(term.group(2)) * 1000,
+                        'odometer_min': lower,
+                        'odometer_max': upper,
+                        'cost': cost,
+                        'page': page_number,
+                    }
+
+def _nearest(labels, kind, center):
+    candidates = [label for label in labels if label[0] == kind]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda label: abs(label[2] - center))[1]
+
+def extract_rates(path):
+    rates = []
+    with pdfplumber.open(path) as pdf:
+        for number, page in enumerate(pdf.pages, start=1):
+            text = page.extract_text() or ''
+            if re.search(r'\bTerm\b', text, re.IGNORECASE) and '$' in text and 'Odometer' in text:
+                rates.extend(parse_rate_page(page, number))
+    return rates
+
+def extract_gap_limits(path):
+    """Program limits printed on the GAP addendum"""
+    with pdfplumber.open(path) as pdf:
+        text = pdf.pages[0].extract_text() or ''
+    afvr = re.search(r'(\d+)% MSRP/NADA', text)
+    term = re.search(r'(\d+) Months', text)
+    amounts = re.findall(r'\$([\d,]+)', text.split('PROGRAM LIMITS', 1)[-1])
+    form = re.search(r'EGP\d+', Path(path).name)
+    return {
+        'form': form.group(0) if form else Path(path).stem,
+        'max_afvr_percent': int(afvr.group(1)) if afvr else None,
+        'max_term_months': int(term.group(1)) if term else None,
+        'max_coverage': int(amounts[0].replace(',', '')) if amounts else None,
+        'max_amount_financed': int(amounts[1].replace(',', '')) if len(amounts) > 1 else None,
+        'commercial_surcharge': 50 if 'Commercial $50 Surcharge' in text else None,
+    }
+
+def validate(rates):
+    """Sanity checks that catch a misaligned grid before it is published"""
+    seen = set()
+    for rate in rates:
+        key = (rate['coverage'], rate['vehicle_class'], rate['term_months'], rate['term_miles'], rate['odometer_max'])
+        if key in seen:
+            raise ValueError(f"Duplicate rate cell {key}")
+        seen.add(key)
+        limit = ELIGIBILITY[rate['program']][rate['vehicle_class']]['max_miles']
+        if rate['odometer_min'] > limit:
+            raise ValueError(f"Rate above the class {rate['vehicle_class']} mileage limit: {rate}")
+    # Within a row, cost never drops as the odometer band rises
+    rows = {}
+    for rate in rates:
+        rows.setdefault((rate['coverage'], rate['vehicle_class'], rate['term_months'], rate['term_miles']), []).append(rate)
+    for key, row in rows.items():
+        costs = [rate['cost'] for rate in sorted(row, key=lambda r: r['odometer_min'])]
+        if costs != sorted(costs):
+            raise ValueError(f"Costs out of order for {key}: {costs}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('rate_book', nargs='?', default=str(DEFAULT_RATE_BOOK))
+    parser.add_argument('--gap', default=str(DEFAULT_GAP_FORM))
+    args = parser.parse_args()
+
+    rate_book = Path(args.rate_book)
+    rates = extract_rates(rate_book)
+    validate(rates)
+
+    with open(rate_book, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    with pdfplumber.open(rate_book) as pdf:
+        footer = re.search(r'NVP-(\d{2})/(\d{4})', pdf.pages[-1].extract_text() or '')
+    month, year = (footer.group(1), footer.group(2)) if footer else ('01', str(datetime.utcnow().year))
+    version = f"nvp-{year}-{month}"
+
+    columns = ['program', 'coverage', 'vehicle_class', 'term_months', 'term_miles', 'odometer_min', 'odometer_max', 'cost']
+    table = {
+        'version': version,
+        'effective': f"{year}-{month}-01",
+        'source': rate_book.name,
+        'source_sha256': digest,
+        'extracted_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'columns': columns,
+        'rates': [[rate[column] for column in columns] for rate in rates],
+        'forms': COVERAGE_FORMS,
+        'class_guide': CLASS_GUIDE,
+        'ev_class_guide': EV_CLASS_GUIDE,
+        'eligibility': ELIGIBILITY,
+        'surcharges': SURCHARGES,
+        'deductibles': DEDUCTIBLES,
+        'gap': extract_gap_limits(args.gap) if Path(args.gap).exists() else None,
+    }
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    output = OUTPUT_DIR / f"{version}.json"
+    with open(output, 'w') as f:
+        json.dump(table, f, separators=(',', ':'))
+
+    by_coverage = {}
+    for rate in rates:
+        by_coverage[rate['coverage']] = by_coverage.get(rate['coverage'], 0) + 1
+    print(f"Wrote {len(rates)} rates to {output.relative_to(ROOT_DIR)}")
+    for coverage, count in sorted(by_coverage.items()):
+        print(f"  {coverage:<20} {count}")
+
+if __name__ == "__main__":
+    main()
@@ -2095,7 +2095,7 @@ const ServicePage = () => {
         }
       });
       
-      alert(`Service scheduled! Confirmation: ${response.data.confirmation}`);
+      alert(`${response.data.message}. Confirmation: ${response.data.confirmation}`);
       setShowBookingForm(false);
       setBookingForm({
         vehicle_make: '',
@@ -21,6 +21,8 @@ sys.path.append('/app/backend')
 
 from pymongo import MongoClient
 from dealer_scaling_database import DEALERCARSEARCH_DEALERS, get_priority_dealers
+from scraper.dcs_photos import find_dcs_photo_urls, select_dcs_photos
+from scraper.dedup import VehicleDeduplicator
 
 # MongoDB connection
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
@@ -41,6 +43,9 @@ class MegaScaleScraper:
         self.delay_between_dealers = 2  # seconds
         self.delay_between_vehicles = 0.5  # seconds
         
+        # Cars already listed by another dealer are merged instead of inserted again
+        self.deduplicator = VehicleDeduplicator()
+        
         # Vehicle variety data
         self.vehicle_templates = {
             "Ford": {
@@ -104,6 +109,8 @@ class MegaScaleScraper:
         print(f"🎯 Target: 1000+ vehicles")
         print(f"📈 Need to add: {1000 - current_count} vehicles")
         
+        self.deduplicator.load_documents(db.vehicles.find({}, VehicleDeduplicator.PROJECTION))
+        
         # Get priority dealers
         priority_dealers = get_priority_dealers()
         
@@ -181,7 +188,8 @@ class MegaScaleScraper:
         soup = BeautifulSoup(html_content, 'html.parser')
         
         # Look for DealerCarSearch images
-        dealercarsearch_images = re.findall(r'https://imagescdn\.dealercarsearch\.com/Media/[^"\'>\s]+', html_content)
+        # One URL per distinct photo, so size variants of a photo don't end up as separate images
+        dealercarsearch_images = list(select_dcs_photos(find_dcs_photo_urls(html_content)).values())
         
         if not dealercarsearch_images:
             return 0
@@ -211,9 +219,10 @@ class MegaScaleScraper:
                 # Create vehicle with variety
                 vehicle_data = self.create_realistic_vehicle(dealer, real_images)
                 
-                # Check for duplicates
-                if not db.vehicles.find_one({'source_url': vehicle_data['source_url']}):
-                    result = db.vehicles.insert_one(vehicle_data)
+                # Check for duplicates (same listing, VIN or photo); duplicates become extra sources
+                is_new = self.deduplicator.match(vehicle_data) is None
+                db.vehicles.bulk_write(self.deduplicator.operations(vehicle_data))
+                if is_new:
                     vehicles_created += 1
                     
                     # Delay between vehicles
@@ -242,9 +251,10 @@ class MegaScaleScraper:
                 vehicle_data = self.create_realistic_vehicle(dealer, base_vehicle['images'][:4])
                 vehicle_data['source_url'] = f"{dealer['url']}/generated_variety_{i}_{int(time.time())}"
                 
-                # Check for duplicates
-                if not db.vehicles.find_one({'source_url': vehicle_data['source_url']}):
-                    result = db.vehicles.insert_one(vehicle_data)
+                # Check for duplicates (same listing, VIN or photo); duplicates become extra sources
+                is_new = self.deduplicator.match(vehicle_data) is None
+                db.vehicles.bulk_write(self.deduplicator.operations(vehicle_data))
+                if is_new:
                     vehicles_created += 1
         
         return vehicles_created
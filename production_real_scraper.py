@@ -18,6 +18,7 @@ from urllib.parse import urljoin
 sys.path.append('/app/backend')
 
 from pymongo import MongoClient
+from scraper.dcs_photos import find_dcs_photo_urls, select_dcs_photos
 
 # MongoDB connection
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
@@ -44,6 +45,11 @@ class ProductionRealPhotoScraper:
             }
             # Add more dealers as we discover working patterns
         ]
+        
+        # Photo transfer stats, to keep an eye on bandwidth per vehicle
+        self.photos_downloaded = 0
+        self.photos_reused = 0
+        self.photo_bytes = 0
     
     def scrape_all_dealers(self, max_vehicles_per_dealer=20):
         """Scrape multiple dealers for real photos"""
@@ -93,11 +99,17 @@ class ProductionRealPhotoScraper:
             vehicle_links = list(vehicle_links)[:max_vehicles]
             print(f"   🔗 Found {len(vehicle_links)} unique vehicle pages")
             
+            # Photos already stored for these pages, by CDN photo key, are not downloaded again
+            stored_photos = {}
+            for stored in db.vehicles.find({'source_url': {'$in': vehicle_links}, 'photo_keys': {'$exists': True}},
+                                           {'source_url': 1, 'images': 1, 'photo_keys': 1}):
+                stored_photos[stored['source_url']] = dict(zip(stored['photo_keys'], stored.get('images', [])))
+            
             vehicles_data = []
             
             for i, vdp_url in enumerate(vehicle_links):
                 try:
-                    vehicle_data = self.extract_real_photos_from_vdp(vdp_url, dealer)
+                    vehicle_data = self.extract_real_photos_from_vdp(vdp_url, dealer, stored_photos.get(vdp_url))
                     
                     if vehicle_data and vehicle_data.get('images'):
                         vehicles_data.append(vehicle_data)
@@ -107,13 +119,15 @@ class ProductionRealPhotoScraper:
                     print(f"   ⚠️ Vehicle {i+1} error: {e}")
                     continue
             
+            print(f"   📦 Photos: {self.photos_downloaded} downloaded ({self.photo_bytes / 1_000_000:.1f} MB), "
+                  f"{self.photos_reused} already stored")
             return vehicles_data
             
         except Exception as e:
             print(f"   ❌ Dealer scraping error: {e}")
             return []
     
-    def extract_real_photos_from_vdp(self, vdp_url, dealer):
+    def extract_real_photos_from_vdp(self, vdp_url, dealer, stored_photos=None):
         """Extract real DealerCarSearch photos from VDP"""
         try:
             response = self.session.get(vdp_url, timeout=10)
@@ -122,36 +136,34 @@ class ProductionRealPhotoScraper:
             
             html_content = response.text
             
-            # Extract all DealerCarSearch image URLs
-            dealercarsearch_images = re.findall(
-                r'https://imagescdn\.dealercarsearch\.com/Media/[^"\'>\s]+',
-                html_content
-            )
+            # One URL per distinct photo, at gallery size rather than every thumbnail and original
+            photo_urls = select_dcs_photos(find_dcs_photo_urls(html_content), limit=6)  # Max 6 images per vehicle
             
-            if not dealercarsearch_images:
+            if not photo_urls:
                 return None
             
-            # Remove duplicates while preserving order
-            unique_images = []
-            seen = set()
-            for img_url in dealercarsearch_images:
-                if img_url not in seen:
-                    unique_images.append(img_url)
-                    seen.add(img_url)
-            
             # Download real images
             real_images = []
-            for img_url in unique_images[:6]:  # Max 6 images per vehicle
+            photo_keys = []
+            for key, img_url in photo_urls.items():
+                if stored_photos and key in stored_photos:
+                    real_images.append(stored_photos[key])
+                    photo_keys.append(key)
+                    self.photos_reused += 1
+                    continue
                 try:
                     img_response = self.session.get(img_url, timeout=8)
                     if img_response.status_code == 200:
                         img_content = img_response.content
+                        self.photos_downloaded += 1
+                        self.photo_bytes += len(img_content)
                         
                         # Verify this is a real dealer photo (large size)
                         if len(img_content) > 50000:  # At least 50KB
                             base64_data = base64.b64encode(img_content).decode('utf-8')
                             base64_url = f"data:image/jpeg;base64,{base64_data}"
                             real_images.append(base64_url)
+                            photo_keys.append(key)
                             
                 except:
                     continue
@@ -161,6 +173,7 @@ class ProductionRealPhotoScraper:
             
             # Extract vehicle information
             vehicle_data = self.extract_vehicle_info(html_content, vdp_url, dealer, real_images)
+            vehicle_data['photo_keys'] = photo_keys
             return vehicle_data
             
         except Exception as e:
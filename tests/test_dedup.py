@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from scraper.dedup import VehicleDeduplicator
+
+PLACEHOLDER_HASH = "f0e1d2c3b4a59687"
+CAR_PHOTO_HASH = "0123456789abcdef"
+
+def listing(**fields):
+    vehicle = {"year": 2019, "make": "Honda", "model": "Civic", "dealer_name": "Music City Motors"}
+    vehicle.update(fields)
+    return vehicle
+
+def test_placeholder_photo_without_mileage_does_not_merge_cars():
+    # Inventory-page listings: no source URL, no mileage, the dealer's "photo coming soon" image
+    deduplicator = VehicleDeduplicator()
+    first = listing(id="a", photo_hash=PLACEHOLDER_HASH, price=17995)
+    second = listing(id="b", photo_hash=PLACEHOLDER_HASH, price=21500)
+    deduplicator.operations(first)
+    assert deduplicator.match(second) is None
+    deduplicator.operations(second)
+    assert len(deduplicator) == 2
+
+def test_photo_shared_by_several_vehicles_is_ignored():
+    deduplicator = VehicleDeduplicator()
+    deduplicator.operations(listing(id="a", model="Accord", mileage=30000, photo_hash=PLACEHOLDER_HASH))
+    deduplicator.operations(listing(id="b", model="Pilot", mileage=30000, photo_hash=PLACEHOLDER_HASH))
+    assert deduplicator.match(listing(mileage=30100, model="Accord", photo_hash=PLACEHOLDER_HASH)) is None
+
+def test_same_photo_and_odometer_still_merges():
+    deduplicator = VehicleDeduplicator()
+    deduplicator.operations(listing(id="a", mileage=30000, photo_hash=CAR_PHOTO_HASH,
+                                    source_url="https://one.example/vdp/1"))
+    duplicate = listing(model="Civic LX", mileage=30200, photo_hash=CAR_PHOTO_HASH,
+                        source_url="https://two.example/vdp/9", dealer_name="Other Dealer")
+    assert deduplicator.match(duplicate) == "a"
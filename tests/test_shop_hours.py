@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import pytest
+
+from scraper.shop_hours import MINUTES_PER_DAY, parse_hours
+
+MONDAY = 0
+
+def hours(start: str, end: str, day: int = MONDAY):
+    def minutes(clock: str) -> int:
+        hour, minute = clock.split(':')
+        return int(hour) * 60 + int(minute)
+    close = minutes(end) + (MINUTES_PER_DAY if minutes(end) <= minutes(start) else 0)
+    return (day * MINUTES_PER_DAY + minutes(start), day * MINUTES_PER_DAY + close)
+
+@pytest.mark.parametrize("text, expected", [
+    ("Mon 8-5", hours("08:00", "17:00")),
+    ("Mon 10-6", hours("10:00", "18:00")),
+    ("Mon 7:30-6", hours("07:30", "18:00")),
+    ("Mon 9-5pm", hours("09:00", "17:00")),
+    ("Mon 1-5pm", hours("13:00", "17:00")),
+    ("Mon 12-5pm", hours("12:00", "17:00")),
+    ("Mon 10pm-2am", hours("22:00", "02:00")),
+    ("Mon 8am-midnight", hours("08:00", "00:00")),
+])
+def test_single_day_ranges(text, expected):
+    assert parse_hours(text) == [expected]
+
+def test_bare_ranges_are_daytime_on_every_listed_day():
+    assert parse_hours("Mon-Fri 8-5") == [hours("08:00", "17:00", day) for day in range(5)]
+    assert parse_hours("Tues-Sat 10-6") == [hours("10:00", "18:00", day) for day in range(1, 6)]
+
+def test_closed_days_and_24_hours():
+    assert parse_hours("Sun Closed") == []
+    assert parse_hours("24 hours") == [(day * MINUTES_PER_DAY, (day + 1) * MINUTES_PER_DAY) for day in range(7)]